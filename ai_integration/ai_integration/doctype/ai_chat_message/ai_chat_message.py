@@ -1,8 +1,15 @@
 # Copyright (c) 2024, Frappe Technologies and contributors
 # For license information, please see license.txt
 
-# import frappe
+import frappe
 from frappe.model.document import Document
+from ai_integration.utils.history import append_to_window
 
 class AIChatMessage(Document):
-	pass
+	def after_insert(self):
+		# Keep the session's cached history window in step with the DB
+		append_to_window(self)
+
+def on_doctype_update():
+	# History is always read per session in creation order (keyset pagination, recent window)
+	frappe.db.add_index("AI Chat Message", ["session", "creation"])
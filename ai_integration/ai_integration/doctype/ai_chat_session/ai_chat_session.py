@@ -1,8 +1,12 @@
 # Copyright (c) 2024, Frappe Technologies and contributors
 # For license information, please see license.txt
 
-# import frappe
+import frappe
 from frappe.model.document import Document
 
 class AIChatSession(Document):
 	pass
+
+def on_doctype_update():
+	# Session list is per user, most recently active first
+	frappe.db.add_index("AI Chat Session", ["user", "modified"])
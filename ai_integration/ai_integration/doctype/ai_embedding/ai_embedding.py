@@ -1,8 +1,12 @@
 # Copyright (c) 2024, AI Integration and contributors
 # For license information, please see license.txt
 
-# import frappe
+import frappe
 from frappe.model.document import Document
 
 class AIEmbedding(Document):
 	pass
+
+def on_doctype_update():
+	# The vector store reads max(modified) of the live generation on every sync
+	frappe.db.add_index("AI Embedding", ["generation", "modified"])
@@ -4,6 +4,9 @@ frappe.ui.form.on('AI Integration Settings', {
 			<button class="btn btn-primary btn-sm" id="btn-generate-embeddings">
 				Generate Embeddings
 			</button>
+			<button class="btn btn-default btn-sm" id="btn-rebuild-embeddings">
+				Rebuild Embeddings
+			</button>
 		`);
 
 		frm.fields_dict['generate_embeddings_html'].$wrapper.find('#btn-generate-embeddings').on('click', () => {
@@ -18,5 +21,16 @@ frappe.ui.form.on('AI Integration Settings', {
 				});
 			});
 		});
+
+		frm.fields_dict['generate_embeddings_html'].$wrapper.find('#btn-rebuild-embeddings').on('click', () => {
+			frappe.confirm('Re-embed all documents of enabled DocTypes into a new generation? Search keeps using the current embeddings until the rebuild completes.', () => {
+				frappe.call({
+					method: 'ai_integration.ai_integration.doctype.ai_integration_settings.ai_integration_settings.rebuild_embeddings',
+					callback: function(r) {
+						frappe.msgprint('Embedding rebuild started in the background.');
+					}
+				});
+			});
+		});
 	}
 });
@@ -1,14 +1,96 @@
 # Copyright (c) 2024, AI Integration and contributors
 # For license information, please see license.txt
 
+import json
+
 import frappe
+from frappe import _
 from frappe.model.document import Document
+from frappe.utils import flt
 from ai_integration.utils.embedding import generate_all_embeddings_task
+from ai_integration.utils.tool_cache import invalidate_tool_cache
+
+# Fields of an Exports row written by export runs, not by the form
+EXPORT_RUN_FIELDS = ("watermark", "last_run_at", "last_run_status", "last_run_rows", "last_run_bytes", "last_run_duration")
 
 class AIIntegrationSettings(Document):
+	def validate(self):
+		self.validate_prompt_budget()
+		self.validate_exports()
+		self.keep_embedding_generations()
+		self.keep_export_watermarks()
+
+	def keep_embedding_generations(self):
+		# Only rebuilds move the generations, saving a form loaded before a switch must not undo it
+		for fieldname in ("embedding_generation", "building_generation"):
+			self.set(fieldname, frappe.db.get_single_value(self.doctype, fieldname, cache=False))
+
+	def keep_export_watermarks(self):
+		# Export runs move the watermarks and record their results, saving a form loaded
+		# before a run must not roll them back
+		self.triton_export_watermark = frappe.db.get_single_value(self.doctype, "triton_export_watermark", cache=False)
+
+		saved = {
+			row.name: row for row in frappe.get_all("AI Integration Export",
+				filters={"parent": self.name, "parenttype": self.doctype, "parentfield": "exports"},
+				fields=["name", *EXPORT_RUN_FIELDS])
+		}
+		for row in self.get("exports") or []:
+			if row.name in saved:
+				row.update({fieldname: saved[row.name][fieldname] for fieldname in EXPORT_RUN_FIELDS})
+
+	def validate_prompt_budget(self):
+		if not 0 <= flt(self.context_budget_ratio) <= 1:
+			frappe.throw(_("Context Budget Ratio must be between 0 and 1"))
+
+	def validate_exports(self):
+		from frappe.model import default_fields
+		from ai_integration.utils.export import mapping_fields
+
+		names = set()
+		for row in self.get("exports") or []:
+			if row.export_name in names:
+				frappe.throw(_("Export name {0} is used more than once").format(row.export_name))
+			names.add(row.export_name)
+
+			try:
+				mapping = json.loads(row.field_mapping or "{}")
+				filters = json.loads(row.filters or "[]")
+			except ValueError as e:
+				frappe.throw(_("Row {0}: invalid JSON ({1})").format(row.idx, e))
+
+			if not isinstance(mapping, dict) or not mapping:
+				frappe.throw(_("Row {0}: Field Mapping must be a JSON object").format(row.idx))
+			if not isinstance(filters, list):
+				frappe.throw(_("Row {0}: Filters must be a JSON list").format(row.idx))
+
+			meta = frappe.get_meta(row.doctype_name)
+			unknown = [f for f in mapping_fields(mapping) if f not in default_fields and not meta.has_field(f)]
+			if unknown:
+				frappe.throw(_("Row {0}: {1} has no field {2}").format(row.idx, row.doctype_name, ", ".join(unknown)))
+
 	def on_update(self):
 		frappe.cache().delete_value("ai_integration:enabled_doctypes")
+		invalidate_tool_cache()
 
 @frappe.whitelist()
 def generate_all_embeddings():
 	frappe.enqueue(generate_all_embeddings_task, queue='long', timeout=3600)
+
+@frappe.whitelist()
+def rebuild_embeddings():
+	frappe.only_for("System Manager")
+	frappe.enqueue("ai_integration.utils.embedding.rebuild_all_embeddings", queue='long', timeout=6 * 3600,
+		job_id="ai_integration:rebuild_embeddings", deduplicate=True)
+
+@frappe.whitelist()
+def get_answer_cache_stats():
+	frappe.only_for("System Manager")
+	from ai_integration.utils.answer_cache import get_stats
+	return get_stats()
+
+@frappe.whitelist()
+def get_prefix_cache_stats():
+	frappe.only_for("System Manager")
+	from ai_integration.utils.prefix_cache import get_stats
+	return get_stats()
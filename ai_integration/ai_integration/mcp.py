@@ -1,9 +1,21 @@
+import frappe
 from frappe_mcp import MCP
 
 mcp = MCP("ai-integration")
 
+# Tool functions by name, so batch_call can run them within one request
+tools = {}
+
+def tool(read_only=False):
+    """Registers a function as an MCP tool, like mcp.tool(), and records it in `tools`."""
+    def decorator(fn):
+        tools[fn.__name__] = frappe._dict(fn=fn, read_only=read_only)
+        return mcp.tool()(fn)
+    return decorator
+
 @mcp.register()
 def handle_mcp():
     # Import tools here to ensure they are registered
     import ai_integration.ai_integration.tools.rag
     import ai_integration.ai_integration.tools.db
+    import ai_integration.ai_integration.tools.batch
@@ -29,6 +29,9 @@ frappe.pages['ai-chat'].on_page_load = function(wrapper) {
                     <div v-if="sessions.length === 0" class="no-sessions">
                         No history yet.
                     </div>
+                    <button v-if="sessionsCursor" class="load-more-btn" @click="loadMoreSessions">
+                        Load more
+                    </button>
                 </div>
             </div>
 
@@ -44,6 +47,9 @@ frappe.pages['ai-chat'].on_page_load = function(wrapper) {
                         <h3>{{ currentSessionTitle || 'Gemini Assistant' }}</h3>
                     </div>
                     <div class="chat-messages" ref="messagesContainer">
+                        <button v-if="hasMoreHistory" class="load-more-btn" @click="loadEarlierMessages">
+                            Load earlier messages
+                        </button>
                         <div v-if="messages.length === 0" class="empty-state">
                             <p>How can I help you today?</p>
                         </div>
@@ -98,19 +104,44 @@ function initVue(wrapper) {
             const sidebarOpen = ref(false);
             const messagesContainer = ref(null);
 
-            const fetchSessions = async () => {
+            const sessionsCursor = ref(null);
+            const historyCursor = ref(null);
+            const hasMoreHistory = ref(false);
+
+            const fetchSessions = async (more = false) => {
                 try {
                     const r = await frappe.call({
-                        method: 'ai_integration.api.chat.get_user_sessions'
+                        method: 'ai_integration.api.chat.get_user_sessions',
+                        args: { before: more ? sessionsCursor.value : null }
                     });
                     if (r.message) {
-                        sessions.value = r.message;
+                        sessions.value = more ? sessions.value.concat(r.message.sessions) : r.message.sessions;
+                        sessionsCursor.value = r.message.next_cursor;
                     }
                 } catch (e) {
                     console.error("Failed to fetch sessions", e);
                 }
             };
 
+            const loadMoreSessions = () => fetchSessions(true);
+
+            const loadEarlierMessages = async () => {
+                if (!hasMoreHistory.value || !currentSessionId.value) return;
+                try {
+                    const r = await frappe.call({
+                        method: 'ai_integration.api.chat.get_session_history',
+                        args: { session_id: currentSessionId.value, before: historyCursor.value }
+                    });
+                    if (r.message && !r.message.error) {
+                        messages.value = r.message.messages.concat(messages.value);
+                        historyCursor.value = r.message.before;
+                        hasMoreHistory.value = r.message.has_more;
+                    }
+                } catch (e) {
+                    console.error(e);
+                }
+            };
+
             const loadSession = async (sessionId) => {
                 if (currentSessionId.value === sessionId) return;
 
@@ -135,7 +166,9 @@ function initVue(wrapper) {
                         args: { session_id: sessionId }
                     });
                     if (r.message && !r.message.error) {
-                        messages.value = r.message;
+                        messages.value = r.message.messages;
+                        historyCursor.value = r.message.before;
+                        hasMoreHistory.value = r.message.has_more;
                         scrollToBottom();
                     } else {
                         frappe.msgprint(r.message.error || "Error loading session");
@@ -152,6 +185,7 @@ function initVue(wrapper) {
                 currentSessionId.value = null;
                 currentSessionTitle.value = '';
                 messages.value = [];
+                hasMoreHistory.value = false;
                 updateRoute(null);
                 if (window.innerWidth < 768) {
                     sidebarOpen.value = false;
@@ -206,6 +240,41 @@ function initVue(wrapper) {
                 });
             };
 
+            // Async chat: answers arrive over realtime, polling is the fallback
+            const pendingAnswers = {};
+
+            const resolvePending = (data) => {
+                const resolve = pendingAnswers[data.message_id];
+                if (resolve) {
+                    delete pendingAnswers[data.message_id];
+                    resolve(data);
+                }
+            };
+
+            const waitForAnswer = (messageId) => {
+                return new Promise((resolve) => {
+                    pendingAnswers[messageId] = resolve;
+
+                    const poll = async () => {
+                        if (!pendingAnswers[messageId]) return;
+                        try {
+                            const r = await frappe.call({
+                                method: 'ai_integration.api.chat.get_message_status',
+                                args: { message_id: messageId }
+                            });
+                            if (r.message && (r.message.error || r.message.status !== 'Queued')) {
+                                resolvePending(r.message);
+                                return;
+                            }
+                        } catch (e) {
+                            console.error(e);
+                        }
+                        setTimeout(poll, 5000);
+                    };
+                    setTimeout(poll, 5000);
+                });
+            };
+
             const sendMessage = async () => {
                 if (!userInput.value.trim()) return;
 
@@ -224,7 +293,18 @@ function initVue(wrapper) {
                         }
                     });
 
-                    if (r.message && r.message.response) {
+                    if (r.message && r.message.status === 'Queued') {
+                        if (r.message.session_id && r.message.session_id !== currentSessionId.value) {
+                             currentSessionId.value = r.message.session_id;
+                             updateRoute(currentSessionId.value);
+                             fetchSessions();
+                             currentSessionTitle.value = text.substring(0, 30) + '...';
+                        }
+                        const answer = await waitForAnswer(r.message.message_id);
+                        if (answer.session_id === currentSessionId.value) {
+                            messages.value.push({ role: 'ai', content: answer.response || ('Error: ' + answer.error) });
+                        }
+                    } else if (r.message && r.message.response) {
                         messages.value.push({ role: 'ai', content: r.message.response });
 
                         // Handle new session creation
@@ -254,6 +334,8 @@ function initVue(wrapper) {
             onMounted(() => {
                 fetchSessions();
 
+                frappe.realtime.on('ai_chat_response', resolvePending);
+
                 // Check URL for session ID
                 const params = new URLSearchParams(window.location.search);
                 const sessionId = params.get('session');
@@ -275,7 +357,11 @@ function initVue(wrapper) {
                 loadSession,
                 createNewChat,
                 formatDate,
-                sidebarOpen
+                sidebarOpen,
+                sessionsCursor,
+                loadMoreSessions,
+                hasMoreHistory,
+                loadEarlierMessages
             };
         }
     });
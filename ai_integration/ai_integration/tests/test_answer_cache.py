@@ -0,0 +1,36 @@
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from ai_integration.utils import answer_cache
+from ai_integration.utils.answer_cache import SemanticAnswerCache, get_cache_scope
+
+class TestAnswerCache(FrappeTestCase):
+    def setUp(self):
+        self.cache = SemanticAnswerCache("test_answer_cache")
+        self.cache.invalidate()
+
+    def tearDown(self):
+        SemanticAnswerCache._instances.pop("test_answer_cache", None)
+
+    def scope(self, message):
+        with patch.object(answer_cache, "get_permission_scope", return_value="role-scope"):
+            return get_cache_scope("test@example.com", [{"role": "user", "content": message}], message)
+
+    def test_scope_separates_identifiers(self):
+        self.assertEqual(self.scope("What is the status of PRJ-0042?"), self.scope("status of prj-0042"))
+        self.assertNotEqual(self.scope("What is the status of PRJ-0042?"), self.scope("What is the status of PRJ-0043?"))
+        self.assertEqual(self.scope("Which projects are late?"), self.scope("Which projects are overdue?"))
+
+    def test_near_duplicate_identifier_misses(self):
+        vector = [1.0, 0.0, 0.0]
+        self.cache.store(vector, self.scope("What is the status of PRJ-0042?"), "PRJ-0042 is on hold.",
+            {"EMB-1": "2026-01-01 00:00:00"}, 1200, max_size=10, references=[("Project", "PRJ-0042")])
+
+        with patch.object(answer_cache, "_chunks_unchanged", return_value=True), \
+                patch.object(answer_cache, "filter_permitted_references", side_effect=lambda refs: refs):
+            # Same embedding, another record: not served from the cache
+            self.assertIsNone(self.cache.lookup(vector, self.scope("What is the status of PRJ-0043?"), 0.95))
+            hit = self.cache.lookup(vector, self.scope("Status of PRJ-0042?"), 0.95)
+
+        self.assertEqual(hit["response"], "PRJ-0042 is on hold.")
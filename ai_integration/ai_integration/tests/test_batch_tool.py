@@ -0,0 +1,74 @@
+import time
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from ai_integration.ai_integration import mcp
+from ai_integration.ai_integration.tools.batch import MAX_BATCH_CALLS, batch_call
+
+def _echo(value, sleep=0):
+    time.sleep(sleep)
+    return value
+
+def _fail(message):
+    raise ValueError(message)
+
+def _add_todo(description, fail=False):
+    frappe.get_doc({"doctype": "ToDo", "description": description}).insert()
+    if fail:
+        frappe.throw("Rejected after the insert")
+    return description
+
+_TOOLS = {
+    "echo": frappe._dict(fn=_echo, read_only=True),
+    "fail": frappe._dict(fn=_fail, read_only=True),
+    "add_todo": frappe._dict(fn=_add_todo, read_only=False),
+    "batch_call": frappe._dict(fn=batch_call, read_only=False)
+}
+
+class TestBatchCall(FrappeTestCase):
+    def setUp(self):
+        patcher = patch.dict(mcp.tools, _TOOLS, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_results_keep_call_order(self):
+        results = batch_call([
+            {"tool": "echo", "arguments": {"value": "slow", "sleep": 0.3}},
+            {"tool": "echo", "arguments": {"value": "fast"}},
+            {"tool": "echo", "arguments": {"value": "last", "sleep": 0.1}}
+        ])
+        self.assertEqual([r["result"] for r in results], ["slow", "fast", "last"])
+
+    def test_failing_call_does_not_affect_others(self):
+        results = batch_call([
+            {"tool": "echo", "arguments": {"value": "a"}},
+            {"tool": "fail", "arguments": {"message": "broken"}},
+            {"tool": "missing"},
+            {"tool": "echo", "arguments": {"value": "b"}}
+        ])
+        self.assertEqual(results[0], {"result": "a"})
+        self.assertEqual(results[1], {"error": "broken", "type": "ValueError"})
+        self.assertEqual(results[2]["type"], "ValueError")
+        self.assertEqual(results[3], {"result": "b"})
+
+    def test_failing_write_is_rolled_back(self):
+        kept, rejected = frappe.generate_hash(length=12), frappe.generate_hash(length=12)
+        results = batch_call([
+            {"tool": "add_todo", "arguments": {"description": kept}},
+            {"tool": "add_todo", "arguments": {"description": rejected, "fail": True}}
+        ])
+
+        self.assertEqual(results[0], {"result": kept})
+        self.assertEqual(results[1]["type"], "ValidationError")
+        self.assertTrue(frappe.db.exists("ToDo", {"description": kept}))
+        self.assertFalse(frappe.db.exists("ToDo", {"description": rejected}))
+
+    def test_call_limit(self):
+        calls = [{"tool": "echo", "arguments": {"value": i}} for i in range(MAX_BATCH_CALLS + 1)]
+        self.assertRaises(frappe.ValidationError, batch_call, calls)
+        self.assertEqual(len(batch_call(calls[:MAX_BATCH_CALLS])), MAX_BATCH_CALLS)
+
+    def test_nested_batch_call_is_rejected(self):
+        results = batch_call([{"tool": "batch_call", "arguments": {"calls": [{"tool": "echo"}]}}])
+        self.assertEqual(results, [{"error": "Unknown tool: batch_call", "type": "ValueError"}])
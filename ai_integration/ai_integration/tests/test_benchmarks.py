@@ -0,0 +1,26 @@
+import numpy as np
+
+from frappe.tests.utils import FrappeTestCase
+from ai_integration.benchmarks.corpus import generate_corpus, sample_queries
+from ai_integration.benchmarks.stand_ins import hashed_embedding, stand_ins
+from ai_integration.utils.embedding import get_doc_content_text
+
+class TestBenchmarkHarness(FrappeTestCase):
+    def test_corpus_is_deterministic(self):
+        first, _ = generate_corpus(5, words_per_doc=50, child_rows=3, child_width=2)
+        second, _ = generate_corpus(5, words_per_doc=50, child_rows=3, child_width=2)
+        self.assertEqual([d.text_0 for d in first], [d.text_0 for d in second])
+        self.assertEqual(len(first[0]["items"]), 3)
+
+    def test_synthetic_docs_feed_the_pipeline(self):
+        docs, child_meta = generate_corpus(1, words_per_doc=20, child_rows=2, child_width=2)
+        with stand_ins(child_meta=child_meta):
+            text = get_doc_content_text(docs[0])
+        self.assertIn("BENCH-000000", text)
+        self.assertIn("--- Items ---", text)
+
+    def test_hashed_embedding_similarity(self):
+        texts = [d.text_0 for d in generate_corpus(20, words_per_doc=80)[0]]
+        query = sample_queries(texts[:1], 1, words=10)[0]
+        scores = [float(np.dot(hashed_embedding(query), hashed_embedding(t))) for t in texts]
+        self.assertEqual(int(np.argmax(scores)), 0)
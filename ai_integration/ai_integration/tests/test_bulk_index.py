@@ -0,0 +1,42 @@
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from ai_integration.utils import bulk_index
+
+class TestBulkIndex(FrappeTestCase):
+    def test_bulk_mode_records_dirty_documents(self):
+        self.assertFalse(bulk_index.is_bulk_mode())
+        with bulk_index.bulk_indexing(flush=False):
+            self.assertTrue(bulk_index.is_bulk_mode())
+            bulk_index.mark_dirty("ToDo", "TD-1")
+            bulk_index.mark_dirty("ToDo", "TD-1")
+            bulk_index.mark_dirty("Note", "a\x00b")
+        self.assertFalse(bulk_index.is_bulk_mode())
+
+        members, batch = bulk_index._claim_batch()
+        self.assertEqual(batch, {"ToDo": {"TD-1"}, "Note": {"a\x00b"}})
+
+        # Claimed documents are handed out again until they are released
+        bulk_index.mark_dirty("ToDo", "TD-2")
+        self.assertEqual(bulk_index._claim_batch()[1], batch)
+        bulk_index._release_batch(members)
+
+        members, batch = bulk_index._claim_batch()
+        self.assertEqual(batch, {"ToDo": {"TD-2"}})
+        bulk_index._release_batch(members)
+        self.assertEqual(bulk_index._claim_batch(), ([], {}))
+
+    def test_failed_embedding_is_recorded_again(self):
+        todo = frappe.get_doc({"doctype": "ToDo", "description": "Pump delivery for PRJ-0042"}).insert()
+        bulk_index.mark_dirty("ToDo", todo.name)
+
+        with patch("ai_integration.hooks_handler.get_enabled_doctypes", return_value=["ToDo"]), \
+                patch("ai_integration.utils.embedding.get_target_generations", return_value=[0]), \
+                patch("ai_integration.utils.embedding.generate_embedding_vector", return_value=None), \
+                patch("ai_integration.utils.vector_service.notify_changed"):
+            bulk_index.process_dirty_documents()
+
+        members, batch = bulk_index._claim_batch()
+        bulk_index._release_batch(members)
+        self.assertIn(todo.name, batch.get("ToDo", set()))
@@ -0,0 +1,129 @@
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from ai_integration.api import chat
+from ai_integration.api.chat import get_session_history, get_user_sessions
+
+class TestChatPagination(FrappeTestCase):
+    def setUp(self):
+        self.session = frappe.get_doc({
+            "doctype": "AI Chat Session",
+            "title": "Pagination test",
+            "user": frappe.session.user
+        }).insert(ignore_permissions=True)
+        self.names = [
+            frappe.get_doc({
+                "doctype": "AI Chat Message",
+                "session": self.session.name,
+                "role": "user" if i % 2 == 0 else "ai",
+                "content": f"message {i}"
+            }).insert(ignore_permissions=True).name
+            for i in range(7)
+        ]
+
+    def test_history_pages_back_and_forward(self):
+        page = get_session_history(self.session.name, page_size=3)
+        self.assertEqual([m.name for m in page["messages"]], self.names[-3:])
+        self.assertTrue(page["has_more"])
+
+        seen = [m.name for m in page["messages"]]
+        while page["has_more"]:
+            page = get_session_history(self.session.name, before=page["before"], page_size=3)
+            seen = [m.name for m in page["messages"]] + seen
+        self.assertEqual(seen, self.names)
+
+        # Nothing newer than the latest message yet, then exactly the new one
+        latest = get_session_history(self.session.name, page_size=3)
+        self.assertEqual(get_session_history(self.session.name, after=latest["after"])["messages"], [])
+        new = frappe.get_doc({
+            "doctype": "AI Chat Message",
+            "session": self.session.name,
+            "role": "user",
+            "content": "newer"
+        }).insert(ignore_permissions=True)
+        newer = get_session_history(self.session.name, after=latest["after"])
+        self.assertEqual([m.name for m in newer["messages"]], [new.name])
+
+    def test_sessions_page_with_cursor(self):
+        seen, cursor = [], None
+        while True:
+            page = get_user_sessions(before=cursor, page_size=1)
+            seen.extend(s.name for s in page["sessions"])
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertIn(self.session.name, seen)
+        self.assertEqual(len(seen), frappe.db.count("AI Chat Session", {"user": frappe.session.user}))
+
+class TestAsyncChat(FrappeTestCase):
+    def setUp(self):
+        self.settings = frappe._dict(async_chat=1, max_concurrent_chats=2, chat_queue="long")
+        get_cached_doc = frappe.get_cached_doc
+        patchers = [
+            patch.object(frappe, "get_cached_doc", side_effect=lambda doctype, *args, **kwargs:
+                self.settings if doctype == "AI Integration Settings" else get_cached_doc(doctype, *args, **kwargs)),
+            patch.object(frappe, "enqueue"),
+            patch.object(frappe, "publish_realtime"),
+            # Jobs commit and roll back on their own, keep everything in the test's transaction
+            patch.object(frappe.db, "commit"),
+            patch.object(frappe.db, "rollback")
+        ]
+        self.enqueue = patchers[1].start()
+        self.publish = patchers[2].start()
+        for patcher in (patchers[0], *patchers[3:]):
+            patcher.start()
+        for patcher in patchers:
+            self.addCleanup(patcher.stop)
+
+    def send(self, message="When do the pumps arrive?", session_id=None):
+        return chat.send_message(message, session_id)
+
+    def test_queued_message_is_answered(self):
+        queued = self.send()
+        self.assertEqual(queued["status"], "Queued")
+        self.assertEqual(self.enqueue.call_args.kwargs["message_id"], queued["message_id"])
+        self.assertEqual(chat.get_message_status(queued["message_id"])["status"], "Queued")
+
+        with patch.object(chat, "answer_user_question", return_value={"response": "On Friday.", "context_used": []}):
+            chat.process_chat_message(queued["message_id"])
+
+        status = chat.get_message_status(queued["message_id"])
+        self.assertEqual(status["status"], "Answered")
+        self.assertEqual(status["response"], "On Friday.")
+        event = self.publish.call_args.args[1]
+        self.assertEqual((event["status"], event["response"]), ("Answered", "On Friday."))
+
+        # A message that was already answered isn't answered twice
+        with patch.object(chat, "answer_user_question") as answer:
+            chat.process_chat_message(queued["message_id"])
+        answer.assert_not_called()
+
+    def test_queue_limit_per_user(self):
+        base = chat.count_queued_messages(frappe.session.user)
+        self.settings.max_concurrent_chats = base + 2
+        first = self.send()
+        self.send("And the valves?", first["session_id"])
+        self.assertEqual(chat.count_queued_messages(frappe.session.user), base + 2)
+
+        refused = self.send("And the pipes?", first["session_id"])
+        self.assertIn("error", refused)
+        self.assertEqual(self.enqueue.call_count, 2)
+
+    def test_errors_are_reported_as_failed(self):
+        answered_with_error = self.send()
+        with patch.object(chat, "answer_user_question", return_value={"error": "No API key configured"}):
+            chat.process_chat_message(answered_with_error["message_id"])
+        status = chat.get_message_status(answered_with_error["message_id"])
+        self.assertEqual(status["status"], "Failed")
+        self.assertEqual(status["response"], "Error: No API key configured")
+
+        crashed = self.send("And the valves?", answered_with_error["session_id"])
+        with patch.object(chat, "answer_user_question", side_effect=RuntimeError("LLM unavailable")):
+            chat.process_chat_message(crashed["message_id"])
+        status = chat.get_message_status(crashed["message_id"])
+        self.assertEqual(status["status"], "Failed")
+        self.assertIn("error", status)
+        self.assertEqual(self.publish.call_args.args[1]["status"], "Failed")
@@ -0,0 +1,46 @@
+import json
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from ai_integration.ai_integration.tools.db import get_doctype_schema, get_document, list_documents
+
+class TestDBTools(FrappeTestCase):
+    def test_list_documents_pages_with_cursor(self):
+        seen, cursor = [], None
+        while True:
+            page = list_documents("Role", limit=7, cursor=cursor)
+            seen.extend(row.name for row in page["data"])
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(set(seen), set(frappe.get_list("Role", pluck="name", limit_page_length=0)))
+
+    def test_list_documents_byte_cap(self):
+        page = list_documents("Role", fields=["role_name"], limit=50, max_bytes=300)
+        self.assertTrue(page["truncated"])
+        self.assertTrue(page["next_cursor"])
+        self.assertGreaterEqual(len(page["data"]), 1)
+
+    def test_get_document_projection(self):
+        doc = get_document("User", "Administrator", fields=["email", "roles.role"])
+        self.assertEqual(set(doc), {"name", "email", "roles"})
+        self.assertTrue(all(set(row) == {"role"} for row in doc["roles"]))
+
+        capped = get_document("User", "Administrator", fields=["roles"], max_bytes=200)
+        self.assertIn("roles", capped["_truncated"])
+
+    def test_get_document_truncates_parent_fields(self):
+        todo = frappe.get_doc({"doctype": "ToDo", "description": "x" * 6000}).insert()
+
+        doc = get_document("ToDo", todo.name, max_bytes=1000)
+        self.assertLessEqual(len(json.dumps(doc, default=str, separators=(",", ":"))), 1200)
+        self.assertEqual(doc["_truncated"]["description"]["total_chars"], 6000)
+        self.assertIn("...[truncated", doc["description"])
+
+    def test_compact_schema(self):
+        schema = get_doctype_schema("User")
+        self.assertTrue(any(f.startswith("email: Data") for f in schema["fields"]))
+        self.assertIn("roles", schema["child_tables"])
+        self.assertTrue(any(f.startswith("role: Link(Role)") for f in schema["child_tables"]["roles"]["fields"]))
@@ -1,7 +1,10 @@
 
+from unittest.mock import patch
+
 import frappe
 from frappe.tests.utils import FrappeTestCase
-from ai_integration.utils.embedding import chunk_text, get_doc_content_text
+from ai_integration.utils import embedding
+from ai_integration.utils.embedding import chunk_text, get_doc_content_text, get_live_generation
 
 class TestAIIntegration(FrappeTestCase):
     def test_chunking(self):
@@ -35,3 +38,23 @@ class TestAIIntegration(FrappeTestCase):
         user = frappe.get_doc("User", "Administrator")
         content = get_doc_content_text(user)
         self.assertTrue("Administrator" in content)
+
+    def test_rebuild_keeps_live_generation_when_embedding_fails(self):
+        frappe.get_doc({"doctype": "ToDo", "description": "Pump delivery for PRJ-0042"}).insert()
+        live = get_live_generation()
+        settings = frappe._dict(enabled_doctypes=[frappe._dict(doctype_name="ToDo")])
+
+        try:
+            with patch.object(embedding.frappe, "get_single", return_value=settings), \
+                    patch.object(embedding, "get_api_key", return_value="test-key"), \
+                    patch.object(embedding, "_embed", side_effect=Exception("quota exceeded")):
+                stats = embedding.rebuild_all_embeddings()
+
+            self.assertGreater(stats["attempted"], 0)
+            self.assertEqual(stats["failed"], stats["attempted"])
+            self.assertEqual(stats["chunks"], 0)
+            self.assertEqual(get_live_generation(), live)
+            self.assertTrue(frappe.db.get_single_value("AI Integration Settings", "building_generation"))
+        finally:
+            frappe.db.set_single_value("AI Integration Settings", "building_generation", 0)
+            frappe.db.commit()
@@ -0,0 +1,147 @@
+import gzip
+import io
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from ai_integration.utils import export
+
+class GCSStandIn(BaseHTTPRequestHandler):
+    """Minimal signed-URL upload endpoint: single PUT and the resumable protocol."""
+
+    def log_message(self, *args):
+        pass
+
+    def _read_body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def _reply(self, status, headers=None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        self._read_body()
+        if self.headers.get("x-goog-resumable") != "start":
+            return self._reply(400)
+        self.server.received = bytearray()
+        self._reply(201, {"Location": f"http://127.0.0.1:{self.server.server_port}/session"})
+
+    def do_PUT(self):
+        body = self._read_body()
+        server = self.server
+
+        if self.path != "/session":
+            if server.fail_next:
+                server.fail_next -= 1
+                return self._reply(503)
+            server.received = bytearray(body)
+            return self._reply(200)
+
+        content_range = self.headers["Content-Range"][len("bytes "):]
+        span, total = content_range.split("/")
+        if span != "*":
+            if server.fail_next:
+                # Persist only half of the chunk, as if the connection dropped mid-request
+                server.fail_next -= 1
+                server.received.extend(body[:len(body) // 2])
+                return self._reply(503)
+            start = int(span.split("-")[0])
+            del server.received[start:]
+            server.received.extend(body)
+
+        if len(server.received) == int(total):
+            return self._reply(200)
+        headers = {"Range": f"bytes=0-{len(server.received) - 1}"} if server.received else {}
+        self._reply(308, headers)
+
+class TestExport(FrappeTestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), GCSStandIn)
+        self.server.received = bytearray()
+        self.server.fail_next = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/object"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_jsonl_gz(self):
+        rows = [frappe._dict(name=f"PROJ-{i}") for i in range(3)]
+        body = io.BytesIO()
+        count, last = export.write_jsonl_gz(iter(rows), lambda r: {"id": r.name}, body)
+        self.assertEqual((count, last.name), (3, "PROJ-2"))
+        lines = gzip.decompress(body.getvalue()).decode().split("\n")
+        self.assertEqual(lines, ['{"id": "PROJ-0"}', '{"id": "PROJ-1"}', '{"id": "PROJ-2"}'])
+
+    def test_watermark(self):
+        self.assertIsNone(export.decode_watermark(None))
+        self.assertEqual(export.decode_watermark("2026-10-19 10:00:00.000001"), "2026-10-19 10:00:00.000001")
+        self.assertEqual(export.decode_watermark("2026-10-19 10:00:00.000001|PROJ|1"), "2026-10-19 10:00:00.000001")
+
+    def test_export_replaces_snapshot_and_skips_unchanged_runs(self):
+        todo = frappe.get_doc({"doctype": "ToDo", "description": "Export snapshot test"}).insert()
+        spec = frappe._dict(
+            name="ToDo", doctype="ToDo", fields=["description"], filters=[["status", "=", "Open"]],
+            to_entry=lambda r: {"id": r.name}, url=self.url, resumable=0, watermark=None,
+            watermark_ref=("AI Integration Settings", "AI Integration Settings", "triton_export_watermark"),
+            status_ref=None
+        )
+
+        with patch.object(frappe.db, "commit"):
+            self.assertFalse(export.run_export(spec)["unchanged"])
+            self.assertIn(todo.name, gzip.decompress(bytes(self.server.received)).decode())
+            self.assertTrue(frappe.db.get_single_value("AI Integration Settings", "triton_export_watermark"))
+
+            # Nothing modified after the watermark, nothing is uploaded
+            self.server.received = bytearray()
+            spec.watermark = str(frappe.utils.add_to_date(frappe.utils.now_datetime(), seconds=1))
+            self.assertTrue(export.run_export(spec)["unchanged"])
+            self.assertEqual(bytes(self.server.received), b"")
+
+            # A row leaving the filter is a change, the new snapshot no longer has it
+            frappe.db.set_value("ToDo", todo.name, "status", "Cancelled",
+                modified=frappe.utils.add_to_date(frappe.utils.now_datetime(), seconds=2))
+            self.assertFalse(export.run_export(spec)["unchanged"])
+            self.assertNotIn(todo.name, gzip.decompress(bytes(self.server.received)).decode())
+
+    @patch.object(export, "RETRY_BACKOFF", 0)
+    def test_single_put_retries(self):
+        self.server.fail_next = 2
+        data = os.urandom(1000)
+        export.upload(self.url, io.BytesIO(data), len(data))
+        self.assertEqual(bytes(self.server.received), data)
+
+    @patch.object(export, "RETRY_BACKOFF", 0)
+    @patch.object(export, "UPLOAD_CHUNK_SIZE", 256 * 1024)
+    def test_resumable_upload_resumes(self):
+        data = os.urandom(700 * 1024)
+        self.server.fail_next = 1
+        export.upload(self.url, io.BytesIO(data), len(data), resumable=True)
+        self.assertEqual(bytes(self.server.received), data)
+
+    def test_field_mapping(self):
+        mapping = {
+            "title": "{subject}",
+            "uri": "{site_url}/app/task/{name}",
+            "attributes": {"progress": "{progress}", "label": "{progress:.0f}% of {subject}"}
+        }
+        self.assertEqual(export.mapping_fields(mapping), ["name", "progress", "subject"])
+
+        row = {"name": "TASK-1", "subject": None, "progress": 40.0, "site_url": "https://erp"}
+        self.assertEqual(export.render_mapping(mapping, row), {
+            "title": None,
+            "uri": "https://erp/app/task/TASK-1",
+            "attributes": {"progress": 40.0, "label": "40% of "}
+        })
+
+        # Null numbers keep their format spec, a spec that doesn't fit the value is skipped
+        row = {"name": "TASK-2", "subject": "Pumps", "progress": None, "qty": 2.5}
+        self.assertEqual(export.render_mapping("{progress:.0f}% of {subject}, {qty:d} units", row),
+            "% of Pumps, 2.5 units")
@@ -0,0 +1,45 @@
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from ai_integration.utils import permissions
+from ai_integration.utils.permissions import filter_permitted_references
+
+TEST_USER = "ai-permissions@example.com"
+
+class TestPermittedReferences(FrappeTestCase):
+    def setUp(self):
+        if not frappe.db.exists("User", TEST_USER):
+            frappe.get_doc({
+                "doctype": "User",
+                "email": TEST_USER,
+                "first_name": "AI Permissions",
+                "send_welcome_email": 0
+            }).insert(ignore_permissions=True)
+
+        frappe.local.ai_permission_cache = None
+        self.own = frappe.get_doc({"doctype": "ToDo", "description": "Own task", "allocated_to": TEST_USER}).insert()
+        self.other = frappe.get_doc({"doctype": "ToDo", "description": "Someone else's task"}).insert()
+        self.references = [("ToDo", self.own.name), ("ToDo", self.other.name)]
+
+    def tearDown(self):
+        frappe.local.ai_permission_cache = None
+
+    def test_unreadable_documents_are_dropped(self):
+        self.assertEqual(filter_permitted_references(self.references, user=TEST_USER), {("ToDo", self.own.name)})
+        self.assertEqual(filter_permitted_references(self.references, user="Administrator"), set(self.references))
+
+    def test_decisions_are_memoized_per_request(self):
+        with patch.object(permissions.frappe, "get_list", wraps=frappe.get_list) as get_list:
+            first = filter_permitted_references(self.references, user=TEST_USER)
+            second = filter_permitted_references(self.references, user=TEST_USER)
+        self.assertEqual(first, second)
+        # One query for the doctype, the second call is served from the memo
+        self.assertEqual(get_list.call_count, 1)
+        self.assertIs(frappe.local.ai_permission_cache[(TEST_USER, "read", "ToDo", self.other.name)], False)
+
+        # A new request starts with an empty memo
+        frappe.local.ai_permission_cache = None
+        with patch.object(permissions.frappe, "get_list", wraps=frappe.get_list) as get_list:
+            filter_permitted_references(self.references, user=TEST_USER)
+        self.assertEqual(get_list.call_count, 1)
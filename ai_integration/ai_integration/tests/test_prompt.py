@@ -0,0 +1,46 @@
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from ai_integration.utils.prompt import (
+    DEFAULT_CONTEXT_BUDGET_RATIO, MIN_TRIMMED_CHUNK_TOKENS, count_tokens, fit_context, fit_history, get_prompt_budget
+)
+
+def _words(prefix, count):
+    return " ".join(f"{prefix}{i}" for i in range(count))
+
+class TestPromptBudget(FrappeTestCase):
+    def test_budget_split(self):
+        self.assertEqual(get_prompt_budget(frappe._dict(prompt_token_budget=1000, context_budget_ratio=0.25)), (250, 750))
+        # An explicit 0 sends no context, only a missing value falls back to the default
+        self.assertEqual(get_prompt_budget(frappe._dict(prompt_token_budget=1000, context_budget_ratio=0)), (0, 1000))
+        context, _ = get_prompt_budget(frappe._dict(prompt_token_budget=1000))
+        self.assertEqual(context, int(1000 * DEFAULT_CONTEXT_BUDGET_RATIO))
+
+    def test_fit_context_keeps_best_chunks_and_trims_the_overflow(self):
+        first, second, third = _words("alpha", 100), _words("beta", 100), _words("gamma", 400)
+        separator = count_tokens("\n\n---\n\n")
+        budget = count_tokens(first) + count_tokens(second) + 2 * separator + MIN_TRIMMED_CHUNK_TOKENS + 10
+
+        kept = fit_context([first, second, third, "delta"], budget)
+        self.assertEqual(kept[:2], [first, second])
+        self.assertEqual(len(kept), 3)
+        self.assertTrue(kept[2].startswith("gamma0") and kept[2].endswith(" [...]"))
+
+        # Too little room left for a useful piece of the next chunk: it is dropped
+        self.assertEqual(fit_context([first, third], count_tokens(first) + MIN_TRIMMED_CHUNK_TOKENS // 2), [first])
+
+    def test_fit_history_keeps_recent_turns(self):
+        history = [{"role": "user" if i % 2 == 0 else "ai", "content": _words(f"turn{i}x", 30)} for i in range(10)]
+        history.append({"role": "user", "content": "current question"})
+        per_turn = count_tokens(f"user: {history[0]['content']}\n")
+
+        summary, recent = fit_history(history, "", per_turn * 3 + 5, message="current question")
+        self.assertEqual(summary, "")
+        # The newest turns survive in order, the current question isn't repeated
+        self.assertEqual([m["content"] for m in recent], [m["content"] for m in history[7:10]])
+
+        long_summary = _words("summary", 500)
+        summary, recent = fit_history(history, long_summary, 200, message="current question")
+        # At most half of the history budget, give or take re-tokenizing the cut
+        self.assertLessEqual(count_tokens(summary), 101)
+        self.assertTrue(long_summary.endswith(summary.strip()))
+        self.assertLessEqual(count_tokens(summary) + sum(count_tokens(f"{m['role']}: {m['content']}\n") for m in recent), 200)
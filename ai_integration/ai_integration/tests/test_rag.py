@@ -0,0 +1,124 @@
+import json
+import time
+import unittest
+from concurrent.futures import Future
+from unittest.mock import MagicMock, patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from ai_integration.utils import answer_cache, rag, vector_store
+from ai_integration.utils.embedding import get_live_generation
+from ai_integration.utils.tool_cache import ToolResultMemo
+from ai_integration.utils.vector_store import FaissVectorStore
+
+class _Registry:
+    """Tool registry stand-in recording when each call ran."""
+
+    def __init__(self):
+        self.runs = {}
+
+    def execute_tool(self, name, args):
+        started = time.monotonic()
+        time.sleep(args.get("sleep", 0.2))
+        self.runs[args["id"]] = (started, time.monotonic())
+        return args["id"]
+
+def _embedded(vector):
+    future = Future()
+    future.set_result(vector)
+    future.started = time.monotonic()
+    return future
+
+@unittest.skipUnless(vector_store.faiss, "faiss-cpu is not installed")
+class TestAnswerUserQuestion(FrappeTestCase):
+    def setUp(self):
+        FaissVectorStore._instances.pop(frappe.local.site, None)
+        answer_cache.get_answer_cache().invalidate()
+        todo = frappe.get_doc({"doctype": "ToDo", "description": "Pump delivery"}).insert()
+        frappe.get_doc({
+            "doctype": "AI Embedding",
+            "reference_doctype": "ToDo",
+            "reference_name": todo.name,
+            "chunk_index": 0,
+            "generation": get_live_generation(),
+            "content": "The pumps for PRJ-0042 arrive on Friday.",
+            "vector": json.dumps([1.0, 0.0, 0.0])
+        }).insert()
+
+        self.settings = frappe.get_single("AI Integration Settings")
+        self.settings.google_api_key = "test-key"
+        self.settings.enable_answer_cache = 0
+        self.settings.enable_context_cache = 0
+
+    def tearDown(self):
+        FaissVectorStore._instances.pop(frappe.local.site, None)
+        answer_cache.get_answer_cache().invalidate()
+
+    def ask(self, client):
+        with patch.object(rag, "get_settings", return_value=self.settings), \
+                patch.object(self.settings, "get_password", return_value="test-key"), \
+                patch.object(rag, "HAS_FAC", False), \
+                patch.object(rag.genai, "Client", return_value=client):
+            return rag.answer_user_question("When do the pumps for PRJ-0042 arrive?",
+                query_embedding=_embedded([1.0, 0.0, 0.0]))
+
+    def test_answer_end_to_end(self):
+        client = MagicMock()
+        client.models.generate_content.return_value = MagicMock(text="On Friday.", usage_metadata=None)
+
+        result = self.ask(client)
+
+        self.assertNotIn("error", result)
+        self.assertEqual(result["response"], "On Friday.")
+        self.assertEqual(len(result["context_used"]), 1)
+        prompt = client.models.generate_content.call_args.kwargs["contents"]
+        self.assertIn("The pumps for PRJ-0042 arrive on Friday.", prompt)
+        stages = {entry["stage"] for entry in result["trace"]}
+        self.assertTrue({"fetch", "permission", "llm"} <= stages)
+
+    def test_cache_hit_skips_index_sync(self):
+        self.settings.enable_answer_cache = 1
+        client = MagicMock()
+        client.models.generate_content.return_value = MagicMock(text="On Friday.", usage_metadata=None)
+        self.assertEqual(self.ask(client)["response"], "On Friday.")
+
+        with patch("ai_integration.utils.vector_store.get_vector_store") as get_store:
+            result = self.ask(client)
+        self.assertTrue(result["cached"])
+        self.assertEqual(result["response"], "On Friday.")
+        get_store.assert_not_called()
+        self.assertEqual(client.models.generate_content.call_count, 1)
+
+class TestExecuteToolCalls(FrappeTestCase):
+    settings = frappe._dict(tool_timeout=1, max_parallel_tools=4)
+    memo = ToolResultMemo(None, frozenset(("get_document",)))
+
+    def test_reads_run_concurrently_writes_in_order(self):
+        registry = _Registry()
+        calls = [
+            ("get_document", {"id": "read-1"}),
+            ("get_document", {"id": "read-2"}),
+            ("update_document", {"id": "write-1"}),
+            ("update_document", {"id": "write-2"}),
+            ("get_document", {"id": "read-3"})
+        ]
+        results, timings = rag.execute_tool_calls(registry, calls, self.settings, memo=self.memo)
+
+        self.assertEqual([r["result"] for r in results], ["read-1", "read-2", "write-1", "write-2", "read-3"])
+        self.assertEqual(len(timings), len(calls))
+        runs = registry.runs
+        # The leading reads overlap, every call from the first write on starts after the previous one ended
+        self.assertLess(runs["read-2"][0], runs["read-1"][1])
+        self.assertGreaterEqual(runs["write-1"][0], max(runs["read-1"][1], runs["read-2"][1]))
+        self.assertGreaterEqual(runs["write-2"][0], runs["write-1"][1])
+        self.assertGreaterEqual(runs["read-3"][0], runs["write-2"][1])
+
+    def test_each_call_gets_the_timeout(self):
+        registry = _Registry()
+        calls = [("get_document", {"id": "slow", "sleep": 1.5}), ("get_document", {"id": "fast"})]
+        results, timings = rag.execute_tool_calls(registry, calls, self.settings, memo=self.memo)
+
+        self.assertEqual(results[0]["status"], "error")
+        self.assertIn("timed out", results[0]["message"])
+        self.assertEqual(timings[0], 1000)
+        self.assertEqual(results[1], {"result": "fast"})
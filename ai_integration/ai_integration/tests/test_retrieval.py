@@ -0,0 +1,87 @@
+import frappe
+import numpy as np
+from frappe.tests.utils import FrappeTestCase
+from ai_integration.utils.context import merge_adjacent_chunks, mmr_select, strip_overlap
+from ai_integration.utils.lexical import BM25Index, reciprocal_rank_fusion, tokenize
+from ai_integration.utils.rag import retrieve_context
+
+class TestHybridRetrieval(FrappeTestCase):
+    def test_tokenize_keeps_identifiers(self):
+        tokens = tokenize("Invoice ACC-SINV-2024-00012 is <b>overdue</b>")
+        self.assertIn("acc-sinv-2024-00012", tokens)
+        self.assertIn("00012", tokens)
+        self.assertIn("overdue", tokens)
+        self.assertNotIn("b", tokens)
+
+    def test_bm25_exact_identifier(self):
+        index = BM25Index()
+        index.build([
+            ("emb-1", "Project PRJ-0001 kickoff meeting notes"),
+            ("emb-2", "Project PRJ-0002 is delayed due to supplier issues"),
+            ("emb-3", "General notes about projects and meetings"),
+        ])
+        results = index.search("status of PRJ-0002", k=2)
+        self.assertEqual(results[0]["name"], "emb-2")
+        self.assertEqual(index.search("nonexistent", k=5), [])
+
+    def test_stopword_match_is_not_exact(self):
+        index = BM25Index()
+        index.build([(f"emb-{i}", f"Meeting notes {i}: the supplier is on schedule") for i in range(30)]
+            + [("emb-id", "Project PRJ-0002 is delayed"), ("emb-rare", "Turbine vibration report")])
+
+        hits = {r["name"]: r["exact"] for r in index.search("what is the status of the supplier", k=40)}
+        self.assertTrue(hits)
+        self.assertFalse(any(hits.values()))
+        self.assertTrue(index.search("status of PRJ-0002", k=1)[0]["exact"])
+        self.assertTrue(index.search("the turbine", k=1)[0]["exact"])
+
+        # Below the cosine cutoff a stopword-only lexical hit doesn't reach the prompt
+        search_results = [
+            {"name": r["name"], "score": 0.1, "lexical_score": r["score"], "exact_match": r["exact"], "rrf_score": 0.01}
+            for r in index.search("what is the status", k=10)
+        ]
+        self.assertTrue(search_results)
+        self.assertEqual(retrieve_context(None, "what is the status", [1.0], search_results=search_results), [])
+
+    def test_bm25_update_matches_rebuild(self):
+        rows = [("emb-1", "alpha beta PRJ-0001"), ("emb-2", "beta gamma"), ("emb-3", "gamma alpha")]
+        index = BM25Index()
+        index.build(rows)
+        updated = index.updated({"emb-2"}, [("emb-2", "beta zeta"), ("emb-4", "new alpha")])
+
+        rebuilt = BM25Index()
+        rebuilt.build([rows[0], rows[2], ("emb-2", "beta zeta"), ("emb-4", "new alpha")])
+        for query in ("alpha", "beta zeta", "gamma", "prj-0001"):
+            self.assertEqual(updated.search(query), rebuilt.search(query))
+        # The original is left untouched for searches still running on it
+        self.assertEqual(index.search("gamma")[0]["name"], "emb-2")
+
+    def test_reciprocal_rank_fusion(self):
+        dense = [{"name": "a"}, {"name": "b"}, {"name": "c"}]
+        lexical = [{"name": "c"}, {"name": "b"}]
+        fused = [name for name, _ in reciprocal_rank_fusion([dense, lexical])]
+        # b and c appear in both lists and outrank a
+        self.assertEqual(set(fused[:2]), {"b", "c"})
+        self.assertEqual(fused[-1], "a")
+
+    def test_merge_adjacent_chunks(self):
+        first = "Project notes: the supplier confirmed delivery of all pumps for the site next week."
+        second = first[30:] + " Installation starts right after."
+        items = [
+            {"doc": frappe._dict(reference_doctype="Project", reference_name="PRJ-1", chunk_index=1,
+                content=second), "relevance": 0.5, "vector": np.array([1.0, 0.0])},
+            {"doc": frappe._dict(reference_doctype="Project", reference_name="PRJ-1", chunk_index=0,
+                content=first), "relevance": 1.0, "vector": np.array([1.0, 0.0])},
+        ]
+        spans = merge_adjacent_chunks(items)
+        self.assertEqual(len(spans), 1)
+        self.assertEqual(spans[0]["content"], first + " Installation starts right after.")
+        self.assertEqual(strip_overlap(first, "unrelated"), "unrelated")
+
+    def test_mmr_prefers_novel_spans(self):
+        spans = [
+            {"relevance": 1.0, "vector": np.array([1.0, 0.0]), "id": "a"},
+            {"relevance": 0.9, "vector": np.array([1.0, 0.0]), "id": "duplicate"},
+            {"relevance": 0.6, "vector": np.array([0.0, 1.0]), "id": "b"},
+        ]
+        self.assertEqual([s["id"] for s in mmr_select(spans, 2)], ["a", "b"])
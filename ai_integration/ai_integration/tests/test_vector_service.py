@@ -0,0 +1,45 @@
+import os
+import tempfile
+import threading
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from ai_integration.utils import vector_service
+from ai_integration.utils.vector_service import VectorSearchServer, VectorServiceClient
+
+class TestVectorService(FrappeTestCase):
+    def test_protocol_round_trip(self):
+        reader = vector_service._Reader(vector_service.encode_search("status of PRJ-0001", [0.5, -1.0], 7, 50))
+        query_text, query_vector, k, candidate_docs, hybrid = vector_service.decode_search(reader)
+        self.assertEqual((query_text, list(query_vector), k, candidate_docs, hybrid),
+            ("status of PRJ-0001", [0.5, -1.0], 7, 50, True))
+
+        results = [
+            {"name": "emb-1", "score": 0.5, "lexical_score": None, "exact_match": False, "rrf_score": 0.25},
+            {"name": "emb-2", "score": 0.25, "lexical_score": 3.0, "exact_match": True, "rrf_score": 0.125}
+        ]
+        decoded = vector_service.decode_results(vector_service._Reader(vector_service.encode_results(results)))
+        self.assertEqual(decoded, results)
+
+    def test_client_reconnects_and_falls_back(self):
+        socket_path = os.path.join(tempfile.mkdtemp(), "vector.sock")
+        server = VectorSearchServer(socket_path, frappe.local.site, frappe.local.sites_path)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        client = VectorServiceClient(socket_path, frappe.local.site)
+        try:
+            self.assertEqual(client.health()["service"], socket_path)
+            # A pooled connection the server closed is replaced transparently
+            client._call(vector_service.OP_SYNC)
+            server.shutdown()
+            server.server_close()
+            os.unlink(socket_path)
+            server = VectorSearchServer(socket_path, frappe.local.site, frappe.local.sites_path)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self.assertEqual(client.health()["service"], socket_path)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        # Without a service the in-process store answers
+        self.assertEqual(client.health()["service"], "unavailable")
@@ -0,0 +1,176 @@
+import json
+import unittest
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from ai_integration.utils import vector_store
+from ai_integration.utils.embedding import delete_stale_generations, get_live_generation, switch_generation
+from ai_integration.utils.vector_store import FaissVectorStore, get_vector_store
+
+@unittest.skipUnless(vector_store.faiss, "faiss-cpu is not installed")
+class TestVectorStore(FrappeTestCase):
+    def setUp(self):
+        FaissVectorStore._instances.pop(frappe.local.site, None)
+        self.todo = frappe.get_doc({"doctype": "ToDo", "description": "Vector store snapshot test"}).insert()
+        self.insert_chunks(get_live_generation(), ([1.0, 0.0, 0.0], [0.0, 1.0, 0.0]))
+
+    def insert_chunks(self, generation, vectors):
+        return [
+            frappe.get_doc({
+                "doctype": "AI Embedding",
+                "reference_doctype": "ToDo",
+                "reference_name": self.todo.name,
+                "chunk_index": i,
+                "generation": generation,
+                "content": f"chunk {i} of generation {generation}",
+                "vector": json.dumps(vector)
+            }).insert().name
+            for i, vector in enumerate(vectors)
+        ]
+
+    def tearDown(self):
+        FaissVectorStore._instances.pop(frappe.local.site, None)
+
+    def test_health_and_snapshot(self):
+        store = get_vector_store()
+        self.assertEqual(store.health()["status"], "cold")
+
+        store.sync()
+        health = store.health()
+        self.assertEqual(health["status"], "ready")
+        self.assertEqual(health["vectors"], store.index.ntotal)
+        self.assertEqual(health["dimension"], 3)
+        self.assertEqual(health["build_source"], "database")
+
+        # A new process loads the snapshot of the same version instead of rebuilding
+        FaissVectorStore._instances.pop(frappe.local.site, None)
+        reloaded = get_vector_store()
+        reloaded.sync()
+        self.assertEqual(reloaded.build_source, "snapshot")
+        self.assertEqual(reloaded.doc_map, store.doc_map)
+        self.assertEqual(reloaded.search([1.0, 0.0, 0.0], k=1)[0]["name"], store.search([1.0, 0.0, 0.0], k=1)[0]["name"])
+
+    def test_failed_warm_up_is_reported_and_retried(self):
+        store = get_vector_store()
+        site = frappe.local.site
+        self.addCleanup(vector_store._warm_retry_after.pop, site, None)
+        self.addCleanup(vector_store._warmed_sites.discard, site)
+
+        with patch.object(FaissVectorStore, "sync", side_effect=Exception("snapshot unreadable")):
+            self.assertRaises(Exception, vector_store.warm_up)
+        health = store.health()
+        self.assertEqual(health["status"], "failed")
+        self.assertEqual(health["warm_up_error"]["error"], "snapshot unreadable")
+
+        # A failed background warm-up leaves the site to be warmed by a later request
+        vector_store._warmed_sites.add(site)
+        with patch.object(vector_store, "run_in_site_context", side_effect=Exception("snapshot unreadable")):
+            vector_store._warm_up_in_background({"site": site})
+        self.assertNotIn(site, vector_store._warmed_sites)
+        self.assertIn(site, vector_store._warm_retry_after)
+
+        vector_store.warm_up()
+        health = store.health()
+        self.assertEqual(health["status"], "ready")
+        self.assertIsNone(health["warm_up_error"])
+
+    @patch("frappe.enqueue")
+    def test_rebuild_switches_generation(self, enqueue):
+        store = get_vector_store()
+        store.sync()
+        live = get_live_generation()
+        served = list(store.doc_map)
+
+        # Rows of the generation being built are not served
+        frappe.db.set_single_value("AI Integration Settings", "building_generation", live + 1)
+        rebuilt = self.insert_chunks(live + 1, ([0.0, 0.0, 1.0],))
+        store.sync()
+        self.assertEqual(store.doc_map, served)
+
+        with patch.object(frappe.db, "commit"):
+            switch_generation(live + 1)
+            store.sync()
+            self.assertEqual(store.doc_map, rebuilt)
+
+            delete_stale_generations()
+            self.assertFalse(frappe.db.exists("AI Embedding", {"generation": ["<", live + 1]}))
+
+    def test_refresh_references(self):
+        store = get_vector_store()
+        store.sync()
+        reference = ("ToDo", self.todo.name)
+        before = set(store.chunks_by_reference[reference])
+
+        frappe.db.delete("AI Embedding", {"name": ["in", list(before)]})
+        added = self.insert_chunks(get_live_generation(), ([0.0, 0.0, 1.0],))
+        store.refresh_references([reference])
+
+        self.assertEqual(store.chunks_by_reference[reference], added)
+        self.assertFalse(before & set(store.doc_map))
+        self.assertEqual(store.index.ntotal, len(store.doc_map))
+        self.assertEqual(store.search([0.0, 0.0, 1.0], k=1)[0]["name"], added[0])
+
+    def test_refresh_keeps_unnotified_rows_visible(self):
+        store = get_vector_store()
+        store.sync()
+
+        # A chunk written without notifying the service, then a refreshed one
+        other = frappe.get_doc({"doctype": "ToDo", "description": "Unnotified"}).insert()
+        unnotified = frappe.get_doc({
+            "doctype": "AI Embedding",
+            "reference_doctype": "ToDo",
+            "reference_name": other.name,
+            "chunk_index": 0,
+            "generation": get_live_generation(),
+            "content": "unnotified chunk",
+            "vector": json.dumps([0.0, 0.0, 1.0])
+        }).insert().name
+        self.insert_chunks(get_live_generation(), ([0.5, 0.5, 0.0],))
+        store.refresh_references([("ToDo", self.todo.name)])
+        self.assertNotIn(unnotified, store.doc_map)
+
+        store.sync()
+        self.assertIn(unnotified, store.doc_map)
+
+    def test_two_stage_search(self):
+        other = frappe.get_doc({"doctype": "ToDo", "description": "Second document"}).insert()
+        for i, vector in enumerate(([0.0, 0.0, 1.0], [0.1, 0.0, 1.0])):
+            frappe.get_doc({
+                "doctype": "AI Embedding",
+                "reference_doctype": "ToDo",
+                "reference_name": other.name,
+                "chunk_index": i,
+                "generation": get_live_generation(),
+                "content": f"chunk {i} of the second document",
+                "vector": json.dumps(vector)
+            }).insert()
+
+        store = get_vector_store()
+        store.sync()
+        self.assertEqual(store.centroid_index.ntotal, len(store.centroid_refs))
+        self.assertIn(("ToDo", other.name), store.centroid_refs)
+
+        # Only chunks of the single closest document are ranked
+        results = store._vector_search([0.0, 0.2, 1.0], k=5, candidate_docs=1)
+        self.assertEqual(set(store.chunks_by_reference[("ToDo", other.name)]), {r["name"] for r in results})
+        exhaustive = store._vector_search([0.0, 0.2, 1.0], k=2)
+        self.assertEqual([r["name"] for r in results], [r["name"] for r in exhaustive])
+
+        # A document's chunks beyond the cap give way to the next candidate's
+        third = frappe.get_doc({"doctype": "ToDo", "description": "Third document"}).insert()
+        frappe.get_doc({
+            "doctype": "AI Embedding",
+            "reference_doctype": "ToDo",
+            "reference_name": third.name,
+            "chunk_index": 0,
+            "generation": get_live_generation(),
+            "content": "chunk 0 of the third document",
+            "vector": json.dumps([-1.0, 0.0, 0.0])
+        }).insert()
+        store.sync()
+        owner = {name: ref for ref, names in store.chunks_by_reference.items() for name in names}
+        with patch.object(vector_store, "MAX_CHUNKS_PER_DOCUMENT", 1):
+            capped = store._vector_search([0.0, 0.2, 1.0], k=2, candidate_docs=2)
+        self.assertEqual(len({owner[r["name"]] for r in capped}), 2)
+        self.assertEqual(capped[0]["name"], results[0]["name"])
@@ -0,0 +1,121 @@
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import frappe
+from ai_integration.ai_integration.mcp import tool, tools
+from ai_integration.utils.concurrency import get_executor, result_within, submit_with_timeout
+from ai_integration.utils.metrics import record_span
+from ai_integration.utils.rag import DEFAULT_MAX_PARALLEL_TOOLS, DEFAULT_TOOL_TIMEOUT
+
+MAX_BATCH_CALLS = 25
+
+def _error(e):
+    return {"error": str(e) or type(e).__name__, "type": type(e).__name__}
+
+def _resolve(call):
+    """Returns (tool, arguments) of one invocation, raising ValueError if it is malformed."""
+    if not isinstance(call, dict):
+        raise ValueError("Each call must be an object with 'tool' and 'arguments'")
+    name = call.get("tool")
+    if name == "batch_call" or name not in tools:
+        raise ValueError(f"Unknown tool: {name}")
+    arguments = call.get("arguments") or {}
+    if not isinstance(arguments, dict):
+        raise ValueError("'arguments' must be an object")
+    return tools[name], arguments
+
+def _timed(fn, arguments):
+    started = time.monotonic()
+    result = fn(**arguments)
+    return result, (time.monotonic() - started) * 1000
+
+def _run_inline(name, fn, arguments):
+    """Runs a call on the request's own connection, undoing its writes if it fails."""
+    savepoint = f"batch_{frappe.generate_hash(length=8)}"
+    messages = len(frappe.local.message_log or [])
+    frappe.db.savepoint(savepoint)
+    try:
+        result, duration_ms = _timed(fn, arguments)
+        record_span("mcp_tool", duration_ms, label=name, status="ok")
+        return {"result": result}
+    except Exception as e:
+        frappe.db.rollback(save_point=savepoint)
+        # The error is reported in the call's result, not as a message of the whole request
+        if frappe.local.message_log:
+            del frappe.local.message_log[messages:]
+        record_span("mcp_tool", 0, label=name, status="error")
+        return _error(e)
+
+def _run_concurrently(calls, settings):
+    """Runs read-only calls on a bounded thread pool, each in its own site context."""
+    timeout = settings.tool_timeout or DEFAULT_TOOL_TIMEOUT
+    max_workers = min(len(calls), settings.max_parallel_tools or DEFAULT_MAX_PARALLEL_TOOLS)
+    executor = get_executor(max_workers, thread_name_prefix="ai_mcp_batch")
+    try:
+        futures = [submit_with_timeout(executor, _timed, entry.fn, arguments) for _, entry, arguments in calls]
+        # Each call gets `timeout` seconds from when a worker starts it
+
+        results = []
+        for (name, _, _), future in zip(calls, futures, strict=True):
+            try:
+                result, duration_ms = result_within(future, timeout)
+                record_span("mcp_tool", duration_ms, label=name, status="ok")
+                results.append({"result": result})
+            except FutureTimeoutError:
+                record_span("mcp_tool", timeout * 1000, label=name, status="timeout")
+                results.append({"error": f"Tool {name} timed out after {timeout}s", "type": "TimeoutError"})
+            except Exception as e:
+                record_span("mcp_tool", 0, label=name, status="error")
+                results.append(_error(e))
+        return results
+    finally:
+        # Don't wait for timed out calls, their threads finish in the background
+        executor.shutdown(wait=False)
+
+@tool()
+def batch_call(calls: list):
+    """
+    Run several tool calls in one request. Prefer this over separate calls when you
+    already know what you need, e.g. fetching several documents.
+
+    Args:
+        calls: List of invocations, each {"tool": "<tool name>", "arguments": {...}}, at most 25.
+
+    Returns one entry per call, in the same order: {"result": ...} or {"error": "...", "type": "..."}.
+    A failing call does not affect the others. Read-only tools (list_documents, get_document,
+    get_doctype_schema, search_knowledge_base_chunks) run concurrently until the first call
+    that may write; from there on calls run one after another so they see earlier writes.
+    """
+    if not isinstance(calls, list) or not calls:
+        frappe.throw("calls must be a non-empty list")
+    if len(calls) > MAX_BATCH_CALLS:
+        frappe.throw(f"At most {MAX_BATCH_CALLS} calls per batch")
+
+    results = [None] * len(calls)
+    resolved = []
+    for idx, call in enumerate(calls):
+        try:
+            entry, arguments = _resolve(call)
+            resolved.append((idx, call["tool"], entry, arguments))
+        except ValueError as e:
+            results[idx] = _error(e)
+
+    # Leading read-only calls can't observe writes of this batch, they may run in other connections
+    leading = []
+    for item in resolved:
+        if not item[2].read_only:
+            break
+        leading.append(item)
+    if len(leading) < 2:
+        leading = []
+
+    if leading:
+        settings = frappe.get_cached_doc("AI Integration Settings")
+        concurrent = _run_concurrently([(name, entry, arguments) for _, name, entry, arguments in leading], settings)
+        for (idx, _, _, _), result in zip(leading, concurrent, strict=True):
+            results[idx] = result
+
+    for idx, name, entry, arguments in resolved[len(leading):]:
+        results[idx] = _run_inline(name, entry.fn, arguments)
+
+    return results
@@ -1,47 +1,236 @@
+import json
+
 import frappe
-from ai_integration.ai_integration.mcp import mcp
+from frappe.utils import cint
+from ai_integration.ai_integration.mcp import tool
+from ai_integration.utils.schema import get_compact_schema
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 500
+
+# Results are cut down to this many bytes of JSON, callers can only ask for less
+MAX_RESULT_BYTES = 64 * 1024
+
+# Rough size of a token in JSON output, turns a token cap into a byte cap
+BYTES_PER_TOKEN = 4
+
+# Longer text values are truncated with a marker
+MAX_VALUE_CHARS = 2000
+
+# Bookkeeping fields left out of child rows unless they are selected explicitly
+_CHILD_META_FIELDS = frozenset((
+    "name", "owner", "creation", "modified", "modified_by", "docstatus", "idx",
+    "parent", "parentfield", "parenttype", "doctype"
+))
+
+def _size(value):
+    return len(json.dumps(value, default=str, separators=(",", ":")))
+
+def _byte_cap(max_bytes=None, max_tokens=None):
+    caps = [cap for cap in (cint(max_bytes), cint(max_tokens) * BYTES_PER_TOKEN) if cap > 0]
+    return min([*caps, MAX_RESULT_BYTES])
 
-@mcp.tool()
-def list_documents(doctype: str, filters: dict = None, fields: list = None, limit: int = 20):
+# Upper bound on the length of the "...[truncated N chars]" marker
+_MARKER_CHARS = 32
+
+# Parent fields that are never shortened to fit the cap
+_KEEP_FIELDS = frozenset(("name", "doctype"))
+
+def _truncate_value(value, limit=MAX_VALUE_CHARS):
+    if isinstance(value, str) and len(value) > limit:
+        return f"{value[:limit]} ...[truncated {len(value) - limit} chars]"
+    return value
+
+def _filter_list(filters):
+    if not filters:
+        return []
+    if isinstance(filters, dict):
+        return [[key, *value] if isinstance(value, list | tuple) else [key, "=", value]
+            for key, value in filters.items()]
+    return list(filters)
+
+def _encode_cursor(row):
+    return f"{row.modified}|{row.name}"
+
+def _decode_cursor(cursor):
+    if not cursor or "|" not in cursor:
+        frappe.throw("Invalid cursor")
+    return cursor.split("|", 1)
+
+@tool(read_only=True)
+def list_documents(doctype: str, filters: dict | None = None, fields: list | None = None, limit: int = 20,
+        cursor: str | None = None, max_bytes: int | None = None, max_tokens: int | None = None):
     """
-    List documents of a given DocType.
+    List documents of a given DocType, newest first.
 
     Args:
         doctype: The DocType to list documents from.
         filters: Dictionary of filters (e.g. {"status": "Open"}).
-        fields: List of fields to fetch.
-        limit: Number of documents to fetch (default 20).
+        fields: List of fields to fetch (name and modified are always included).
+        limit: Number of documents to fetch (default 20, at most 500).
+        cursor: next_cursor of the previous page, to continue where it ended.
+        max_bytes: Cap on the size of the result (at most 64 KB).
+        max_tokens: Cap on the size of the result in tokens (estimated).
+
+    Returns {"data": [...], "next_cursor": str or null, "truncated": bool}. Long
+    values are cut with a "...[truncated N chars]" marker; when the size cap cut the
+    page short, "truncated" is true and next_cursor continues after the last row.
+    """
+    limit = min(max(cint(limit) or DEFAULT_LIMIT, 1), MAX_LIMIT)
+    fields = list(dict.fromkeys([*(fields or []), "name", "modified"]))
+    filters = _filter_list(filters)
+
+    # Keyset on (modified, name): rows sharing the cursor's timestamp, then older ones
+    rows = []
+    if cursor:
+        modified, name = _decode_cursor(cursor)
+        rows = frappe.get_list(doctype, fields=fields,
+            filters=[*filters, ["modified", "=", modified], ["name", "<", name]],
+            order_by="name desc",
+            limit_page_length=limit + 1
+        )
+    if len(rows) <= limit:
+        rows += frappe.get_list(doctype, fields=fields,
+            filters=filters + ([["modified", "<", modified]] if cursor else []),
+            order_by="modified desc, name desc",
+            limit_page_length=limit + 1 - len(rows)
+        )
+
+    has_more = len(rows) > limit
+    cap = _byte_cap(max_bytes, max_tokens)
+
+    data, used, truncated = [], 2, False
+    for row in rows[:limit]:
+        row = frappe._dict({key: _truncate_value(value) for key, value in row.items()})
+        cost = _size(row) + 1
+        if data and used + cost > cap:
+            truncated = True
+            break
+        data.append(row)
+        used += cost
+
+    return {
+        "data": data,
+        "next_cursor": _encode_cursor(data[-1]) if data and (has_more or truncated) else None,
+        "truncated": truncated
+    }
+
+def _parse_projection(meta, fields):
+    """
+    Splits a projection into (parent fields, {table: child fields}), None meaning all.
+    "items" selects a child table with all its fields, "items.item_code" single fields of it.
     """
-    return frappe.get_list(doctype, filters=filters, fields=fields, limit_page_length=limit)
+    if not fields:
+        return None, None
+
+    table_fieldnames = {df.fieldname for df in meta.get_table_fields()}
+    parent, children = {"name"}, {}
+    for field in fields:
+        table, _, child_field = field.partition(".")
+        if table in table_fieldnames:
+            if not child_field or child_field == "*":
+                children[table] = None
+            elif children.get(table, set()) is not None:
+                children.setdefault(table, set()).add(child_field)
+        else:
+            parent.add(field)
+    return parent, children
+
+def _project_child(row, selected):
+    if selected is None:
+        return {k: _truncate_value(v) for k, v in row.items()
+            if k not in _CHILD_META_FIELDS and v not in (None, "")}
+    return {k: _truncate_value(row.get(k)) for k in selected}
 
-@mcp.tool()
-def get_document(doctype: str, name: str):
+def _fit_tables(data, table_keys, cap):
+    """Drops trailing child rows, largest tables first, until data fits the cap."""
+    truncated = {}
+    size = _size(data)
+    for key in sorted(table_keys, key=lambda k: _size(data[k]), reverse=True):
+        if size <= cap:
+            break
+        rows, total = data[key], len(data[key])
+        excess = size - cap
+        while rows and excess > 0:
+            excess -= _size(rows.pop()) + 1
+        truncated[key] = {"returned": len(rows), "total": total}
+        size = _size(data)
+    return truncated
+
+def _fit_fields(data, values, cap):
+    """Shortens the longest parent values until data fits the cap."""
+    truncated = {}
+    size = _size(data)
+    for key in sorted(values, key=lambda k: len(values[k]), reverse=True):
+        if size <= cap:
+            break
+        value = values[key]
+        keep = max(min(len(value), MAX_VALUE_CHARS) - (size - cap) - _MARKER_CHARS, 0)
+        if keep >= len(value):
+            continue
+        data[key] = _truncate_value(value, keep)
+        truncated[key] = {"returned_chars": keep, "total_chars": len(value)}
+        size = _size(data)
+    return truncated
+
+@tool(read_only=True)
+def get_document(doctype: str, name: str, fields: list | None = None, max_bytes: int | None = None,
+        max_tokens: int | None = None):
     """
     Get a specific document by name.
 
     Args:
         doctype: The DocType of the document.
         name: The name (ID) of the document.
+        fields: Fields to return. Use "items" for a whole child table or "items.item_code"
+            for single child fields. By default all fields with a value are returned.
+        max_bytes: Cap on the size of the result (at most 64 KB).
+        max_tokens: Cap on the size of the result in tokens (estimated).
+
+    Long values are cut with a "...[truncated N chars]" marker. When the document had
+    to be shortened to fit the cap, "_truncated" lists the returned and total rows per
+    child table and the returned and total characters per parent field.
     """
     doc = frappe.get_doc(doctype, name)
-    return doc.as_dict()
+    doc.check_permission("read")
+
+    meta = frappe.get_meta(doctype)
+    parent_fields, child_fields = _parse_projection(meta, fields)
+    table_fieldnames = {df.fieldname for df in meta.get_table_fields()}
+
+    data, values = {}, {}
+    for key, value in doc.as_dict(no_nulls=not fields).items():
+        if key in table_fieldnames:
+            if child_fields is None or key in child_fields:
+                selected = child_fields.get(key) if child_fields else None
+                data[key] = [_project_child(row, selected) for row in value]
+        elif parent_fields is None or key in parent_fields:
+            data[key] = _truncate_value(value)
+            if key not in _KEEP_FIELDS and isinstance(value, str | dict | list):
+                values[key] = value if isinstance(value, str) else json.dumps(value, default=str)
 
-@mcp.tool()
-def get_doctype_schema(doctype: str):
+    # Child rows go first, long text and JSON values of the parent only if that wasn't enough
+    cap = _byte_cap(max_bytes, max_tokens)
+    truncated = _fit_tables(data, [k for k in data if k in table_fieldnames], cap)
+    truncated.update(_fit_fields(data, values, cap))
+    if truncated:
+        data["_truncated"] = truncated
+    return data
+
+@tool(read_only=True)
+def get_doctype_schema(doctype: str, include_child_tables: bool = True):
     """
     Get the schema (field definitions) for a DocType.
+    Each field is one line: "fieldname: Fieldtype(options) required "Label"".
 
     Args:
         doctype: The DocType to get schema for.
+        include_child_tables: Also return the fields of its child tables.
     """
-    meta = frappe.get_meta(doctype)
-    fields = []
-    for field in meta.fields:
-        fields.append({
-            "fieldname": field.fieldname,
-            "label": field.label,
-            "fieldtype": field.fieldtype,
-            "options": field.options,
-            "reqd": field.reqd
-        })
-    return fields
+    schema = dict(get_compact_schema(doctype))
+    if include_child_tables:
+        schema["child_tables"] = {
+            fieldname: get_compact_schema(child_doctype)
+            for fieldname, child_doctype in schema.get("child_tables", {}).items()
+        }
+    return schema
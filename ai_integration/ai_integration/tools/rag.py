@@ -1,7 +1,12 @@
-from ai_integration.ai_integration.mcp import mcp
-from ai_integration.utils.rag import answer_user_question
+from frappe.utils import cint
+from ai_integration.ai_integration.mcp import tool
+from ai_integration.utils.embedding import resolve_embedding, start_embedding
+from ai_integration.utils.rag import answer_user_question, retrieve_context
 
-@mcp.tool()
+MAX_QUERIES = 10
+MAX_K = 20
+
+@tool()
 def search_knowledge_base(query: str):
     """
     Search the knowledge base using RAG (Retrieval Augmented Generation) to answer a question.
@@ -11,3 +16,67 @@ def search_knowledge_base(query: str):
         query: The question or search query.
     """
     return answer_user_question(query)
+
+@tool(read_only=True)
+def search_knowledge_base_chunks(queries: list, k: int = 5, doctypes: list | None = None):
+    """
+    Search the knowledge base and return the matching passages, without generating an answer.
+    Much faster than search_knowledge_base; use it to gather context and reason over it yourself.
+
+    Args:
+        queries: One or more search queries (up to 10), each searched separately.
+        k: Passages to return per query (default 5, at most 20).
+        doctypes: Only return passages from these DocTypes (e.g. ["Project", "Task"]).
+
+    Returns one entry per query with its passages, best first: reference_doctype,
+    reference_name, content, score (cosine similarity) and relevance (fused rank, best = 1).
+    Only passages of documents the user may read are returned.
+    """
+    from ai_integration.utils.vector_store import get_vector_store
+
+    if isinstance(queries, str):
+        queries = [queries]
+    queries = [q for q in queries or [] if q and q.strip()][:MAX_QUERIES]
+    k = min(max(cint(k) or 5, 1), MAX_K)
+
+    # Candidates are filtered by doctype after the search, fetch more when filtering
+    candidates = max(10, 2 * k) * (3 if doctypes else 1)
+
+    # All queries embed concurrently while the index syncs
+    embeddings = [start_embedding(q) for q in queries]
+    vector_store = get_vector_store()
+    vector_store.sync()
+
+    query_vectors = [resolve_embedding(embedding) for embedding in embeddings]
+
+    # One search request for all queries, a single round trip with the vector search service
+    embedded = [(query, vector) for query, vector in zip(queries, query_vectors, strict=True) if vector]
+    search_results = dict(zip(
+        (query for query, _ in embedded),
+        vector_store.hybrid_search_batch(embedded, k=candidates) if embedded else [],
+        strict=True
+    ))
+
+    results = []
+    for query, query_vector in zip(queries, query_vectors, strict=True):
+        if not query_vector:
+            results.append({"query": query, "error": "Failed to generate embedding for query."})
+            continue
+
+        passages = retrieve_context(vector_store, query, query_vector,
+            top_k=k, candidates=candidates, doctypes=doctypes, search_results=search_results[query])
+        results.append({
+            "query": query,
+            "passages": [
+                {
+                    "reference_doctype": p["reference_doctype"],
+                    "reference_name": p["reference_name"],
+                    "content": p["content"],
+                    "score": round(float(p["score"]), 4),
+                    "relevance": round(float(p["relevance"]), 4)
+                }
+                for p in passages
+            ]
+        })
+
+    return results
@@ -1,5 +1,13 @@
 import frappe
+import json
+from frappe.query_builder import Order
+from frappe.utils import add_to_date, cint, get_datetime, now_datetime
 from ai_integration.utils.rag import answer_user_question
+from ai_integration.utils.embedding import start_embedding
+from ai_integration.utils.history import drop_window, get_recent_history, needs_summary_update, update_session_summary
+
+# Queued questions older than this are assumed lost and no longer count against the user's limit
+CHAT_JOB_TIMEOUT = 600
 
 @frappe.whitelist()
 def send_message(message, session_id=None):
@@ -7,6 +15,12 @@ def send_message(message, session_id=None):
         return {"error": "Message is required."}
 
     user = frappe.session.user
+    settings = frappe.get_cached_doc("AI Integration Settings")
+
+    if settings.async_chat:
+        limit = settings.max_concurrent_chats or 2
+        if count_queued_messages(user) >= limit:
+            return {"error": f"You already have {limit} questions being answered. Please wait for them to finish."}
 
     # Create or Get Session
     if not session_id:
@@ -29,6 +43,38 @@ def send_message(message, session_id=None):
         if not frappe.has_permission("AI Chat Session", doc=session_id, ptype="read"):
              return {"error": "Permission Denied."}
 
+    if settings.async_chat:
+        # Persist the question and answer it in a background job, so the LLM call
+        # doesn't hold a web worker. The answer arrives over realtime or via polling.
+        user_msg_doc = frappe.get_doc({
+            "doctype": "AI Chat Message",
+            "session": session_id,
+            "role": "user",
+            "content": message,
+            "status": "Queued"
+        })
+        user_msg_doc.insert(ignore_permissions=True)
+
+        frappe.enqueue("ai_integration.api.chat.process_chat_message",
+            queue=settings.chat_queue or "long",
+            timeout=CHAT_JOB_TIMEOUT,
+            enqueue_after_commit=True,
+            message_id=user_msg_doc.name
+        )
+
+        return {
+            "status": "Queued",
+            "message_id": user_msg_doc.name,
+            "session_id": session_id
+        }
+
+    # Embed the question while the message is saved and history is loaded
+    try:
+        query_embedding = start_embedding(message)
+    except Exception:
+        # e.g. no API key, answer_user_question reports it
+        query_embedding = None
+
     # Save User Message
     user_msg_doc = frappe.get_doc({
         "doctype": "AI Chat Message",
@@ -38,18 +84,23 @@ def send_message(message, session_id=None):
     })
     user_msg_doc.insert(ignore_permissions=True)
 
-    # Fetch Recent History (Last 20 messages)
-    # We fetch descending to get the LATEST messages, then reverse for prompt order
-    history_docs = frappe.get_all("AI Chat Message",
-        filters={"session": session_id},
-        fields=["role", "content"],
-        order_by="creation desc",
-        limit=20
-    )
-    history_docs.reverse()
+    rag_response, ai_content = _answer_and_save(session_id, message, user_msg_doc.name, query_embedding)
+
+    # Return result with session_id so frontend can update URL
+    return {
+        "response": ai_content,
+        "session_id": session_id,
+        "context_used": rag_response.get("context_used", [])
+    }
+
+def _answer_and_save(session_id, message, message_id, query_embedding=None):
+    """Runs the RAG pipeline for a saved user message and stores the AI reply."""
+    # Fetch the rolling summary and the recent messages not yet folded into it
+    history_summary, history_docs = get_recent_history(session_id)
 
     # Call RAG Logic
-    rag_response = answer_user_question(message, chat_history=history_docs)
+    rag_response = answer_user_question(message, chat_history=history_docs, history_summary=history_summary,
+        session_id=session_id, query_embedding=query_embedding)
 
     ai_content = ""
     if "response" in rag_response:
@@ -64,42 +115,156 @@ def send_message(message, session_id=None):
         "doctype": "AI Chat Message",
         "session": session_id,
         "role": "ai",
-        "content": ai_content
+        "content": ai_content,
+        "reply_to": message_id
     })
+    if rag_response.get("trace") and frappe.db.get_single_value("AI Integration Settings", "attach_trace_to_messages"):
+        # Per-stage timings for slow query analysis
+        ai_msg_doc.trace = json.dumps(rag_response["trace"])
     ai_msg_doc.insert(ignore_permissions=True)
 
-    # Return result with session_id so frontend can update URL
-    return {
-        "response": ai_content,
-        "session_id": session_id,
-        "context_used": rag_response.get("context_used", [])
-    }
+    # Fold older turns into the session summary outside the request
+    if needs_summary_update(session_id):
+        frappe.enqueue(update_session_summary, session_id=session_id, queue='short',
+            enqueue_after_commit=True, job_id=f"ai_chat_summary:{session_id}", deduplicate=True)
+
+    return rag_response, ai_content
+
+def count_queued_messages(user):
+    return frappe.db.count("AI Chat Message", {
+        "owner": user,
+        "status": "Queued",
+        "creation": [">", add_to_date(now_datetime(), seconds=-CHAT_JOB_TIMEOUT)]
+    })
+
+def process_chat_message(message_id):
+    """Background job: answers a queued user message and notifies the user."""
+    msg = frappe.db.get_value("AI Chat Message", message_id,
+        ["session", "content", "status", "owner"], as_dict=True)
+    if not msg or msg.status != "Queued":
+        return
+
+    event = {"message_id": message_id, "session_id": msg.session}
+    try:
+        rag_response, ai_content = _answer_and_save(msg.session, msg.content, message_id)
+        status = "Failed" if "error" in rag_response else "Answered"
+        event.update({
+            "response": ai_content,
+            "context_used": rag_response.get("context_used", [])
+        })
+    except Exception as e:
+        frappe.db.rollback()
+        frappe.log_error(f"Chat job failed for {message_id}: {e}", "AI Chat")
+        status = "Failed"
+        event["error"] = "Sorry, I encountered an error while answering."
+
+    event["status"] = status
+    frappe.db.set_value("AI Chat Message", message_id, "status", status, update_modified=False)
+    frappe.db.commit()
+
+    frappe.publish_realtime("ai_chat_response", event, user=msg.owner)
 
 @frappe.whitelist()
-def get_user_sessions():
+def get_message_status(message_id):
+    """Polling fallback for async chat: the status of a queued message and its reply once answered."""
+    msg = frappe.db.get_value("AI Chat Message", message_id, ["session", "status"], as_dict=True)
+    if not msg:
+        return {"error": "Message not found"}
+
+    if not frappe.has_permission("AI Chat Session", doc=msg.session, ptype="read"):
+        return {"error": "Permission denied"}
+
+    result = {"message_id": message_id, "session_id": msg.session, "status": msg.status}
+    if msg.status in ("Answered", "Failed"):
+        reply = frappe.db.get_value("AI Chat Message", {"reply_to": message_id}, "content")
+        if reply:
+            result["response"] = reply
+        else:
+            result["error"] = "Sorry, I encountered an error while answering."
+    return result
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Messages deleted per statement when a session is removed
+DELETE_BATCH_SIZE = 1000
+
+def encode_cursor(timestamp, name):
+    return f"{timestamp}|{name}"
+
+def decode_cursor(cursor):
+    timestamp, _, name = (cursor or "").partition("|")
+    if not timestamp or not name:
+        frappe.throw("Invalid cursor")
+    return get_datetime(timestamp), name
+
+def _page_size(page_size):
+    return min(max(cint(page_size) or DEFAULT_PAGE_SIZE, 1), MAX_PAGE_SIZE)
+
+def _keyset_page(table, condition, sort_field, fields, page_size, before=None, after=None):
+    """
+    Fetches one page ordered by (sort_field, name) using a keyset cursor instead of an offset,
+    so every page is a single index range scan. Returns (rows, has_more), rows newest first
+    unless `after` is given.
+    """
+    sort_col = table[sort_field]
+    query = frappe.qb.from_(table).select(*[table[f] for f in fields]).where(condition)
+
+    if after:
+        ts, name = decode_cursor(after)
+        query = query.where((sort_col > ts) | ((sort_col == ts) & (table.name > name)))
+        order = Order.asc
+    else:
+        if before:
+            ts, name = decode_cursor(before)
+            query = query.where((sort_col < ts) | ((sort_col == ts) & (table.name < name)))
+        order = Order.desc
+
+    rows = query.orderby(sort_col, order=order).orderby(table.name, order=order).limit(page_size + 1).run(as_dict=True)
+    return rows[:page_size], len(rows) > page_size
+
+@frappe.whitelist()
+def get_user_sessions(before=None, page_size=None):
+    """Sessions of the current user, most recently active first, paginated with a `before` cursor."""
     user = frappe.session.user
-    sessions = frappe.get_all("AI Chat Session",
-        filters={"user": user},
-        fields=["name", "title", "creation"],
-        order_by="modified desc"
-    )
-    return sessions
+    page_size = _page_size(page_size)
+    Session = frappe.qb.DocType("AI Chat Session")
+
+    sessions, has_more = _keyset_page(Session, Session.user == user, "modified",
+        ["name", "title", "creation", "modified"], page_size, before=before)
+
+    return {
+        "sessions": sessions,
+        "next_cursor": encode_cursor(sessions[-1].modified, sessions[-1].name) if has_more else None
+    }
 
 @frappe.whitelist()
-def get_session_history(session_id):
+def get_session_history(session_id, before=None, after=None, page_size=None):
+    """
+    Messages of a session, oldest first. Without cursors the latest page is returned;
+    `before` pages back to older messages, `after` fetches messages newer than a cursor.
+    """
     if not frappe.db.exists("AI Chat Session", session_id):
         return {"error": "Session not found"}
 
     if not frappe.has_permission("AI Chat Session", doc=session_id, ptype="read"):
         return {"error": "Permission denied"}
 
-    messages = frappe.get_all("AI Chat Message",
-        filters={"session": session_id},
-        fields=["role", "content", "creation"],
-        order_by="creation asc",
-        limit=1000 # Increase limit to ensure full history is loaded
-    )
-    return messages
+    page_size = _page_size(page_size)
+    Message = frappe.qb.DocType("AI Chat Message")
+
+    messages, has_more = _keyset_page(Message, Message.session == session_id, "creation",
+        ["name", "role", "content", "creation"], page_size, before=before, after=after)
+
+    if not after:
+        messages.reverse()
+
+    return {
+        "messages": messages,
+        "has_more": has_more,
+        "before": encode_cursor(messages[0].creation, messages[0].name) if messages else before,
+        "after": encode_cursor(messages[-1].creation, messages[-1].name) if messages else after
+    }
 
 @frappe.whitelist()
 def delete_session(session_id):
@@ -110,7 +275,36 @@ def delete_session(session_id):
     if not doc.has_permission("delete"):
          return {"error": "Permission denied"}
 
-    # Delete messages first (though cascade might handle it if configured, but let's be safe)
-    frappe.db.delete("AI Chat Message", {"session": session_id})
-    doc.delete()
+    # Delete one batch of messages inline; long sessions are finished in the background
+    # so the request costs the same regardless of session length
+    remaining = delete_session_messages(session_id, max_batches=1)
+    drop_window(session_id)
+    doc.delete(ignore_permissions=True, force=remaining)
+
+    if remaining:
+        frappe.enqueue(delete_session_messages, session_id=session_id, queue='long',
+            enqueue_after_commit=True, job_id=f"ai_chat_delete:{session_id}", deduplicate=True)
+
     return {"status": "success"}
+
+def delete_session_messages(session_id, max_batches=None):
+    """
+    Deletes the messages of a session in batches of DELETE_BATCH_SIZE.
+    Returns True if messages remain after max_batches.
+    """
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        names = frappe.get_all("AI Chat Message",
+            filters={"session": session_id},
+            pluck="name",
+            limit=DELETE_BATCH_SIZE
+        )
+        if not names:
+            return False
+
+        frappe.db.delete("AI Chat Message", {"name": ["in", names]})
+        batches += 1
+        if max_batches is None:
+            frappe.db.commit()
+
+    return bool(frappe.db.exists("AI Chat Message", {"session": session_id}))
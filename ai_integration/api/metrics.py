@@ -0,0 +1,29 @@
+import frappe
+from werkzeug.wrappers import Response
+from ai_integration.utils.metrics import render_prometheus, reset_metrics
+
+@frappe.whitelist()
+def prometheus():
+    """
+    Per-stage latency histograms, token counters and index gauges in the Prometheus text format.
+    Scrape via: /api/method/ai_integration.api.metrics.prometheus (token auth of a System Manager)
+    """
+    frappe.only_for("System Manager")
+    return Response(render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+@frappe.whitelist(methods=["POST"])
+def reset():
+    frappe.only_for("System Manager")
+    reset_metrics()
+    return {"status": "success"}
+
+@frappe.whitelist()
+def vector_store_health():
+    """
+    State of the vector index in the worker process that serves the request, or in
+    the vector search service when one is configured: status (cold, warming, failed,
+    ready or stale), size, memory, last build and the error of a failed warm-up.
+    """
+    frappe.only_for("System Manager")
+    from ai_integration.utils.vector_store import get_vector_store
+    return get_vector_store().health()
@@ -1,60 +1,86 @@
 import frappe
-import json
-import requests
+from frappe.utils import cint
+
+from ai_integration.utils.export import DEFAULT_EXPORT_WORKERS, get_export_specs, run_export, run_exports
+
+PROJECT_FIELDS = ["name", "project_name", "status", "expected_end_date", "percent_complete", "notes"]
+
+def project_entry(p, site_url):
+    return {
+        "title": p.project_name or "Unnamed Project",
+        "uri": f"{site_url}/app/project/{p.name}",
+        "description": "Status: {}. Completion: {}%. Notes: {}".format(
+            p.status,
+            p.percent_complete or 0,
+            p.notes or "No notes"
+        ),
+        "attributes": {
+            "status": p.status,
+            "deadline": str(p.expected_end_date) if p.expected_end_date else ""
+        }
+    }
+
+def project_export_spec(settings):
+    """The built-in Project export to the GCS Sync URL, run daily."""
+    site_url = frappe.utils.get_url()
+    return frappe._dict(
+        name="Project",
+        doctype="Project",
+        fields=PROJECT_FIELDS,
+        filters=[["status", "!=", "Cancelled"]],
+        to_entry=lambda p: project_entry(p, site_url),
+        url=settings.gcs_sync_url,
+        resumable=cint(settings.gcs_resumable_upload),
+        watermark=settings.triton_export_watermark,
+        watermark_ref=("AI Integration Settings", "AI Integration Settings", "triton_export_watermark"),
+        status_ref=None
+    )
 
 @frappe.whitelist()
-def export_to_triton():
+def export_to_triton(full=0):
     """
     Pushes ERPNext Project data to Google Cloud Storage.
     Can be triggered via: /api/method/ai_integration.api.sync.export_to_triton
+
+    Every run sends all non-cancelled projects, the upload replaces the previous
+    export. A run is skipped when no project was modified or deleted since the last
+    successful export, pass full=1 to send anyway. Rows are streamed page by page
+    into a gzip-compressed JSONL body, the watermark only moves once the upload succeeded.
     """
-    # 1. Configuration
-    # Ideally, store this in your 'AI Integration Settings' DocType
-    gcs_signed_url = frappe.db.get_single_value('AI Integration Settings', 'gcs_sync_url')
-    
-    if not gcs_signed_url:
+    settings = frappe.get_single('AI Integration Settings')
+
+    if not settings.gcs_sync_url:
         frappe.throw("Please configure the GCS Sync URL in AI Integration Settings.")
 
-    # 2. Fetch Data
-    projects = frappe.get_all("Project", 
-        fields=["name", "project_name", "status", "expected_end_date", "percent_complete", "notes"],
-        filters={"status": ["!=", "Cancelled"]}
-    )
+    result = run_export(project_export_spec(settings), full=cint(full))
+    if result["status"] != "success":
+        return {"status": "error", "message": result["message"]}
+    if result["unchanged"]:
+        return {"status": "success", "message": "No projects changed since the last export"}
+    return {"status": "success", "message": "Pushed {} projects".format(result["rows"]), "bytes": result["bytes"]}
 
-    # 3. Format as JSONL
-    # No more restrictions: you can use list comprehensions and standard json
-    lines = []
-    site_url = frappe.utils.get_url()
+@frappe.whitelist()
+def run_configured_exports(frequency=None, full=0):
+    """
+    Runs the built-in Project export and the Exports configured in AI Integration
+    Settings (all of them, or those of one frequency) concurrently.
+    Returns rows, bytes, duration and status per export.
+    """
+    frappe.only_for("System Manager")
+    settings = frappe.get_single('AI Integration Settings')
 
-    for p in projects:
-        entry = {
-            "title": p.project_name or "Unnamed Project",
-            "uri": "{}/app/project/{}".format(site_url, p.name),
-            "description": "Status: {}. Completion: {}%. Notes: {}".format(
-                p.status, 
-                p.percent_complete or 0, 
-                p.notes or "No notes"
-            ),
-            "attributes": {
-                "status": p.status,
-                "deadline": str(p.expected_end_date) if p.expected_end_date else ""
-            }
-        }
-        lines.append(json.dumps(entry))
-
-    payload = "\n".join(lines)
-
-    # 4. Push to GCS
-    try:
-        response = requests.put(
-            gcs_signed_url,
-            data=payload,
-            headers={"Content-Type": "application/json"}
-        )
-        response.raise_for_status()
-        
-        return {"status": "success", "message": "Pushed {} projects".format(len(projects))}
-
-    except Exception as e:
-        frappe.log_error(frappe.get_traceback(), "Triton Sync Error")
-        return {"status": "error", "message": str(e)}
+    specs = get_export_specs(settings, frequency)
+    if settings.gcs_sync_url and frequency in (None, "Daily"):
+        specs.insert(0, project_export_spec(settings))
+
+    return run_exports(specs, full=cint(full),
+        max_workers=cint(settings.export_workers) or DEFAULT_EXPORT_WORKERS)
+
+def run_hourly_exports():
+    run_configured_exports("Hourly")
+
+def run_daily_exports():
+    run_configured_exports("Daily")
+
+def run_weekly_exports():
+    run_configured_exports("Weekly")
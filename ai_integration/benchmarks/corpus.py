@@ -0,0 +1,99 @@
+import random
+
+import frappe
+
+BENCHMARK_DOCTYPE = "AI Benchmark Document"
+BENCHMARK_CHILD_DOCTYPE = "AI Benchmark Item"
+
+_TEXT_FIELDTYPE = "Small Text"
+
+def _vocabulary(rng, size=5000):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = {"".join(rng.choice(letters) for _ in range(rng.randint(3, 10))) for _ in range(size)}
+    return sorted(words)
+
+class SyntheticMeta:
+    """Just enough of a DocType meta for get_doc_content_text."""
+
+    def __init__(self, fields):
+        self.fields = fields
+
+    @classmethod
+    def build(cls, text_fields, table_fieldname=None):
+        fields = [
+            frappe._dict(fieldname=f"text_{i}", label=f"Text {i}", fieldtype=_TEXT_FIELDTYPE)
+            for i in range(text_fields)
+        ]
+        if table_fieldname:
+            fields.append(frappe._dict(
+                fieldname=table_fieldname, label="Items", fieldtype="Table", options=BENCHMARK_CHILD_DOCTYPE
+            ))
+        return cls(fields)
+
+class SyntheticDoc(frappe._dict):
+    """An unsaved document with a synthetic `meta`, accepted by the embedding pipeline."""
+
+def generate_corpus(doc_count, words_per_doc=400, child_rows=10, child_width=5, text_fields=2, seed=42):
+    """
+    Deterministic synthetic documents: `words_per_doc` Zipf-distributed words spread over
+    `text_fields` text fields, plus `child_rows` child rows of `child_width` text columns.
+    Every document also carries a unique identifier token (e.g. BENCH-000123) so exact-match
+    lexical queries have a single right answer.
+    Returns (docs, child_meta); the child meta must be served by get_meta (see stand_ins).
+    """
+    rng = random.Random(seed)
+    vocabulary = _vocabulary(rng)
+    # Zipf-like weights, a few words are frequent and most are rare, as in real text
+    weights = [1.0 / (rank + 1) for rank in range(len(vocabulary))]
+
+    meta = SyntheticMeta.build(text_fields, table_fieldname="items" if child_rows else None)
+    child_meta = SyntheticMeta.build(child_width)
+
+    docs = []
+    for i in range(doc_count):
+        words = rng.choices(vocabulary, weights=weights, k=words_per_doc)
+        per_field = max(1, len(words) // max(text_fields, 1))
+        doc = SyntheticDoc(doctype=BENCHMARK_DOCTYPE, name=f"BENCH-{i:06d}")
+        doc.meta = meta
+        for f in range(text_fields):
+            doc[f"text_{f}"] = " ".join(words[f * per_field:(f + 1) * per_field])
+        doc["text_0"] = f"{doc.name} {doc.get('text_0', '')}"
+
+        doc["items"] = [
+            frappe._dict({
+                f"text_{c}": " ".join(rng.choices(vocabulary, weights=weights, k=3))
+                for c in range(child_width)
+            })
+            for _ in range(child_rows)
+        ]
+        docs.append(doc)
+
+    return docs, child_meta
+
+def generate_chunks(count, words_per_chunk=150, chunks_per_doc=1, seed=7):
+    """
+    (reference_name, content) pairs for filling the index directly, without documents.
+    Chunks of one document share a topic: a few words drawn more often than the rest.
+    """
+    rng = random.Random(seed)
+    vocabulary = _vocabulary(rng)
+    weights = [1.0 / (rank + 1) for rank in range(len(vocabulary))]
+    topic = []
+    for i in range(count):
+        name = f"BENCH-{i // chunks_per_doc:06d}"
+        if i % chunks_per_doc == 0:
+            topic = rng.sample(vocabulary, 20)
+        words = rng.choices(vocabulary, weights=weights, k=words_per_chunk)
+        if chunks_per_doc > 1:
+            words += rng.choices(topic, k=words_per_chunk // 3)
+        yield name, f"{name} " + " ".join(words)
+
+def sample_queries(texts, count, words=6, seed=13):
+    """Queries made of consecutive words of random texts, so each has relevant chunks."""
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        tokens = rng.choice(texts).split()
+        start = rng.randrange(max(len(tokens) - words, 1))
+        queries.append(" ".join(tokens[start:start + words]))
+    return queries
@@ -0,0 +1,296 @@
+"""
+Performance benchmarks for ingestion, search and chat, against local stand-ins for the
+embedding and LLM APIs. Run on a development site:
+
+    bench --site <site> execute ai_integration.benchmarks.run.run \
+        --kwargs "{'sizes': [1000, 10000], 'output': '/tmp/bench-main.json'}"
+
+    bench --site <site> execute ai_integration.benchmarks.run.compare \
+        --kwargs "{'baseline': '/tmp/bench-main.json', 'candidate': '/tmp/bench-branch.json'}"
+
+Synthetic AI Embedding rows are inserted in the benchmark's own transaction and rolled
+back; ingestion commits through create_embedding_for_doc and is cleaned up afterwards.
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import frappe
+from frappe.utils import now_datetime
+from ai_integration.benchmarks.corpus import BENCHMARK_DOCTYPE, generate_chunks, generate_corpus, sample_queries
+from ai_integration.utils.embedding import get_live_generation
+from ai_integration.utils.metrics import rss_bytes
+from ai_integration.utils.vector_store import DEFAULT_CANDIDATE_DOCUMENTS
+from ai_integration.benchmarks.stand_ins import (
+    DEFAULT_DIMENSION, StandInEmbedder, StandInGenAIClient, hashed_embedding, stand_ins
+)
+
+DEFAULT_SIZES = (1000, 5000, 20000)
+
+_INSERT_BATCH = 2000
+
+def _percentiles(samples_ms):
+    if not samples_ms:
+        return {"n": 0}
+    samples = np.array(samples_ms)
+    return {
+        "n": len(samples_ms),
+        "mean": round(float(samples.mean()), 3),
+        "p50": round(float(np.percentile(samples, 50)), 3),
+        "p90": round(float(np.percentile(samples, 90)), 3),
+        "p99": round(float(np.percentile(samples, 99)), 3)
+    }
+
+def _timed_ms(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - started) * 1000
+
+def _commit_hash():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(__file__), stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+def _delete_benchmark_embeddings():
+    frappe.db.delete("AI Embedding", {"reference_doctype": BENCHMARK_DOCTYPE})
+
+def _insert_embeddings(chunks, dimension):
+    """Bulk-inserts (reference_name, content) chunks as AI Embedding rows with stand-in vectors."""
+    now = now_datetime()
+    generation = get_live_generation()
+    fields = ["name", "creation", "modified", "owner", "modified_by",
+        "reference_doctype", "reference_name", "chunk_index", "generation", "content", "vector"]
+
+    batch = []
+    chunk_index = {}
+    for i, (reference_name, content) in enumerate(chunks):
+        vector = json.dumps([round(v, 5) for v in hashed_embedding(content, dimension)])
+        chunk_index[reference_name] = chunk_index.get(reference_name, -1) + 1
+        batch.append((f"bench-{i:07d}", now, now, "Administrator", "Administrator",
+            BENCHMARK_DOCTYPE, reference_name, chunk_index[reference_name], generation, content, vector))
+        if len(batch) >= _INSERT_BATCH:
+            frappe.db.bulk_insert("AI Embedding", fields, batch)
+            batch = []
+    if batch:
+        frappe.db.bulk_insert("AI Embedding", fields, batch)
+
+def _fresh_vector_store():
+    from ai_integration.utils.vector_store import FaissVectorStore, get_vector_store
+    FaissVectorStore._instances.pop(frappe.local.site, None)
+    return get_vector_store()
+
+def bench_chunking(docs, child_meta):
+    """Throughput of get_doc_content_text + chunk_text over the synthetic corpus."""
+    from ai_integration.utils.embedding import chunk_text, get_doc_content_text
+
+    with stand_ins(child_meta=child_meta):
+        started = time.perf_counter()
+        texts = [get_doc_content_text(doc) for doc in docs]
+        extract_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        chunk_count = sum(len(chunk_text(text)) for text in texts)
+        chunk_s = time.perf_counter() - started
+
+    text_bytes = sum(len(t.encode()) for t in texts)
+    return {
+        "docs": len(docs),
+        "chunks": chunk_count,
+        "text_mb": round(text_bytes / 1e6, 3),
+        "extract_docs_per_s": round(len(docs) / extract_s, 1) if extract_s else None,
+        "chunk_mb_per_s": round(text_bytes / 1e6 / chunk_s, 3) if chunk_s else None,
+        "chunks_per_s": round(chunk_count / chunk_s, 1) if chunk_s else None
+    }
+
+def bench_ingestion(docs, child_meta, dimension, embed_latency_ms):
+    """create_embedding_for_doc per document: extract, chunk, embed (stand-in) and insert."""
+    from ai_integration.utils.embedding import create_embedding_for_doc
+
+    embedder = StandInEmbedder(dimension, embed_latency_ms)
+    per_doc = []
+    try:
+        with stand_ins(child_meta=child_meta, embedder=embedder):
+            for doc in docs:
+                per_doc.append(_timed_ms(create_embedding_for_doc, doc)[1])
+    finally:
+        _delete_benchmark_embeddings()
+        frappe.db.commit()
+
+    total_s = sum(per_doc) / 1000
+    return {
+        "docs": len(docs),
+        "chunks": embedder.calls,
+        "embed_latency_ms": embed_latency_ms,
+        "per_doc_ms": _percentiles(per_doc),
+        "chunks_per_s": round(embedder.calls / total_s, 1) if total_s else None
+    }
+
+def bench_index(size, dimension, query_count, k=10, chunks_per_doc=1, candidate_docs=DEFAULT_CANDIDATE_DOCUMENTS):
+    """
+    Index build time and memory, then dense (exhaustive and two-stage), lexical and hybrid
+    search latency, at one corpus size. `recall_two_stage` is the share of exhaustive
+    dense top-k results two-stage search also returns.
+    """
+    try:
+        chunks = list(generate_chunks(size, chunks_per_doc=chunks_per_doc))
+        _insert_embeddings(chunks, dimension)
+
+        store = _fresh_vector_store()
+        rss_before = rss_bytes()
+        tracemalloc.start()
+        _, build_ms = _timed_ms(store._reload_all)
+        _, python_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        rss_after = rss_bytes()
+
+        queries = sample_queries([content for _, content in chunks], query_count)
+        vectors = [hashed_embedding(q, dimension) for q in queries]
+
+        dense, two_stage, lexical, hybrid = [], [], [], []
+        found = expected = 0
+        for query, vector in zip(queries, vectors, strict=True):
+            exhaustive, duration_ms = _timed_ms(store._vector_search, vector, k)
+            dense.append(duration_ms)
+            candidates, duration_ms = _timed_ms(store._vector_search, vector, k, candidate_docs)
+            two_stage.append(duration_ms)
+            found += len({r["name"] for r in exhaustive} & {r["name"] for r in candidates})
+            expected += len(exhaustive)
+            lexical.append(_timed_ms(store.lexical_index.search, query, k)[1])
+            hybrid.append(_timed_ms(store.hybrid_search, query, vector, k=k, sync=False,
+                candidate_docs=candidate_docs)[1])
+
+        return {
+            "size": size,
+            "vectors": store.index.ntotal if store.index else 0,
+            "documents": len(store.centroid_refs),
+            "dimension": dimension,
+            "build_ms": round(build_ms, 1),
+            "index_bytes": (store.index.ntotal + len(store.centroid_refs)) * store.index.d * 4 if store.index else 0,
+            "python_peak_bytes": python_peak,
+            "rss_delta_bytes": rss_after - rss_before if rss_before is not None else None,
+            "recall_two_stage": round(found / expected, 4) if expected else None,
+            "search_ms": {
+                "dense": _percentiles(dense),
+                "dense_two_stage": _percentiles(two_stage),
+                "lexical": _percentiles(lexical),
+                "hybrid": _percentiles(hybrid)
+            }
+        }
+    finally:
+        frappe.db.rollback()
+        _fresh_vector_store()
+
+def bench_chat(size, dimension, runs, embed_latency_ms, llm_latency_ms):
+    """End-to-end answer_user_question latency with stand-in APIs, plus per-stage medians."""
+    from ai_integration.utils.rag import answer_user_question
+
+    try:
+        chunks = list(generate_chunks(size))
+        _insert_embeddings(chunks, dimension)
+        _fresh_vector_store()
+
+        queries = sample_queries([content for _, content in chunks], runs, seed=17)
+        embedder = StandInEmbedder(dimension, embed_latency_ms)
+        llm = StandInGenAIClient(llm_latency_ms)
+
+        totals, stages, errors = [], {}, 0
+        with stand_ins(embedder=embedder, llm=llm):
+            # The first question loads the index, keep it out of the latencies
+            answer_user_question(queries[0])
+            for query in queries:
+                result, duration_ms = _timed_ms(answer_user_question, query)
+                if result.get("error"):
+                    errors += 1
+                    continue
+                totals.append(duration_ms)
+                for entry in result.get("trace") or []:
+                    stage = entry["stage"] + (f":{entry['label']}" if entry.get("label") else "")
+                    stages.setdefault(stage, []).append(entry["duration_ms"])
+
+        return {
+            "corpus_size": size,
+            "embed_latency_ms": embed_latency_ms,
+            "llm_latency_ms": llm_latency_ms,
+            "errors": errors,
+            "latency_ms": _percentiles(totals),
+            "stage_p50_ms": {stage: _percentiles(samples)["p50"] for stage, samples in sorted(stages.items())}
+        }
+    finally:
+        frappe.db.rollback()
+        _fresh_vector_store()
+
+def run(sizes=None, queries=200, docs=200, ingest_docs=50, words_per_doc=400, child_rows=10,
+        child_width=5, dimension=DEFAULT_DIMENSION, embed_latency_ms=0, llm_latency_ms=0,
+        chat_runs=20, chunks_per_doc=8, candidate_docs=DEFAULT_CANDIDATE_DOCUMENTS, output=None):
+    """
+    Runs the whole suite and returns the results as a dict; also written as JSON to
+    `output` when given. Stand-in latencies default to 0 so the numbers measure this
+    app's own overhead; set them to model provider round trips.
+    """
+    sizes = [int(s) for s in (sizes or DEFAULT_SIZES)]
+    params = {
+        "sizes": sizes, "queries": queries, "docs": docs, "ingest_docs": ingest_docs,
+        "words_per_doc": words_per_doc, "child_rows": child_rows, "child_width": child_width,
+        "dimension": dimension, "embed_latency_ms": embed_latency_ms,
+        "llm_latency_ms": llm_latency_ms, "chat_runs": chat_runs,
+        "chunks_per_doc": chunks_per_doc, "candidate_docs": candidate_docs
+    }
+
+    corpus, child_meta = generate_corpus(docs, words_per_doc=words_per_doc,
+        child_rows=child_rows, child_width=child_width)
+
+    results = {
+        "meta": {
+            "timestamp": str(now_datetime()),
+            "commit": _commit_hash(),
+            "python": sys.version.split()[0],
+            "params": params
+        },
+        "chunking": bench_chunking(corpus, child_meta),
+        "ingestion": bench_ingestion(corpus[:ingest_docs], child_meta, dimension, embed_latency_ms),
+        "index": [
+            bench_index(size, dimension, queries, chunks_per_doc=chunks_per_doc, candidate_docs=candidate_docs)
+            for size in sizes
+        ],
+        "chat": bench_chat(sizes[0], dimension, chat_runs, embed_latency_ms, llm_latency_ms)
+    }
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=1)
+    return results
+
+def _numeric_leaves(value, path=""):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from _numeric_leaves(item, f"{path}.{key}" if path else key)
+    elif isinstance(value, list):
+        for i, item in enumerate(value):
+            label = item.get("size", i) if isinstance(item, dict) else i
+            yield from _numeric_leaves(item, f"{path}[{label}]")
+    elif isinstance(value, int | float) and not isinstance(value, bool):
+        yield path, value
+
+def compare(baseline, candidate):
+    """Relative change of every numeric result between two run() outputs (JSON files)."""
+    with open(baseline) as f:
+        before = dict(_numeric_leaves(json.load(f)))
+    with open(candidate) as f:
+        after = dict(_numeric_leaves(json.load(f)))
+
+    return {
+        path: {
+            "baseline": before[path],
+            "candidate": after[path],
+            "change": round(after[path] / before[path] - 1, 4) if before[path] else None
+        }
+        for path in before
+        if path in after and not path.startswith("meta.")
+    }
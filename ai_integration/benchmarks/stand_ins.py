@@ -0,0 +1,119 @@
+import time
+import zlib
+from contextlib import ExitStack, contextmanager
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import frappe
+import numpy as np
+
+from ai_integration.ai_integration.doctype.ai_embedding.ai_embedding import AIEmbedding
+from ai_integration.benchmarks.corpus import BENCHMARK_CHILD_DOCTYPE
+from ai_integration.utils.lexical import tokenize
+
+DEFAULT_DIMENSION = 768
+
+# Positions each token sets in a hashed embedding
+_HASHES_PER_TOKEN = 4
+
+def hashed_embedding(text, dimension=DEFAULT_DIMENSION):
+    """
+    Deterministic stand-in embedding: feature hashing of the text's tokens, so texts
+    sharing words get similar vectors and search results stay meaningful.
+    """
+    positions, signs = [], []
+    for token in tokenize(text):
+        for i in range(_HASHES_PER_TOKEN):
+            h = zlib.crc32(f"{i}:{token}".encode())
+            positions.append(h % dimension)
+            signs.append(1.0 if h & 0x80000000 else -1.0)
+
+    vector = np.bincount(positions, weights=signs, minlength=dimension) if positions else np.zeros(dimension)
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).astype("float32").tolist()
+
+class StandInEmbedder:
+    """Replaces embedding._embed, optionally sleeping to model the API round trip."""
+
+    def __init__(self, dimension=DEFAULT_DIMENSION, latency_ms=0):
+        self.dimension = dimension
+        self.latency_ms = latency_ms
+        self.calls = 0
+
+    def __call__(self, api_key, text):
+        self.calls += 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        return hashed_embedding(text, self.dimension)
+
+class StandInGenAIClient:
+    """
+    Replaces genai.Client: generate_content and chats answer after `latency_ms` with a
+    fixed-size text and usage metadata, never with function calls.
+    """
+
+    def __init__(self, latency_ms=0, output_tokens=200):
+        self.latency_ms = latency_ms
+        self.output_tokens = output_tokens
+        self.models = SimpleNamespace(generate_content=self._generate)
+        self.chats = SimpleNamespace(create=self._create_chat)
+
+    def __call__(self, *args, **kwargs):
+        # Stands in for the class as well, genai.Client(api_key=...) returns this instance
+        return self
+
+    def _respond(self, prompt):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        return SimpleNamespace(
+            text=" ".join(["answer"] * self.output_tokens),
+            function_calls=None,
+            usage_metadata=SimpleNamespace(
+                prompt_token_count=len(str(prompt)) // 4,
+                cached_content_token_count=0,
+                candidates_token_count=self.output_tokens
+            )
+        )
+
+    def _generate(self, model=None, contents=None, config=None):
+        return self._respond(contents)
+
+    def _create_chat(self, model=None, config=None):
+        return SimpleNamespace(send_message=self._respond)
+
+@contextmanager
+def stand_ins(child_meta=None, embedder=None, llm=None, settings=None):
+    """
+    Patches the embedding and LLM APIs with local stand-ins, serves the synthetic child
+    meta from frappe.get_meta, and runs chat without tools or caches. Permission and
+    link checks are skipped, the synthetic references don't exist in the DB.
+    """
+    embedder = embedder or StandInEmbedder()
+    llm = llm or StandInGenAIClient()
+    get_meta = frappe.get_meta
+
+    def get_meta_with_synthetic(doctype, *args, **kwargs):
+        if doctype == BENCHMARK_CHILD_DOCTYPE and child_meta is not None:
+            return child_meta
+        return get_meta(doctype, *args, **kwargs)
+
+    if settings is None:
+        settings = frappe.get_single("AI Integration Settings")
+    settings.google_api_key = "benchmark"
+    settings.get_password = lambda *args, **kwargs: "benchmark"
+    settings.enable_answer_cache = 0
+    settings.enable_context_cache = 0
+
+    with ExitStack() as stack:
+        stack.enter_context(patch("ai_integration.utils.embedding._embed", embedder))
+        stack.enter_context(patch("ai_integration.utils.embedding.get_api_key", lambda: "benchmark"))
+        stack.enter_context(patch("ai_integration.utils.rag.genai.Client", llm))
+        stack.enter_context(patch("ai_integration.utils.rag.get_settings", lambda: settings))
+        stack.enter_context(patch("ai_integration.utils.rag.fetch_fac_toolset",
+            lambda user: ([], frozenset(), None)))
+        stack.enter_context(patch("ai_integration.utils.rag.filter_permitted_references",
+            lambda references, **kwargs: set(references)))
+        stack.enter_context(patch("frappe.get_meta", get_meta_with_synthetic))
+        # AI Embedding rows of synthetic documents link to a reference that doesn't exist
+        stack.enter_context(patch.object(AIEmbedding, "_validate_links", lambda self: None))
+        yield SimpleNamespace(embedder=embedder, llm=llm, settings=settings)
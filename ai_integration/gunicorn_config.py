@@ -0,0 +1,13 @@
+"""
+Gunicorn settings for the bench's web server, loading each worker's vector indexes
+before it accepts requests:
+
+    GUNICORN_CMD_ARGS="--config python:ai_integration.gunicorn_config"
+
+or `-c python:ai_integration.gunicorn_config` on the gunicorn line of the supervisor
+config. Without it, the before_request hook ensure_warm warms on the first request.
+"""
+
+def post_fork(server, worker):
+    from ai_integration.utils.vector_store import warm_up_sites
+    warm_up_sites()
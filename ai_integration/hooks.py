@@ -147,13 +147,20 @@ doc_events = {
 # Scheduled Tasks
 # ---------------
 scheduler_events = {
+    "all": [
+        # Indexes documents recorded during Data Import or patches once the load is over
+        "ai_integration.utils.bulk_index.flush_when_idle"
+    ],
     "daily": [
-        # This will run the sync automatically every night
-        "ai_integration.api.sync.export_to_triton"
+        # Project sync to Triton plus the Exports set to "Daily" in AI Integration Settings
+        "ai_integration.api.sync.run_daily_exports"
     ],
     "hourly": [
-        # Use hourly if your project statuses change frequently
-        # "ai_integration.api.sync.export_to_triton"
+        # Each export picks its own frequency in AI Integration Settings
+        "ai_integration.api.sync.run_hourly_exports"
+    ],
+    "weekly": [
+        "ai_integration.api.sync.run_weekly_exports"
     ]
 }
 # scheduler_events = {
@@ -204,7 +211,9 @@ scheduler_events = {
 
 # Request Events
 # ----------------
-# before_request = ["ai_integration.utils.before_request"]
+# Loads the site's vector index in the background on the first request of each web worker,
+# unless gunicorn already warmed it at fork (ai_integration.gunicorn_config)
+before_request = ["ai_integration.utils.vector_store.ensure_warm"]
 # after_request = ["ai_integration.utils.after_request"]
 
 # Job Events
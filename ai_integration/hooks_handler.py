@@ -1,5 +1,17 @@
+from functools import partial
+
 import frappe
+from ai_integration.utils.bulk_index import is_bulk_mode, mark_dirty
 from ai_integration.utils.embedding import create_embedding_for_doc, delete_embeddings_for_doc
+from ai_integration.utils.schema import invalidate_schema_cache
+from ai_integration.utils.tool_cache import invalidate_tool_cache
+from ai_integration.utils.vector_service import notify_changed
+
+# Saving any of these can change the tool set available to a user
+TOOL_CACHE_DOCTYPES = ("User", "Role", "Role Profile", "Custom DocPerm")
+
+# Saving or deleting any of these can change a DocType's fields
+SCHEMA_DOCTYPES = ("DocType", "Custom Field", "Property Setter")
 
 def get_enabled_doctypes():
     """
@@ -23,11 +35,23 @@ def on_doc_update(doc, method):
     if doc.doctype == "AI Integration Settings":
         return
 
+    if doc.doctype in TOOL_CACHE_DOCTYPES:
+        # Role changes can change which tools a user gets
+        invalidate_tool_cache()
+
+    if doc.doctype in SCHEMA_DOCTYPES:
+        invalidate_schema_cache()
+
     enabled = get_enabled_doctypes()
     if not enabled:
         return
 
     if doc.doctype in enabled:
+        if is_bulk_mode():
+            # Indexed by one batched job after the load instead of a job per document
+            mark_dirty(doc.doctype, doc.name)
+            return
+
         try:
             frappe.enqueue(create_embedding_for_doc, doc=doc, queue='default', enqueue_after_commit=True)
         except Exception:
@@ -41,13 +65,21 @@ def on_doc_trash(doc, method):
     if doc.doctype == "AI Integration Settings":
         return
 
+    if doc.doctype in SCHEMA_DOCTYPES:
+        invalidate_schema_cache()
+
     enabled = get_enabled_doctypes()
     if not enabled:
         return
 
     if doc.doctype in enabled:
+        if is_bulk_mode():
+            mark_dirty(doc.doctype, doc.name)
+            return
+
         try:
             # Delete immediately, no need to queue as it's a quick DB delete
             delete_embeddings_for_doc(doc)
+            frappe.db.after_commit.add(partial(notify_changed, [(doc.doctype, doc.name)]))
         except Exception:
             frappe.log_error(f"Failed to delete embedding for {doc.doctype} {doc.name}")
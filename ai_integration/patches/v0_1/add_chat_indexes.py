@@ -0,0 +1,6 @@
+import frappe
+
+def execute():
+	"""Composite indexes backing keyset pagination of chat history and session lists."""
+	frappe.db.add_index("AI Chat Message", ["session", "creation"])
+	frappe.db.add_index("AI Chat Session", ["user", "modified"])
@@ -0,0 +1,11 @@
+import frappe
+
+def execute():
+	"""
+	Stores the default Context Budget Ratio on sites that never saved it: a missing
+	Float reads as 0, which now means "no retrieved context".
+	"""
+	stored = frappe.db.get_value("Singles",
+		{"doctype": "AI Integration Settings", "field": "context_budget_ratio"}, "value")
+	if stored in (None, ""):
+		frappe.db.set_single_value("AI Integration Settings", "context_budget_ratio", 0.6)
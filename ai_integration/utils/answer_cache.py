@@ -0,0 +1,189 @@
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import ClassVar
+
+import frappe
+import numpy as np
+from frappe.permissions import get_user_permissions
+from ai_integration.utils.lexical import is_identifier, tokenize
+from ai_integration.utils.permissions import filter_permitted_references
+
+# Entries also expire after this long, as a backstop for data the embeddings don't cover
+ANSWER_CACHE_TTL = 3600
+
+_STATS_KEYS = ("hits", "misses", "latency_saved_ms")
+
+class SemanticAnswerCache:
+    """
+    Per-process, per-site LRU cache of RAG answers.
+
+    An entry matches when the query embedding is within the similarity threshold,
+    the scope (permission scope + prior chat history + record identifiers in the
+    question) is identical, every AI Embedding chunk the answer was built from is still
+    present with the same `modified` timestamp and the current user can read every
+    document those chunks came from.
+    """
+
+    _instances: ClassVar[dict] = {}
+    _lock = threading.Lock()
+
+    def __new__(cls, site):
+        with cls._lock:
+            if site not in cls._instances:
+                instance = super().__new__(cls)
+                instance.site = site
+                instance.entries = OrderedDict()
+                instance.lock = threading.Lock()
+                cls._instances[site] = instance
+            return cls._instances[site]
+
+    def lookup(self, query_vector, scope, threshold):
+        q_vec = _normalize(query_vector)
+
+        with self.lock:
+            now = time.monotonic()
+            for key in [k for k, e in self.entries.items() if now - e["stored_at"] > ANSWER_CACHE_TTL]:
+                del self.entries[key]
+
+            candidates = [(k, e) for k, e in self.entries.items() if e["scope"] == scope]
+            if not candidates:
+                return None
+
+            matrix = np.vstack([e["vector"] for _, e in candidates])
+            similarities = matrix @ q_vec
+            best = int(np.argmax(similarities))
+            if similarities[best] < threshold:
+                return None
+
+            key, entry = candidates[best]
+
+        if not _chunks_unchanged(entry["chunk_versions"]):
+            self.invalidate(key)
+            return None
+
+        # Shares and owner rules aren't part of the scope, the entry stays valid for others
+        references = entry["references"]
+        if len(filter_permitted_references(references)) < len(references):
+            return None
+
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+        return entry
+
+    def store(self, query_vector, scope, response, chunk_versions, latency_ms, max_size, references=()):
+        """
+        Caches an answer built from the AI Embedding rows in `chunk_versions` ({name: modified})
+        of the (reference_doctype, reference_name) documents in `references`. Answers without
+        retrieved context aren't cached, a later answer may find documents indexed since.
+        """
+        if not chunk_versions:
+            return
+
+        entry = {
+            "vector": _normalize(query_vector),
+            "scope": scope,
+            "response": response,
+            "chunk_versions": chunk_versions,
+            "references": {tuple(ref) for ref in references},
+            "latency_ms": latency_ms,
+            "stored_at": time.monotonic()
+        }
+        key = hashlib.sha1(f"{scope}:{entry['vector'].tobytes().hex()}".encode()).hexdigest()
+
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > max_size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, key=None):
+        with self.lock:
+            if key is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(key, None)
+
+def _normalize(vector):
+    vec = np.asarray(vector, dtype="float32")
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+def _chunks_unchanged(chunk_versions):
+    """Checks the contributing AI Embedding rows still exist with the same version, in one query."""
+    if not chunk_versions:
+        return False
+
+    current = {
+        d.name: str(d.modified) for d in frappe.get_all("AI Embedding",
+            filters={"name": ["in", list(chunk_versions)]},
+            fields=["name", "modified"]
+        )
+    }
+    return current == chunk_versions
+
+def get_answer_cache():
+    return SemanticAnswerCache(frappe.local.site)
+
+def get_permission_scope(user):
+    """
+    Users with the same roles and User Permission restrictions get the same tools and
+    role-based context, and share answers.
+    """
+    restrictions = get_user_permissions(user) or {}
+    digest = hashlib.sha1()
+    digest.update("\x00".join(sorted(frappe.get_roles(user))).encode())
+    digest.update(json.dumps(restrictions, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+def get_cache_scope(user, chat_history=None, message=None):
+    """
+    Answers are scoped to the user's permission scope (tools and context are
+    permission-filtered), to the prior conversation, excluding the current
+    question itself, and to the identifiers in the question: "status of PRJ-0042"
+    and "status of PRJ-0043" embed almost identically but ask about different records.
+    """
+    prior = list(chat_history or [])
+    if prior and message is not None and prior[-1].get("role") == "user" and prior[-1].get("content") == message:
+        prior = prior[:-1]
+
+    digest = hashlib.sha1()
+    for msg in prior:
+        digest.update(f"{msg.get('role')}\x00{msg.get('content')}\x01".encode())
+    digest.update("\x00".join(sorted({t for t in tokenize(message) if is_identifier(t)})).encode())
+    return f"{get_permission_scope(user)}:{digest.hexdigest()}"
+
+def _stats_key(name):
+    return frappe.cache().make_key(f"ai_integration:answer_cache:{name}")
+
+def record_hit(latency_saved_ms):
+    try:
+        frappe.cache().incr(_stats_key("hits"))
+        frappe.cache().incrbyfloat(_stats_key("latency_saved_ms"), max(latency_saved_ms, 0))
+    except Exception:
+        pass
+
+def record_miss():
+    try:
+        frappe.cache().incr(_stats_key("misses"))
+    except Exception:
+        pass
+
+def get_stats():
+    """Hit rate and total latency saved, aggregated across workers through Redis."""
+    values = {}
+    for name in _STATS_KEYS:
+        raw = frappe.cache().get(_stats_key(name))
+        values[name] = float(raw) if raw else 0.0
+
+    lookups = values["hits"] + values["misses"]
+    return {
+        "hits": int(values["hits"]),
+        "misses": int(values["misses"]),
+        "hit_rate": round(values["hits"] / lookups, 4) if lookups else 0.0,
+        "latency_saved_ms": round(values["latency_saved_ms"], 1),
+        "entries": len(get_answer_cache().entries)
+    }
@@ -0,0 +1,147 @@
+import time
+from contextlib import contextmanager
+
+import frappe
+
+# Dirty documents are popped and indexed in batches of this size
+BULK_BATCH_SIZE = 500
+
+# The scheduler flushes the dirty set once no document was recorded for this long
+BULK_IDLE_SECONDS = 120
+
+_DIRTY_KEY = "ai_integration:bulk_dirty"
+_PROCESSING_KEY = "ai_integration:bulk_processing"
+_LAST_DIRTY_KEY = "ai_integration:bulk_last_dirty"
+_JOB_ID = "ai_integration:bulk_index"
+
+def _key(name):
+    return frappe.cache().make_key(name)
+
+def is_bulk_mode():
+    """True during Data Import, patches and bulk_indexing() blocks."""
+    return bool(frappe.flags.in_import or frappe.flags.in_patch or frappe.flags.ai_bulk_indexing)
+
+def mark_dirty(doctype, name):
+    """Records a document whose embeddings must be rebuilt (or dropped) by the next flush."""
+    pipe = frappe.cache().pipeline()
+    pipe.sadd(_key(_DIRTY_KEY), f"{doctype}\x00{name}")
+    pipe.set(_key(_LAST_DIRTY_KEY), time.time())
+    pipe.execute()
+
+@contextmanager
+def bulk_indexing(flush=True):
+    """
+    Defers indexing of documents saved or deleted inside the block: they are only
+    recorded, and one batched job indexes them once the block exits.
+
+        with bulk_indexing():
+            for row in rows:
+                frappe.get_doc(row).insert()
+    """
+    previous = frappe.flags.ai_bulk_indexing
+    frappe.flags.ai_bulk_indexing = True
+    try:
+        yield
+    finally:
+        frappe.flags.ai_bulk_indexing = previous
+        if flush and not previous:
+            enqueue_flush()
+
+def enqueue_flush():
+    frappe.enqueue("ai_integration.utils.bulk_index.process_dirty_documents",
+        queue="long", timeout=3600, job_id=_JOB_ID, deduplicate=True, enqueue_after_commit=True)
+
+def flush_when_idle():
+    """Scheduler: flushes documents recorded by imports and patches once they stopped."""
+    pipe = frappe.cache().pipeline()
+    pipe.scard(_key(_DIRTY_KEY))
+    pipe.get(_key(_LAST_DIRTY_KEY))
+    pending, last_dirty = pipe.execute()
+    if pending and time.time() - float(last_dirty or 0) >= BULK_IDLE_SECONDS:
+        enqueue_flush()
+
+def _claim_batch():
+    """
+    Returns (members, {doctype: names}) of up to BULK_BATCH_SIZE recorded documents.
+    When the processing set is empty, the dirty set is renamed to it first. Members
+    stay there until _release_batch, so a flush that dies half-way is resumed by the next one.
+    """
+    pipe = frappe.cache().pipeline()
+    pipe.srandmember(_key(_PROCESSING_KEY), BULK_BATCH_SIZE)
+    (members,) = pipe.execute()
+    if not members:
+        pipe.exists(_key(_DIRTY_KEY))
+        (pending,) = pipe.execute()
+        if not pending:
+            return [], {}
+        # Documents recorded from now on go to a fresh dirty set
+        pipe.renamenx(_key(_DIRTY_KEY), _key(_PROCESSING_KEY))
+        pipe.srandmember(_key(_PROCESSING_KEY), BULK_BATCH_SIZE)
+        _, members = pipe.execute()
+
+    batch = {}
+    for member in members or []:
+        doctype, _, name = (member.decode() if isinstance(member, bytes) else member).partition("\x00")
+        batch.setdefault(doctype, set()).add(name)
+    return members or [], batch
+
+def _release_batch(members):
+    pipe = frappe.cache().pipeline()
+    pipe.srem(_key(_PROCESSING_KEY), *members)
+    pipe.execute()
+
+def process_dirty_documents():
+    """
+    Background job: indexes the recorded documents in batches. Embeddings of a
+    batch are deleted with one query per doctype, documents that no longer exist
+    are only deleted. A batch leaves the processing set once it was indexed,
+    documents that raised or got fewer chunks embedded than they have are recorded
+    again for the next flush.
+    """
+    from ai_integration.hooks_handler import get_enabled_doctypes
+    from ai_integration.utils.embedding import create_embedding_for_doc, get_target_generations
+    from ai_integration.utils.vector_service import notify_changed
+
+    enabled = set(get_enabled_doctypes())
+    failed = []
+
+    try:
+        while True:
+            members, batch = _claim_batch()
+            if not batch:
+                return
+
+            generations = get_target_generations()
+            for doctype, names in batch.items():
+                frappe.db.delete("AI Embedding", {
+                    "reference_doctype": doctype,
+                    "reference_name": ["in", list(names)]
+                })
+                frappe.db.commit()
+
+                if doctype not in enabled:
+                    continue
+
+                existing = frappe.get_all(doctype, filters={"name": ["in", list(names)]}, pluck="name")
+                for name in existing:
+                    try:
+                        chunks, embedded = create_embedding_for_doc(frappe.get_doc(doctype, name),
+                            delete_existing=False, generations=generations, notify=False)
+                    except Exception as e:
+                        frappe.db.rollback()
+                        failed.append((doctype, name))
+                        frappe.log_error(f"Failed to embed {doctype} {name}: {e}", "Bulk Indexing")
+                        continue
+
+                    # Chunks the embedding API failed on (it returns no vector) are retried too
+                    if embedded < chunks:
+                        failed.append((doctype, name))
+
+            _release_batch(members)
+
+            # One refresh of the vector search service per batch instead of one per document
+            notify_changed([(doctype, name) for doctype, names in batch.items() for name in names])
+    finally:
+        # Retried by the next flush instead of within this job, so a broken document can't loop
+        for doctype, name in failed:
+            mark_dirty(doctype, name)
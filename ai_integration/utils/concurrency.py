@@ -0,0 +1,72 @@
+import time
+import frappe
+from concurrent.futures import ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+def get_site_context():
+    """Captures what a worker thread needs to rebuild the current Frappe context."""
+    return {
+        "site": frappe.local.site,
+        "sites_path": frappe.local.sites_path,
+        "user": frappe.session.user
+    }
+
+def run_in_site_context(context, fn, *args, **kwargs):
+    """
+    Runs fn inside a fresh Frappe context (own DB connection, same site and user).
+    Work done in the thread is committed on success and rolled back on error.
+    """
+    frappe.init(site=context["site"], sites_path=context["sites_path"])
+    try:
+        frappe.connect()
+        frappe.set_user(context["user"])
+        result = fn(*args, **kwargs)
+        frappe.db.commit()
+        return result
+    except Exception:
+        if frappe.db:
+            frappe.db.rollback()
+        raise
+    finally:
+        frappe.destroy()
+
+def submit_in_site_context(executor, fn, *args, **kwargs):
+    """Submits fn to the executor so it runs in a copy of the caller's site context."""
+    return executor.submit(run_in_site_context, get_site_context(), fn, *args, **kwargs)
+
+def _run_started(started, context, fn, *args, **kwargs):
+    started.append(time.monotonic())
+    return run_in_site_context(context, fn, *args, **kwargs)
+
+def submit_with_timeout(executor, fn, *args, **kwargs):
+    """
+    submit_in_site_context for calls awaited with result_within(): records when a worker
+    starts running fn, so time spent queued doesn't count against its limit.
+    """
+    started = []
+    future = executor.submit(_run_started, started, get_site_context(), fn, *args, **kwargs)
+    future.started = started
+    return future
+
+def result_within(future, timeout):
+    """
+    Result of a future from submit_with_timeout, allowing `timeout` seconds from when a
+    worker started it. A call that couldn't start within `timeout` seconds of this wait,
+    every worker being busy, is cancelled. Raises concurrent.futures.TimeoutError.
+    """
+    waiting_since = time.monotonic()
+    while True:
+        # Finished while earlier calls were awaited, however long ago it started
+        if future.done():
+            return future.result()
+        started = future.started[0] if future.started else waiting_since
+        remaining = started + timeout - time.monotonic()
+        if remaining <= 0:
+            future.cancel()
+            raise FutureTimeoutError()
+        done, _ = wait([future], timeout=remaining)
+        if done:
+            return future.result()
+
+def get_executor(max_workers, thread_name_prefix="ai_integration"):
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
@@ -0,0 +1,103 @@
+import numpy as np
+
+# Weight of relevance against novelty in maximal marginal relevance
+MMR_LAMBDA = 0.7
+
+# Overlap between neighbouring chunks is at most `overlap` tokens, a few characters per token
+_MAX_OVERLAP_CHARS = 2000
+_ANCHOR_CHARS = 16
+
+def strip_overlap(previous, following):
+    """Returns `following` without the prefix it shares with the end of `previous`."""
+    if not previous or not following:
+        return following
+
+    tail = previous[-_MAX_OVERLAP_CHARS:]
+    anchor = following[:_ANCHOR_CHARS]
+    pos = tail.find(anchor)
+    while pos != -1:
+        overlap = len(tail) - pos
+        if following[:overlap] == tail[pos:]:
+            return following[overlap:]
+        pos = tail.find(anchor, pos + 1)
+
+    return following
+
+def merge_adjacent_chunks(items):
+    """
+    Merges hits with consecutive chunk_index from the same reference document into one span.
+
+    `items` are {"doc", "relevance", "vector"} dicts where doc has reference_doctype,
+    reference_name, chunk_index and content. Returns spans with the merged content, the
+    best relevance of their chunks, the mean of their vectors and the AI Embedding rows
+    they were built from, ordered by relevance.
+    """
+    by_reference = {}
+    for item in items:
+        doc = item["doc"]
+        by_reference.setdefault((doc.reference_doctype, doc.reference_name), []).append(item)
+
+    spans = []
+    for (ref_doctype, ref_name), group in by_reference.items():
+        group.sort(key=lambda item: item["doc"].chunk_index or 0)
+
+        current = None
+        for item in group:
+            doc = item["doc"]
+            if current and (doc.chunk_index or 0) == current["last_index"] + 1:
+                current["content"] += strip_overlap(current["content"], doc.content or "")
+                current["last_index"] = doc.chunk_index or 0
+                current["relevance"] = max(current["relevance"], item["relevance"])
+                current["docs"].append(doc)
+                current["vectors"].append(item["vector"])
+                continue
+
+            current = {
+                "reference_doctype": ref_doctype,
+                "reference_name": ref_name,
+                "content": doc.content or "",
+                "last_index": doc.chunk_index or 0,
+                "relevance": item["relevance"],
+                "docs": [doc],
+                "vectors": [item["vector"]]
+            }
+            spans.append(current)
+
+    for span in spans:
+        vectors = [v for v in span.pop("vectors") if v is not None]
+        if vectors:
+            mean = np.mean(vectors, axis=0)
+            norm = np.linalg.norm(mean)
+            span["vector"] = mean / norm if norm else mean
+        else:
+            span["vector"] = None
+        del span["last_index"]
+
+    spans.sort(key=lambda span: span["relevance"], reverse=True)
+    return spans
+
+def mmr_select(spans, k, lambda_=MMR_LAMBDA):
+    """
+    Picks up to k spans by maximal marginal relevance: each pick maximizes
+    lambda * relevance - (1 - lambda) * max cosine similarity to spans already picked.
+    Spans without a vector are only ranked by relevance.
+    """
+    remaining = list(spans)
+    selected = []
+
+    while remaining and len(selected) < k:
+        best, best_score = None, None
+        for i, span in enumerate(remaining):
+            redundancy = 0.0
+            if span["vector"] is not None:
+                for chosen in selected:
+                    if chosen["vector"] is not None:
+                        redundancy = max(redundancy, float(span["vector"] @ chosen["vector"]))
+
+            score = lambda_ * span["relevance"] - (1 - lambda_) * redundancy
+            if best_score is None or score > best_score:
+                best, best_score = i, score
+
+        selected.append(remaining.pop(best))
+
+    return selected
@@ -1,8 +1,23 @@
 import frappe
 import json
+import time
 import tiktoken
 from google import genai
-from frappe.utils import get_site_name
+from frappe.utils import cint, get_site_name
+from concurrent.futures import ThreadPoolExecutor
+from ai_integration.utils.metrics import record_span, span
+
+# Query embeddings are plain HTTP calls, a few threads per process are enough to overlap them
+_embedding_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="ai_embedding")
+
+# Rows of replaced generations are deleted in batches of this size
+CLEANUP_BATCH_SIZE = 5000
+
+_CLEANUP_JOB_ID = "ai_integration:delete_stale_generations"
+
+# A rebuilt generation only goes live when it covers at least this share of the
+# documents the live one has
+MIN_REBUILD_COVERAGE = 0.9
 
 def get_api_key():
     settings = frappe.get_single("AI Integration Settings")
@@ -10,25 +25,63 @@ def get_api_key():
         frappe.throw("Please configure Google API Key in AI Integration Settings")
     return settings.get_password("google_api_key")
 
+def get_live_generation():
+    """Generation of AI Embedding rows that search serves."""
+    return cint(frappe.db.get_single_value("AI Integration Settings", "embedding_generation", cache=False))
+
+def get_target_generations():
+    """
+    Generations new embeddings are written to: the live one and, while a rebuild runs,
+    the one being built, so documents saved during the rebuild are current in both.
+    """
+    live = get_live_generation()
+    building = cint(frappe.db.get_single_value("AI Integration Settings", "building_generation", cache=False))
+    return [live, building] if building else [live]
+
 def get_embedding_model():
     return "gemini-embedding-001"
 
-def generate_embedding_vector(text):
-    api_key = get_api_key()
+def _embed(api_key, text):
+    """Calls the embedding API. Touches no Frappe state, so it is safe to run in a worker thread."""
     client = genai.Client(api_key=api_key)
 
     # Gemini embedding model
     model = get_embedding_model()
 
+    result = client.models.embed_content(
+        model=model,
+        contents=text,
+    )
+    return result.embeddings[0].values
+
+def generate_embedding_vector(text):
+    api_key = get_api_key()
+
+    try:
+        return _embed(api_key, text)
+    except Exception as e:
+        frappe.log_error(f"Error generating embedding: {e}", "AI Embedding Error")
+        return None
+
+def start_embedding(text):
+    """
+    Starts embedding `text` in the background and returns a Future, so callers can
+    load settings, history or tools while the request is in flight.
+    Resolve it with `resolve_embedding`.
+    """
+    future = _embedding_executor.submit(_embed, get_api_key(), text)
+    future.started = time.monotonic()
+    return future
+
+def resolve_embedding(future):
+    """Waits for a `start_embedding` future; returns None on failure like generate_embedding_vector."""
     try:
-        result = client.models.embed_content(
-            model=model,
-            contents=text,
-        )
-        return result.embeddings[0].values
+        return future.result()
     except Exception as e:
         frappe.log_error(f"Error generating embedding: {str(e)}", "AI Embedding Error")
         return None
+    finally:
+        record_span("embed", (time.monotonic() - future.started) * 1000, label="query")
 
 def chunk_text(text, chunk_size=1000, overlap=100):
     """Chunking by tokens using tiktoken (cl100k_base)."""
@@ -113,38 +166,61 @@ def get_doc_content_text(doc):
 
     return "\n".join(content)
 
-def create_embedding_for_doc(doc):
-    """Generates and saves embeddings for a single document."""
+def create_embedding_for_doc(doc, delete_existing=True, generations=None, notify=True):
+    """
+    Generates and saves embeddings for a single document, into `generations` (default:
+    get_target_generations()). Each chunk is embedded once and written to every generation.
+    Pass delete_existing=False when the caller already deleted its old embeddings, and
+    notify=False when it notifies the vector search service itself, e.g. in a batch.
+    Returns (chunks, embedded): how many chunks the text had and how many were written.
+    """
+    generations = generations or get_target_generations()
 
     # Delete existing embeddings for this doc
-    delete_embeddings_for_doc(doc)
+    if delete_existing:
+        delete_embeddings_for_doc(doc, generations)
 
+    # A document without text still commits, its old embeddings were deleted
     text = get_doc_content_text(doc)
-    if not text:
-        return
-
-    chunks = chunk_text(text)
+    chunks = chunk_text(text) if text else []
+    embedded = 0
 
     for idx, chunk in enumerate(chunks):
-        vector = generate_embedding_vector(chunk)
+        with span("embed", label="chunk"):
+            vector = generate_embedding_vector(chunk)
         if vector:
-            embedding_doc = frappe.get_doc({
-                "doctype": "AI Embedding",
-                "reference_doctype": doc.doctype,
-                "reference_name": doc.name,
-                "chunk_index": idx,
-                "content": chunk,
-                "vector": json.dumps(vector)
-            })
-            embedding_doc.insert(ignore_permissions=True)
+            with span("chunk_insert", label=doc.doctype):
+                for generation in generations:
+                    embedding_doc = frappe.get_doc({
+                        "doctype": "AI Embedding",
+                        "reference_doctype": doc.doctype,
+                        "reference_name": doc.name,
+                        "chunk_index": idx,
+                        "generation": generation,
+                        "content": chunk,
+                        "vector": json.dumps(vector)
+                    })
+                    embedding_doc.insert(ignore_permissions=True)
+            embedded += 1
 
     frappe.db.commit()
+    if notify:
+        _notify_vector_service([(doc.doctype, doc.name)])
+    return len(chunks), embedded
 
-def delete_embeddings_for_doc(doc):
-    frappe.db.delete("AI Embedding", {
+def _notify_vector_service(references):
+    from ai_integration.utils.vector_service import notify_changed
+    notify_changed(references)
+
+def delete_embeddings_for_doc(doc, generations=None):
+    """Deletes the document's embeddings of the given generations, of all generations by default."""
+    filters = {
         "reference_doctype": doc.doctype,
         "reference_name": doc.name
-    })
+    }
+    if generations:
+        filters["generation"] = ["in", generations]
+    frappe.db.delete("AI Embedding", filters)
 
 def clear_all_embeddings():
     """Clears all entries in the AI Embedding DocType."""
@@ -152,16 +228,75 @@ def clear_all_embeddings():
     frappe.db.commit()
 
 def rebuild_all_embeddings():
-    """Clears all existing embeddings and regenerates them for enabled doctypes."""
-    clear_all_embeddings()
-    generate_all_embeddings_task()
-
-def generate_all_embeddings_task():
-    """Iterates through all enabled doctypes and generates embeddings."""
+    """
+    Builds a new generation of embeddings for enabled doctypes while search keeps serving
+    the live one, then switches search to it and deletes the old generation in batches.
+    Running it again after an interruption resumes the generation being built.
+
+    The switch is refused, and the generation left in building_generation for the next
+    run, when any document failed to embed or the new generation covers clearly fewer
+    documents than the live one. Returns the counts of generate_all_embeddings_task.
+    """
+    generation = cint(frappe.db.get_single_value("AI Integration Settings", "building_generation", cache=False))
+    if not generation:
+        latest = cint(frappe.db.get_value("AI Embedding", {}, "max(generation)"))
+        generation = max(get_live_generation(), latest) + 1
+        frappe.db.set_single_value("AI Integration Settings", "building_generation", generation)
+        frappe.db.commit()
+
+    stats = generate_all_embeddings_task(generation=generation)
+    live = get_live_generation()
+    live_documents = frappe.db.count("AI Embedding", {"generation": live, "chunk_index": 0})
+    new_documents = frappe.db.count("AI Embedding", {"generation": generation, "chunk_index": 0})
+
+    if stats["failed"]:
+        frappe.log_error(f"Generation {generation} not switched: {stats['failed']} of "
+            f"{stats['attempted']} documents failed to embed", "Embedding Rebuild")
+    elif live_documents and new_documents < live_documents * MIN_REBUILD_COVERAGE:
+        frappe.log_error(f"Generation {generation} not switched: it covers {new_documents} "
+            f"documents, the live generation {live} covers {live_documents}", "Embedding Rebuild")
+    else:
+        switch_generation(generation)
+    return stats
+
+def switch_generation(generation):
+    """Makes `generation` live in one update, then enqueues the deletion of older generations."""
+    frappe.db.set_single_value("AI Integration Settings", {
+        "embedding_generation": generation,
+        "building_generation": 0
+    })
+    frappe.db.commit()
+    frappe.enqueue("ai_integration.utils.embedding.delete_stale_generations",
+        queue="long", timeout=3600, job_id=_CLEANUP_JOB_ID, deduplicate=True)
+
+def delete_stale_generations():
+    """Background job: deletes rows of generations older than the live one, a batch per transaction."""
+    live = get_live_generation()
+    while True:
+        names = frappe.get_all("AI Embedding", filters={"generation": ["<", live]},
+            pluck="name", limit=CLEANUP_BATCH_SIZE)
+        if not names:
+            return
+        frappe.db.delete("AI Embedding", {"name": ["in", names]})
+        frappe.db.commit()
+
+def generate_all_embeddings_task(generation=None):
+    """
+    Iterates through all enabled doctypes and generates embeddings for documents that
+    have none yet. Without `generation` they are written to the live generation (and
+    the one being built, if any); rebuild_all_embeddings passes the new generation.
+
+    Returns the number of documents attempted, embedded and failed, and of chunks written.
+    A document counts as failed when any of its chunks couldn't be embedded. Its
+    partial rows in a generation being built are deleted so the next run retries it.
+    """
     settings = frappe.get_single("AI Integration Settings")
+    stats = {"attempted": 0, "embedded": 0, "failed": 0, "chunks": 0}
 
     if not settings.enabled_doctypes:
-        return
+        return stats
+
+    generations = [generation] if generation is not None else get_target_generations()
 
     for row in settings.enabled_doctypes:
         doctype = row.doctype_name
@@ -170,7 +305,7 @@ def generate_all_embeddings_task():
 
         # Get existing embeddings
         existing_embeddings = set(frappe.get_all("AI Embedding",
-            filters={"reference_doctype": doctype},
+            filters={"reference_doctype": doctype, "generation": generations[0]},
             pluck="reference_name",
             limit=None
         ))
@@ -180,7 +315,23 @@ def generate_all_embeddings_task():
                 continue
 
             doc = frappe.get_doc(doctype, name)
+            stats["attempted"] += 1
             try:
-                create_embedding_for_doc(doc)
+                chunks, embedded = create_embedding_for_doc(doc, generations=generations,
+                    notify=generation is None)
             except Exception as e:
+                frappe.db.rollback()
                 frappe.log_error(f"Failed to embed {doctype} {name}: {e}", "Embedding Generation Task")
+                chunks, embedded = None, 0
+
+            if embedded == chunks:
+                stats["embedded"] += 1
+                stats["chunks"] += embedded
+                continue
+
+            stats["failed"] += 1
+            if embedded and generation is not None:
+                delete_embeddings_for_doc(doc, generations)
+                frappe.db.commit()
+
+    return stats
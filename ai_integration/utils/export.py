@@ -0,0 +1,352 @@
+import gzip
+import json
+import re
+import string
+import tempfile
+import time
+
+import frappe
+import requests
+from frappe.utils import add_to_date, cint, now_datetime
+from requests.adapters import HTTPAdapter
+
+from ai_integration.utils.concurrency import get_executor, submit_in_site_context
+from ai_integration.utils.metrics import record_span
+
+# Rows fetched per query while streaming an export
+EXPORT_PAGE_SIZE = 500
+
+# Resumable uploads are sent in chunks, GCS requires a multiple of 256 KiB
+UPLOAD_CHUNK_SIZE = 32 * 256 * 1024
+
+# (connect, read) timeouts of every upload request, in seconds
+UPLOAD_TIMEOUT = (10, 120)
+
+UPLOAD_MAX_RETRIES = 5
+RETRY_BACKOFF = 1.0
+
+# Compressed exports are kept in memory up to this size, then spilled to a temporary file
+SPOOL_MAX_SIZE = 16 * 1024 * 1024
+
+_RETRYABLE_STATUS = (408, 429, 500, 502, 503, 504)
+
+DEFAULT_EXPORT_WORKERS = 4
+
+# The watermark is set this long before a run started, so rows of a transaction that
+# committed after the run read the table are still seen by the next one
+WATERMARK_OVERLAP = 300
+
+class _MappingFormatter(string.Formatter):
+    """
+    Formats missing fields and None as empty text whatever their format spec, and a
+    value the spec doesn't fit (e.g. {qty:d} of a float) unformatted, so one odd row
+    can't abort the export.
+    """
+
+    def get_value(self, key, args, kwargs):
+        if isinstance(key, str):
+            return kwargs.get(key)
+        return super().get_value(key, args, kwargs)
+
+    def format_field(self, value, format_spec):
+        if value is None:
+            return ""
+        try:
+            return super().format_field(value, format_spec)
+        except (ValueError, TypeError):
+            return str(value)
+
+_formatter = _MappingFormatter()
+
+def decode_watermark(value):
+    """Returns the timestamp of a stored watermark, or None if there is none."""
+    if not value:
+        return None
+    # Watermarks of earlier versions were "modified|name"
+    return value.split("|", 1)[0]
+
+def has_changes(doctype, since):
+    """
+    True when a row of the doctype was modified or deleted after `since`. Rows the
+    export filters out count as well, e.g. a Project that became Cancelled.
+    """
+    if not since:
+        return True
+    if frappe.db.exists(doctype, {"modified": [">", since]}):
+        return True
+    return bool(frappe.db.exists("Deleted Document", {"deleted_doctype": doctype, "creation": [">", since]}))
+
+def iter_rows(doctype, fields, filters=None, since=None, page_size=EXPORT_PAGE_SIZE):
+    """
+    Yields rows in (modified, name) order, only those after the `since` (modified, name) key.
+    Pages are fetched by keyset so each query stays cheap however far the export
+    has got. The keyset is split into rows sharing the watermark's timestamp and
+    rows after it, which keeps both queries plain AND filters.
+    """
+    fields = list(dict.fromkeys([*fields, "name", "modified"]))
+    filters = list(filters or [])
+    cursor = since
+
+    while True:
+        rows = []
+        if cursor:
+            rows = frappe.get_all(doctype, fields=fields,
+                filters=[*filters, ["modified", "=", cursor[0]], ["name", ">", cursor[1]]],
+                order_by="name asc",
+                limit=page_size
+            )
+        if len(rows) < page_size:
+            keyset = [["modified", ">", cursor[0]]] if cursor else []
+            rows += frappe.get_all(doctype, fields=fields,
+                filters=filters + keyset,
+                order_by="modified asc, name asc",
+                limit=page_size - len(rows)
+            )
+
+        yield from rows
+        if len(rows) < page_size:
+            return
+        cursor = (str(rows[-1].modified), rows[-1].name)
+
+def write_jsonl_gz(rows, to_entry, fileobj):
+    """
+    Writes rows as gzip-compressed JSON lines, one row at a time.
+    Returns (row_count, last_row).
+    """
+    count, last = 0, None
+    with gzip.GzipFile(fileobj=fileobj, mode="wb") as gz:
+        for row in rows:
+            if count:
+                gz.write(b"\n")
+            gz.write(json.dumps(to_entry(row), default=str).encode())
+            count, last = count + 1, row
+    return count, last
+
+def spooled_file():
+    return tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+
+def _wait(attempt):
+    time.sleep(min(RETRY_BACKOFF * 2 ** (attempt - 1), 30))
+
+def _with_retries(send):
+    """
+    Calls send() until it returns a non-retryable response, retrying connection
+    errors, timeouts and 408/429/5xx with exponential backoff.
+    """
+    for attempt in range(1, UPLOAD_MAX_RETRIES + 2):
+        try:
+            response = send()
+            if response.status_code not in _RETRYABLE_STATUS:
+                response.raise_for_status()
+                return response
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt > UPLOAD_MAX_RETRIES:
+                raise
+        else:
+            if attempt > UPLOAD_MAX_RETRIES:
+                response.raise_for_status()
+        _wait(attempt)
+
+def _committed_bytes(response):
+    """Bytes GCS has persisted, from the Range header of a 308 response."""
+    value = response.headers.get("Range")
+    if not value:
+        return 0
+    return int(value.rsplit("-", 1)[1]) + 1
+
+def _upload_status(http, session_uri, size):
+    """Asks how much of a resumable upload was received, returns the offset to continue from."""
+    response = _with_retries(lambda: http.put(session_uri, data=b"",
+        headers={"Content-Range": f"bytes */{size}"}, timeout=UPLOAD_TIMEOUT))
+    if response.status_code == 308:
+        return _committed_bytes(response)
+    return size
+
+def _resumable_upload(http, url, fileobj, size, headers):
+    response = _with_retries(lambda: http.post(url, data=b"",
+        headers={**headers, "x-goog-resumable": "start"}, timeout=UPLOAD_TIMEOUT))
+    session_uri = response.headers["Location"]
+
+    offset, failures = 0, 0
+    while offset < size:
+        end = min(offset + UPLOAD_CHUNK_SIZE, size) - 1
+        fileobj.seek(offset)
+        chunk = fileobj.read(end - offset + 1)
+
+        try:
+            response = http.put(session_uri, data=chunk,
+                headers={"Content-Range": f"bytes {offset}-{end}/{size}"}, timeout=UPLOAD_TIMEOUT)
+            if response.status_code == 308:
+                offset, failures = _committed_bytes(response), 0
+                continue
+            if response.status_code not in _RETRYABLE_STATUS:
+                response.raise_for_status()
+                return response
+        except (requests.ConnectionError, requests.Timeout):
+            pass
+
+        failures += 1
+        if failures > UPLOAD_MAX_RETRIES:
+            raise frappe.ValidationError(f"Upload failed at byte {offset} of {size}")
+        _wait(failures)
+        offset = _upload_status(http, session_uri, size)
+
+    return response
+
+def upload(url, fileobj, size, content_type="application/json", content_encoding="gzip", resumable=False, session=None):
+    """
+    Uploads `size` bytes of fileobj to a signed GCS URL. A single PUT is retried as a
+    whole; a resumable upload (URL signed for POST with x-goog-resumable) sends
+    UPLOAD_CHUNK_SIZE chunks and continues from the last persisted byte after a failure.
+    Requests go through `session` when given, to reuse its pooled connections.
+    """
+    http = session or requests
+    headers = {"Content-Type": content_type}
+    if content_encoding:
+        headers["Content-Encoding"] = content_encoding
+
+    if resumable:
+        return _resumable_upload(http, url, fileobj, size, headers)
+
+    def send():
+        fileobj.seek(0)
+        return http.put(url, data=fileobj,
+            headers={**headers, "Content-Length": str(size)}, timeout=UPLOAD_TIMEOUT)
+
+    return _with_retries(send)
+
+def make_session(pool_size):
+    """A requests.Session whose connection pool is shared by up to pool_size threads."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def _placeholders(template):
+    return [field for _, field, _, _ in _formatter.parse(template) if field is not None]
+
+def mapping_fields(mapping):
+    """Fieldnames referenced by {placeholders} anywhere in a field mapping."""
+    names = set()
+
+    def walk(value):
+        if isinstance(value, str):
+            names.update(re.split(r"[.\[!:]", field, maxsplit=1)[0] for field in _placeholders(value))
+        elif isinstance(value, dict):
+            for item in value.values():
+                walk(item)
+        elif isinstance(value, list):
+            for item in value:
+                walk(item)
+
+    walk(mapping)
+    names.discard("site_url")
+    names.discard("")
+    return sorted(names)
+
+def render_mapping(mapping, values):
+    """
+    Fills a field mapping from one row. A string that is exactly one placeholder
+    keeps the value's type, other strings are formatted with empty text for None
+    and missing fields.
+    """
+    if isinstance(mapping, dict):
+        return {key: render_mapping(value, values) for key, value in mapping.items()}
+    if isinstance(mapping, list):
+        return [render_mapping(value, values) for value in mapping]
+    if not isinstance(mapping, str):
+        return mapping
+
+    fields = _placeholders(mapping)
+    if len(fields) == 1 and mapping == f"{{{fields[0]}}}" and fields[0] in values:
+        return values[fields[0]]
+    return _formatter.vformat(mapping, (), values)
+
+def get_export_specs(settings, frequency=None):
+    """Enabled rows of the Exports table in AI Integration Settings, optionally of one frequency."""
+    specs = []
+    site_url = frappe.utils.get_url()
+    for row in settings.get("exports") or []:
+        if not row.enabled or (frequency and row.frequency != frequency):
+            continue
+
+        mapping = json.loads(row.field_mapping or "{}")
+        specs.append(frappe._dict(
+            name=row.export_name,
+            doctype=row.doctype_name,
+            fields=mapping_fields(mapping),
+            filters=json.loads(row.filters or "[]"),
+            to_entry=lambda r, mapping=mapping: render_mapping(mapping, dict(r, site_url=site_url)),
+            url=row.destination_url,
+            resumable=cint(row.resumable_upload),
+            watermark=row.watermark,
+            watermark_ref=("AI Integration Export", row.name, "watermark"),
+            status_ref=("AI Integration Export", row.name)
+        ))
+
+    return specs
+
+def run_export(spec, full=False, session=None):
+    """
+    Streams all rows of one export into a compressed upload that replaces the object
+    at its URL, so rows filtered out or deleted since disappear from it. The run is
+    skipped (`unchanged`) when nothing changed since the watermark, which moves on
+    success. Returns the run's metrics.
+    """
+    started = time.monotonic()
+    started_at = now_datetime()
+    result = {"export": spec.name, "doctype": spec.doctype, "rows": 0, "bytes": 0, "unchanged": False}
+    since = None if full else decode_watermark(spec.watermark)
+
+    try:
+        if has_changes(spec.doctype, since):
+            with spooled_file() as body:
+                rows = iter_rows(spec.doctype, spec.fields, filters=spec.filters)
+                result["rows"], _ = write_jsonl_gz(rows, spec.to_entry, body)
+                result["bytes"] = body.tell()
+                # Uploaded even when empty, the previous snapshot must not outlive its rows
+                upload(spec.url, body, result["bytes"], resumable=spec.resumable, session=session)
+            frappe.db.set_value(*spec.watermark_ref, str(add_to_date(started_at, seconds=-WATERMARK_OVERLAP)),
+                update_modified=False)
+        else:
+            result["unchanged"] = True
+
+        result["status"] = "success"
+    except Exception as e:
+        frappe.log_error(frappe.get_traceback(), f"Export Error: {spec.name}")
+        result.update(status="error", message=str(e))
+
+    result["duration"] = round(time.monotonic() - started, 3)
+    record_span("export", result["duration"] * 1000, label=spec.name,
+        rows=result["rows"], bytes=result["bytes"], status=result["status"])
+
+    if spec.status_ref:
+        frappe.db.set_value(*spec.status_ref, {
+            "last_run_at": now_datetime(),
+            "last_run_status": result.get("message") or result["status"],
+            "last_run_rows": result["rows"],
+            "last_run_bytes": result["bytes"],
+            "last_run_duration": result["duration"]
+        }, update_modified=False)
+    frappe.db.commit()
+
+    return result
+
+def run_exports(specs, full=False, max_workers=DEFAULT_EXPORT_WORKERS):
+    """
+    Runs exports concurrently on at most max_workers threads, each in its own site
+    context, sharing one pooled HTTP session. Returns their metrics in spec order.
+    """
+    if not specs:
+        return []
+
+    workers = max(1, min(max_workers, len(specs)))
+    with make_session(workers) as session:
+        if workers == 1:
+            return [run_export(spec, full=full, session=session) for spec in specs]
+
+        with get_executor(workers, thread_name_prefix="ai_export") as executor:
+            futures = [submit_in_site_context(executor, run_export, spec, full=full, session=session)
+                for spec in specs]
+            return [future.result() for future in futures]
@@ -0,0 +1,202 @@
+import frappe
+import json
+from functools import partial
+from frappe.utils import get_datetime
+from google import genai
+
+# Number of most recent messages always kept verbatim, older ones are folded into the summary
+SUMMARY_KEEP_MESSAGES = 10
+
+# Upper bound on messages folded into the summary per job
+SUMMARY_BATCH_SIZE = 40
+
+# Recent messages kept per session in the Redis ring buffer, and how long an idle buffer lives
+WINDOW_SIZE = 20
+WINDOW_IDLE_TTL = 1800
+
+def _window_key(session_id):
+    return frappe.cache().make_key(f"ai_integration:chat_window:{session_id}")
+
+def _meta_key(session_id):
+    return f"ai_integration:chat_window_meta:{session_id}"
+
+def _get_session_meta(session_id):
+    """Summary and summarized_until of a session, cached until the summary changes or the session idles."""
+    meta = frappe.cache().get_value(_meta_key(session_id))
+    if meta is None:
+        meta = frappe.db.get_value("AI Chat Session", session_id,
+            ["summary", "summarized_until"], as_dict=True) or frappe._dict()
+        meta = {"summary": meta.summary, "summarized_until": str(meta.summarized_until or "")}
+        frappe.cache().set_value(_meta_key(session_id), meta, expires_in_sec=WINDOW_IDLE_TTL)
+    return meta
+
+def _serialize(msg):
+    return json.dumps({"role": msg.role, "content": msg.content, "creation": str(msg.creation)})
+
+def _get_pending(session_id):
+    """Messages of the session inserted in this transaction, as [(name, serialized)], not yet in the buffer."""
+    pending = getattr(frappe.local, "ai_pending_window", None)
+    if pending is None:
+        pending = frappe.local.ai_pending_window = {}
+    return pending.setdefault(session_id, [])
+
+def _seed_window(session_id):
+    """Loads the most recent WINDOW_SIZE messages from the DB into the session's ring buffer."""
+    filters = {"session": session_id}
+    pending = _get_pending(session_id)
+    if pending:
+        # Uncommitted rows are appended once the transaction commits
+        filters["name"] = ["not in", [name for name, _ in pending]]
+
+    messages = frappe.get_all("AI Chat Message",
+        filters=filters,
+        fields=["role", "content", "creation"],
+        order_by="creation desc",
+        limit=WINDOW_SIZE
+    )
+    messages.reverse()
+
+    if messages:
+        try:
+            pipe = frappe.cache().pipeline()
+            pipe.delete(_window_key(session_id))
+            pipe.rpush(_window_key(session_id), *[_serialize(m) for m in messages])
+            pipe.expire(_window_key(session_id), WINDOW_IDLE_TTL)
+            pipe.execute()
+        except Exception:
+            pass
+
+    return [{"role": m.role, "content": m.content, "creation": str(m.creation)} for m in messages]
+
+def get_window(session_id):
+    """
+    The last WINDOW_SIZE messages of a session, oldest first, served from a Redis
+    ring buffer that is seeded lazily from the DB and expires after WINDOW_IDLE_TTL
+    seconds without use. Messages this transaction inserted are included.
+    """
+    pending = [json.loads(entry) for _, entry in _get_pending(session_id)]
+    try:
+        pipe = frappe.cache().pipeline()
+        pipe.lrange(_window_key(session_id), 0, -1)
+        pipe.expire(_window_key(session_id), WINDOW_IDLE_TTL)
+        entries, _ = pipe.execute()
+    except Exception:
+        entries = None
+
+    if not entries:
+        messages = _seed_window(session_id)
+    else:
+        messages = [json.loads(e) for e in entries]
+    return (messages + pending)[-WINDOW_SIZE:]
+
+def append_to_window(message_doc):
+    """
+    Write-through on insert of an AI Chat Message, applied when the transaction commits
+    so a rolled back message never reaches the buffer; until then get_window serves it
+    from this request. RPUSHX only appends to an already seeded buffer, a cold session
+    is seeded from the DB on next read.
+    """
+    entry = (message_doc.name, _serialize(message_doc))
+    _get_pending(message_doc.session).append(entry)
+    frappe.db.after_commit.add(partial(_push_to_window, message_doc.session, entry))
+    frappe.db.after_rollback.add(partial(_discard_pending, message_doc.session, entry))
+
+def _discard_pending(session_id, entry):
+    pending = _get_pending(session_id)
+    if entry in pending:
+        pending.remove(entry)
+
+def _push_to_window(session_id, entry):
+    _discard_pending(session_id, entry)
+    try:
+        pipe = frappe.cache().pipeline()
+        pipe.rpushx(_window_key(session_id), entry[1])
+        pipe.ltrim(_window_key(session_id), -WINDOW_SIZE, -1)
+        pipe.execute()
+    except Exception:
+        pass
+
+def drop_window(session_id):
+    try:
+        frappe.cache().pipeline().delete(_window_key(session_id)).execute()
+    except Exception:
+        pass
+    frappe.cache().delete_value(_meta_key(session_id))
+
+def _unsummarized(session_id):
+    meta = _get_session_meta(session_id)
+    messages = get_window(session_id)
+    if meta["summarized_until"]:
+        cutoff = get_datetime(meta["summarized_until"])
+        messages = [m for m in messages if get_datetime(m["creation"]) > cutoff]
+    return meta, messages
+
+def get_recent_history(session_id, limit=20):
+    """
+    Returns (summary, messages) for a session: the rolling summary and the
+    most recent messages not yet folded into it, oldest first.
+    """
+    meta, messages = _unsummarized(session_id)
+    messages = [frappe._dict(role=m["role"], content=m["content"]) for m in messages[-limit:]]
+    return meta["summary"], messages
+
+def needs_summary_update(session_id):
+    """True once more than SUMMARY_KEEP_MESSAGES messages are outside the summary."""
+    # The window holds more than SUMMARY_KEEP_MESSAGES messages, so it is enough to decide
+    return len(_unsummarized(session_id)[1]) > SUMMARY_KEEP_MESSAGES
+
+def update_session_summary(session_id):
+    """
+    Background job: folds messages older than the last SUMMARY_KEEP_MESSAGES
+    into the session's rolling summary. Only the new messages and the previous
+    summary are sent to the model, so each update costs the same regardless of
+    session length.
+    """
+    from ai_integration.utils.rag import get_model_name, get_settings
+
+    session = frappe.db.get_value("AI Chat Session", session_id,
+        ["summary", "summarized_until"], as_dict=True)
+    if not session:
+        return
+
+    filters = {"session": session_id}
+    if session.summarized_until:
+        filters["creation"] = [">", session.summarized_until]
+
+    pending = frappe.get_all("AI Chat Message",
+        filters=filters,
+        fields=["role", "content", "creation"],
+        order_by="creation asc",
+        limit=SUMMARY_BATCH_SIZE + SUMMARY_KEEP_MESSAGES
+    )
+    to_fold = pending[:-SUMMARY_KEEP_MESSAGES] if len(pending) > SUMMARY_KEEP_MESSAGES else []
+    if not to_fold:
+        return
+
+    transcript = "\n".join(f"{m.role}: {m.content}" for m in to_fold)
+    prompt = (
+        "Update the running summary of a conversation between a user and an ERPNext assistant. "
+        "Keep names, document IDs, figures and decisions; drop pleasantries. "
+        "Reply with the updated summary only.\n\n"
+        f"Current summary:\n{session.summary or '(empty)'}\n\n"
+        f"New messages:\n{transcript}"
+    )
+
+    try:
+        settings = get_settings()
+        client = genai.Client(api_key=settings.get_password("google_api_key"))
+        response = client.models.generate_content(model=get_model_name(settings), contents=prompt)
+        summary = (response.text or "").strip()
+    except Exception as e:
+        frappe.log_error(f"Failed to update summary for {session_id}: {e}", "AI Chat Summary")
+        return
+
+    if not summary:
+        return
+
+    frappe.db.set_value("AI Chat Session", session_id, {
+        "summary": summary,
+        "summarized_until": to_fold[-1].creation
+    }, update_modified=False)
+    frappe.db.commit()
+    frappe.cache().delete_value(_meta_key(session_id))
@@ -0,0 +1,172 @@
+import math
+import re
+from collections import Counter
+
+import numpy as np
+
+# Compound identifiers (ACC-SINV-2024-00012, PRJ/0042, item.code) are kept whole,
+# their parts are indexed as well so partial matches still score.
+_TOKEN_RE = re.compile(r"\w+(?:[-/.]\w+)*")
+_SPLIT_RE = re.compile(r"[-/.]")
+_TAG_RE = re.compile(r"<[^>]+>")
+
+# Function words and generic record vocabulary, never enough on their own for an exact match
+STOPWORDS = frozenset("""
+a an and are as at be by can do does for from has have how i in is it its me my of on or
+our show tell that the their there this to us was we were what when where which who why
+will with you your status details list all about
+""".split())
+
+# Terms in at most ~5% of chunks (log(1 + 19)) count as rare enough for an exact match
+MIN_EXACT_IDF = 3.0
+
+def tokenize(text):
+    """Lowercased word tokens, with compound identifiers emitted whole and split."""
+    if not text:
+        return []
+
+    tokens = []
+    for match in _TOKEN_RE.findall(_TAG_RE.sub(" ", text).lower()):
+        tokens.append(match)
+        parts = _SPLIT_RE.split(match)
+        if len(parts) > 1:
+            tokens.extend(p for p in parts if p)
+    return tokens
+
+def is_identifier(term):
+    """Tokens with digits or joiners (PRJ-0042, 00012, item.code) name a record, not a topic."""
+    return any(c.isdigit() for c in term) or bool(_SPLIT_RE.search(term))
+
+class BM25Index:
+    """
+    In-memory Okapi BM25 inverted index over AI Embedding content.
+    Built alongside the FAISS index and keyed by the same AI Embedding names.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_map = []
+        self.postings = {}
+        self.doc_len = None
+        self.avgdl = 0.0
+
+    def build(self, rows):
+        """Builds the index from an iterable of (name, content) pairs."""
+        postings = {}
+        doc_map = []
+        lengths = []
+
+        for name, content in rows:
+            tokens = tokenize(content)
+            doc_id = len(doc_map)
+            doc_map.append(name)
+            lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                postings.setdefault(term, ([], []))
+                postings[term][0].append(doc_id)
+                postings[term][1].append(tf)
+
+        self.doc_map = doc_map
+        self.doc_len = np.array(lengths, dtype="float32")
+        self.avgdl = float(self.doc_len.mean()) if lengths else 0.0
+        self.postings = {
+            term: (np.array(ids, dtype="int64"), np.array(tfs, dtype="float32"))
+            for term, (ids, tfs) in postings.items()
+        }
+
+    def updated(self, removed, rows):
+        """
+        Returns a copy without the names in `removed` and with the (name, content) rows
+        appended, for small changes that don't warrant a rebuild. Kept documents keep
+        their order.
+        """
+        removed = set(removed)
+        keep = np.array([name not in removed for name in self.doc_map], dtype=bool)
+        # Old doc id -> new doc id, -1 for removed documents
+        remap = np.cumsum(keep, dtype="int64") - 1
+        remap[~keep] = -1
+
+        postings = {}
+        for term, (ids, tfs) in self.postings.items():
+            new_ids = remap[ids]
+            kept = new_ids >= 0
+            if kept.any():
+                postings[term] = ([new_ids[kept]], [tfs[kept]])
+
+        doc_map = [name for name, kept in zip(self.doc_map, keep, strict=True) if kept]
+        lengths = [self.doc_len[keep]] if self.doc_len is not None else []
+
+        added_lengths = []
+        for name, content in rows:
+            tokens = tokenize(content)
+            doc_id = len(doc_map)
+            doc_map.append(name)
+            added_lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                postings.setdefault(term, ([], []))
+                postings[term][0].append(np.array([doc_id], dtype="int64"))
+                postings[term][1].append(np.array([tf], dtype="float32"))
+        lengths.append(np.array(added_lengths, dtype="float32"))
+
+        index = BM25Index(self.k1, self.b)
+        index.doc_map = doc_map
+        index.doc_len = np.concatenate(lengths)
+        index.avgdl = float(index.doc_len.mean()) if len(doc_map) else 0.0
+        index.postings = {
+            term: (np.concatenate(ids), np.concatenate(tfs))
+            for term, (ids, tfs) in postings.items()
+        }
+        return index
+
+    def __len__(self):
+        return len(self.doc_map)
+
+    def search(self, query_text, k=20):
+        """
+        Returns up to k results as [{"name", "score", "exact"}] ordered by BM25 score.
+        `exact` is set when the chunk matched an identifier-like or rare (IDF of at
+        least MIN_EXACT_IDF) query term, not only stopwords or common vocabulary.
+        """
+        n = len(self.doc_map)
+        if not n:
+            return []
+
+        terms = set(tokenize(query_text))
+        scores = np.zeros(n, dtype="float32")
+        exact = np.zeros(n, dtype=bool)
+        matched = False
+
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            matched = True
+            ids, tfs = posting
+            idf = math.log(1 + (n - len(ids) + 0.5) / (len(ids) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.doc_len[ids] / (self.avgdl or 1.0))
+            scores[ids] += idf * tfs * (self.k1 + 1) / (tfs + norm)
+            if term not in STOPWORDS and (is_identifier(term) or idf >= MIN_EXACT_IDF):
+                exact[ids] = True
+
+        if not matched:
+            return []
+
+        hits = np.flatnonzero(scores)
+        if len(hits) > k:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+
+        return [{"name": self.doc_map[i], "score": float(scores[i]), "exact": bool(exact[i])} for i in hits]
+
+def reciprocal_rank_fusion(result_lists, k=60):
+    """
+    Fuses ranked result lists ([{"name", ...}] each) by reciprocal rank.
+    Returns [(name, fused_score)] ordered best first.
+    """
+    fused = {}
+    for results in result_lists:
+        for rank, res in enumerate(results):
+            fused[res["name"]] = fused.get(res["name"], 0.0) + 1.0 / (k + rank + 1)
+
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
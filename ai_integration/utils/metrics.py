@@ -0,0 +1,165 @@
+import os
+import time
+from contextlib import contextmanager
+
+import frappe
+
+# Histogram bucket upper bounds in milliseconds
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+_PREFIX = "ai_integration:metrics"
+
+def _key(*parts):
+    return frappe.cache().make_key(":".join((_PREFIX, *parts)))
+
+def start_trace():
+    """Starts collecting spans for the current request/job, returns the span list."""
+    frappe.local.ai_trace = []
+    return frappe.local.ai_trace
+
+def get_trace():
+    return getattr(frappe.local, "ai_trace", None)
+
+def record_span(stage, duration_ms, label=None, tokens=None, **attrs):
+    """
+    Records one timed stage: appended to the active trace (if any) and aggregated
+    in Redis as a latency histogram plus token counters per (stage, label).
+    `tokens` is an optional {kind: count} dict, e.g. {"prompt": 1200, "output": 80}.
+    """
+    entry = {"stage": stage, "duration_ms": round(duration_ms, 2)}
+    if label:
+        entry["label"] = label
+    if tokens:
+        entry["tokens"] = tokens
+    entry.update(attrs)
+
+    trace = get_trace()
+    if trace is not None:
+        trace.append(entry)
+
+    try:
+        series = f"{stage}|{label or ''}"
+        bucket = next((str(b) for b in LATENCY_BUCKETS_MS if duration_ms <= b), "+Inf")
+
+        pipe = frappe.cache().pipeline()
+        pipe.sadd(_key("series"), series)
+        pipe.hincrby(_key("hist", series), "count", 1)
+        pipe.hincrbyfloat(_key("hist", series), "sum", duration_ms)
+        pipe.hincrby(_key("hist", series), f"b:{bucket}", 1)
+        for kind, count in (tokens or {}).items():
+            pipe.hincrby(_key("tokens", series), kind, int(count or 0))
+        pipe.execute()
+    except Exception:
+        # Metrics must never break the request
+        pass
+
+@contextmanager
+def span(stage, label=None, **attrs):
+    """
+    Times a block as a stage. The yielded dict can be filled with extra attributes
+    and a "tokens" dict while the block runs.
+    """
+    info = dict(attrs)
+    started = time.monotonic()
+    try:
+        yield info
+    finally:
+        tokens = info.pop("tokens", None)
+        record_span(stage, (time.monotonic() - started) * 1000, label=label, tokens=tokens, **info)
+
+def llm_token_counts(response):
+    """Token counts of a Gemini response as a {kind: count} dict for record_span."""
+    usage = getattr(response, "usage_metadata", None)
+    if not usage:
+        return None
+    return {
+        "prompt": usage.prompt_token_count or 0,
+        "cached": usage.cached_content_token_count or 0,
+        "output": usage.candidates_token_count or 0
+    }
+
+def set_gauge(name, value):
+    """Sets a gauge, e.g. the vector index size, exported as ai_integration_<name>."""
+    try:
+        pipe = frappe.cache().pipeline()
+        pipe.hset(_key("gauges"), name, value)
+        pipe.execute()
+    except Exception:
+        pass
+
+def rss_bytes():
+    """Resident memory of this process on Linux, None elsewhere."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+def _raw(*commands):
+    """
+    Runs read commands on the raw Redis client: keys are already namespaced by
+    _key, so the pickling/namespacing overrides of frappe.cache() must be bypassed.
+    """
+    pipe = frappe.cache().pipeline()
+    for command, *args in commands:
+        getattr(pipe, command)(*args)
+    return pipe.execute()
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+def render_prometheus():
+    """Renders the aggregated metrics in the Prometheus text exposition format."""
+    series_members, gauges = _raw(("smembers", _key("series")), ("hgetall", _key("gauges")))
+    series_list = sorted(_decode(s) for s in series_members or [])
+
+    aggregates = _raw(*[
+        command
+        for series in series_list
+        for command in (("hgetall", _key("hist", series)), ("hgetall", _key("tokens", series)))
+    ]) if series_list else []
+
+    lines = [
+        "# HELP ai_integration_stage_duration_ms Duration of AI Integration pipeline stages.",
+        "# TYPE ai_integration_stage_duration_ms histogram"
+    ]
+    token_lines = []
+
+    for i, series in enumerate(series_list):
+        stage, _, label = series.partition("|")
+        labels = f'stage="{_escape(stage)}"' + (f',name="{_escape(label)}"' if label else "")
+
+        hist = {_decode(k): _decode(v) for k, v in (aggregates[2 * i] or {}).items()}
+        cumulative = 0
+        for bound in LATENCY_BUCKETS_MS:
+            cumulative += int(hist.get(f"b:{bound}", 0))
+            lines.append(f'ai_integration_stage_duration_ms_bucket{{{labels},le="{bound}"}} {cumulative}')
+        cumulative += int(hist.get("b:+Inf", 0))
+        lines.append(f'ai_integration_stage_duration_ms_bucket{{{labels},le="+Inf"}} {cumulative}')
+        lines.append(f"ai_integration_stage_duration_ms_sum{{{labels}}} {float(hist.get('sum', 0))}")
+        lines.append(f"ai_integration_stage_duration_ms_count{{{labels}}} {int(hist.get('count', 0))}")
+
+        for kind, count in (aggregates[2 * i + 1] or {}).items():
+            token_lines.append(f'ai_integration_tokens_total{{{labels},kind="{_escape(_decode(kind))}"}} {int(count)}')
+
+    if token_lines:
+        lines.append("# HELP ai_integration_tokens_total Tokens processed per stage.")
+        lines.append("# TYPE ai_integration_tokens_total counter")
+        lines.extend(token_lines)
+
+    for name, value in sorted((_decode(k), _decode(v)) for k, v in (gauges or {}).items()):
+        lines.append(f"# TYPE ai_integration_{name} gauge")
+        lines.append(f"ai_integration_{name} {float(value)}")
+
+    return "\n".join(lines) + "\n"
+
+def reset_metrics():
+    (series_members,) = _raw(("smembers", _key("series")))
+    keys = [_key("series"), _key("gauges")]
+    for series in series_members or []:
+        series = _decode(series)
+        keys.extend((_key("hist", series), _key("tokens", series)))
+    _raw(("delete", *keys))
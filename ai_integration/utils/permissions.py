@@ -0,0 +1,62 @@
+import frappe
+
+def _get_request_cache():
+    """Per-request memo of permission decisions, keyed by (user, ptype, doctype, name)."""
+    cache = getattr(frappe.local, "ai_permission_cache", None)
+    if cache is None:
+        cache = {}
+        frappe.local.ai_permission_cache = cache
+    return cache
+
+def _fetch_permitted_names(doctype, names, user, ptype):
+    """
+    Returns the subset of `names` the user can access, using a single
+    permission-conditioned `get_list` for the whole doctype.
+    """
+    if ptype != "read":
+        # get_list only applies read/select rules, fall back for anything else
+        return {n for n in names if frappe.has_permission(doctype, doc=n, ptype=ptype, user=user)}
+
+    try:
+        permitted = frappe.get_list(doctype,
+            filters={"name": ["in", list(names)]},
+            pluck="name",
+            limit_page_length=0,
+            user=user
+        )
+        return set(permitted)
+    except frappe.PermissionError:
+        # No read access to the doctype at all
+        return set()
+    except Exception:
+        # Child tables, virtual doctypes etc. can't be listed directly, check one by one
+        return {n for n in names if frappe.has_permission(doctype, doc=n, ptype=ptype, user=user)}
+
+def filter_permitted_references(references, user=None, ptype="read"):
+    """
+    Bulk permission check for a list of (reference_doctype, reference_name) pairs.
+
+    Candidates are grouped by doctype and each group is resolved with one query,
+    so the cost is one query per distinct doctype instead of one permission
+    evaluation per document. Decisions are memoized per user for the rest of
+    the request.
+
+    Returns the set of permitted (doctype, name) pairs.
+    """
+    user = user or frappe.session.user
+    cache = _get_request_cache()
+
+    pending = {}
+    for doctype, name in references:
+        if (user, ptype, doctype, name) not in cache:
+            pending.setdefault(doctype, set()).add(name)
+
+    for doctype, names in pending.items():
+        permitted = _fetch_permitted_names(doctype, names, user, ptype)
+        for name in names:
+            cache[(user, ptype, doctype, name)] = name in permitted
+
+    return {
+        (doctype, name) for doctype, name in references
+        if cache.get((user, ptype, doctype, name))
+    }
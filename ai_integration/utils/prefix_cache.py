@@ -0,0 +1,117 @@
+import hashlib
+import re
+
+import frappe
+from google.genai import errors, types
+
+DEFAULT_CONTEXT_CACHE_TTL = 3600
+
+_MISSING_CACHE_RE = re.compile(r"cached\s*content.*(not found|expired)", re.IGNORECASE)
+
+# Don't retry creating a cache the provider rejected (e.g. prefix below its minimum size) for this long
+_REJECTED_TTL = 600
+
+_STATS_KEYS = (
+    "cached_requests", "cached_llm_ms", "cached_tokens",
+    "uncached_requests", "uncached_llm_ms", "uncached_prompt_tokens"
+)
+
+def get_prefix_key(model_name, system_instruction, toolset_key):
+    """The static prefix is identified by model, system instruction and tool set."""
+    raw = f"{model_name}\x00{system_instruction}\x00{toolset_key}"
+    return "ai_integration:prefix_cache:" + hashlib.sha1(raw.encode()).hexdigest()
+
+def get_cached_prefix(client, model_name, system_instruction, gemini_tools, toolset_key, ttl=None):
+    """
+    Returns the name of a provider-side cached content holding the system instruction
+    and tool declarations, creating it on first use. The name is shared by all workers
+    through Redis; a new tool set produces a new key and therefore a fresh cache.
+    Returns None when the provider can't cache this prefix.
+    """
+    ttl = ttl or DEFAULT_CONTEXT_CACHE_TTL
+    key = get_prefix_key(model_name, system_instruction, toolset_key)
+
+    cached = frappe.cache().get_value(key)
+    if cached:
+        return cached.get("name")
+    if cached is not None:
+        return None
+
+    try:
+        cache = client.caches.create(
+            model=model_name,
+            config=types.CreateCachedContentConfig(
+                display_name=f"ai_integration {frappe.local.site}",
+                system_instruction=system_instruction,
+                tools=gemini_tools,
+                ttl=f"{ttl}s"
+            )
+        )
+    except Exception as e:
+        frappe.logger("ai_integration").info(f"Prompt prefix not cached: {e}")
+        frappe.cache().set_value(key, {}, expires_in_sec=_REJECTED_TTL)
+        return None
+
+    # Expire locally a little before the provider does
+    frappe.cache().set_value(key, {"name": cache.name}, expires_in_sec=max(ttl - 60, 60))
+    return cache.name
+
+def is_missing_prefix_error(error):
+    """
+    True when a request failed because the provider no longer has the cached content
+    (expired or deleted), not for quota, auth or network errors.
+    """
+    if not isinstance(error, errors.ClientError):
+        return False
+    return bool(_MISSING_CACHE_RE.search(str(getattr(error, "message", None) or error)))
+
+def drop_cached_prefix(model_name, system_instruction, toolset_key):
+    frappe.cache().delete_value(get_prefix_key(model_name, system_instruction, toolset_key))
+
+def get_usage(response):
+    """(prompt_tokens, cached_tokens) of a response, 0 when the provider doesn't report them."""
+    usage = getattr(response, "usage_metadata", None)
+    if not usage:
+        return 0, 0
+    return usage.prompt_token_count or 0, usage.cached_content_token_count or 0
+
+def _stats_key(name):
+    return frappe.cache().make_key(f"ai_integration:prefix_cache_stats:{name}")
+
+def record_usage(used_cache, llm_ms, prompt_tokens, cached_tokens):
+    prefix = "cached" if used_cache else "uncached"
+    try:
+        redis = frappe.cache()
+        redis.incr(_stats_key(f"{prefix}_requests"))
+        redis.incrbyfloat(_stats_key(f"{prefix}_llm_ms"), llm_ms)
+        if used_cache:
+            redis.incrby(_stats_key("cached_tokens"), cached_tokens)
+        else:
+            redis.incrby(_stats_key("uncached_prompt_tokens"), prompt_tokens)
+    except Exception:
+        pass
+
+def get_stats():
+    """
+    Input tokens served from the provider cache and the average LLM latency of
+    requests with and without the cached prefix.
+    """
+    values = {}
+    for name in _STATS_KEYS:
+        raw = frappe.cache().get(_stats_key(name))
+        values[name] = float(raw) if raw else 0.0
+
+    cached_avg = values["cached_llm_ms"] / values["cached_requests"] if values["cached_requests"] else None
+    uncached_avg = values["uncached_llm_ms"] / values["uncached_requests"] if values["uncached_requests"] else None
+
+    return {
+        "cached_requests": int(values["cached_requests"]),
+        "uncached_requests": int(values["uncached_requests"]),
+        "cached_tokens": int(values["cached_tokens"]),
+        "avg_cached_tokens_per_request": round(values["cached_tokens"] / values["cached_requests"], 1)
+            if values["cached_requests"] else 0.0,
+        "avg_llm_ms_cached": round(cached_avg, 1) if cached_avg is not None else None,
+        "avg_llm_ms_uncached": round(uncached_avg, 1) if uncached_avg is not None else None,
+        "avg_latency_saved_ms": round(uncached_avg - cached_avg, 1)
+            if cached_avg is not None and uncached_avg is not None else None
+    }
@@ -0,0 +1,128 @@
+import frappe
+import tiktoken
+from frappe.utils import flt
+
+DEFAULT_PROMPT_TOKEN_BUDGET = 8000
+DEFAULT_CONTEXT_BUDGET_RATIO = 0.6
+
+# Chunks are only trimmed if at least this many tokens of them still fit
+MIN_TRIMMED_CHUNK_TOKENS = 64
+
+_encoding = None
+
+def get_encoding():
+    """cl100k_base, the same encoding `chunk_text` uses, loaded once per process."""
+    global _encoding
+    if _encoding is None:
+        _encoding = tiktoken.get_encoding("cl100k_base")
+    return _encoding
+
+def count_tokens(text):
+    """
+    Tokens of text in cl100k_base. Gemini's tokenizer differs, so this is an estimate
+    of the prompt size, not the count the provider bills; the budget is a target.
+    """
+    if not text:
+        return 0
+    return len(get_encoding().encode(text))
+
+def trim_to_tokens(text, max_tokens, keep="start"):
+    """Trims text to at most max_tokens, keeping the start or the end."""
+    tokens = get_encoding().encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+    kept = tokens[:max_tokens] if keep == "start" else tokens[-max_tokens:]
+    return get_encoding().decode(kept)
+
+def get_prompt_budget(settings):
+    """
+    Returns (context_budget, history_budget) in tokens from AI Integration Settings.
+    A Context Budget Ratio of 0 sends no retrieved context, only chat history.
+    """
+    total = settings.get("prompt_token_budget") or DEFAULT_PROMPT_TOKEN_BUDGET
+    ratio = settings.get("context_budget_ratio")
+    if ratio is None:
+        ratio = DEFAULT_CONTEXT_BUDGET_RATIO
+    ratio = min(max(flt(ratio), 0.0), 1.0)
+    context_budget = int(total * ratio)
+    return context_budget, total - context_budget
+
+def fit_context(chunks, budget):
+    """
+    Keeps the highest-scoring chunks that fit the token budget.
+    `chunks` must already be ordered best first; the first chunk that overflows is
+    trimmed if enough of it fits, everything after that is dropped.
+    """
+    kept = []
+    used = 0
+    separator = count_tokens("\n\n---\n\n")
+
+    for chunk in chunks:
+        cost = count_tokens(chunk) + (separator if kept else 0)
+        if used + cost <= budget:
+            kept.append(chunk)
+            used += cost
+            continue
+
+        remaining = budget - used - (separator if kept else 0)
+        if remaining >= MIN_TRIMMED_CHUNK_TOKENS:
+            kept.append(trim_to_tokens(chunk, remaining) + " [...]")
+        break
+
+    return kept
+
+def fit_history(chat_history, summary, budget, message=None):
+    """
+    Returns (summary_text, recent_messages) within the token budget.
+    The most recent turns are kept verbatim; older turns are represented only
+    by the session's rolling summary.
+    """
+    history = list(chat_history or [])
+    # The current question is sent separately, don't pay for it twice
+    if history and message is not None and history[-1].get("content") == message:
+        history = history[:-1]
+
+    summary = summary or ""
+    if summary:
+        # The summary never takes more than half of the history budget
+        summary = trim_to_tokens(summary, budget // 2, keep="end")
+    used = count_tokens(summary)
+
+    recent = []
+    for msg in reversed(history):
+        cost = count_tokens(f"{msg.get('role', 'User')}: {msg.get('content')}\n")
+        if used + cost > budget:
+            break
+        recent.append(msg)
+        used += cost
+
+    recent.reverse()
+    return summary, recent
+
+def build_prompt(system_instruction, message, context_chunks, chat_history=None, history_summary=None, settings=None):
+    """
+    Assembles the full prompt within the configured token budget. The system
+    instruction is left out when None, for callers that send it as a (cacheable)
+    model config instead. Returns (full_prompt, context_chunks_used).
+    """
+    context_budget, history_budget = get_prompt_budget(settings or frappe._dict())
+
+    context_chunks = fit_context(context_chunks, context_budget)
+    context_text = "\n\n---\n\n".join(context_chunks)
+
+    summary, recent = fit_history(chat_history, history_summary, history_budget, message=message)
+
+    history_text = ""
+    if summary:
+        history_text += f"\n\nSummary of earlier conversation:\n{summary}"
+    if recent:
+        history_text += "\n\nChat History:\n"
+        for msg in recent:
+            history_text += f"{msg.get('role', 'User')}: {msg.get('content')}\n"
+
+    full_prompt = f"Context:\n{context_text}{history_text}\n\nUser Question: {message}"
+    if system_instruction:
+        full_prompt = f"{system_instruction}\n\n{full_prompt}"
+    return full_prompt, context_chunks
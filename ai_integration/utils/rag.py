@@ -1,9 +1,20 @@
 import frappe
 import json
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
 import numpy as np
 from google import genai
 from google.genai import types
-from ai_integration.utils.embedding import generate_embedding_vector
+from ai_integration.utils.embedding import resolve_embedding, start_embedding
+from ai_integration.utils.permissions import filter_permitted_references
+from ai_integration.utils import answer_cache
+from ai_integration.utils.prompt import build_prompt
+from ai_integration.utils.context import merge_adjacent_chunks, mmr_select
+from ai_integration.utils.metrics import llm_token_counts, record_span, span, start_trace
+from ai_integration.utils.concurrency import get_executor, result_within, submit_with_timeout
+from ai_integration.utils.tool_cache import ToolResultMemo, get_tool_declaration_cache
+from ai_integration.utils.prefix_cache import drop_cached_prefix, get_cached_prefix, get_usage, is_missing_prefix_error
+from ai_integration.utils.prefix_cache import record_usage as record_prefix_usage
 
 # Try importing Tool Registry
 try:
@@ -12,11 +23,27 @@ try:
 except ImportError:
     HAS_FAC = False
 
-_TOOL_CACHE = {}
+SYSTEM_INSTRUCTION = (
+    "You are a helpful assistant integrated into ERPNext. "
+    "Use the provided context to answer the user's question. "
+    "If the answer is not in the context, say you don't know based on the available data, "
+    "but try to be helpful if it's a general question. "
+    "Always be polite and professional."
+)
+
+DEFAULT_TOOL_TIMEOUT = 60
+DEFAULT_MAX_PARALLEL_TOOLS = 4
 
 def get_settings():
     return frappe.get_single("AI Integration Settings")
 
+def get_model_name(settings):
+    model_name = settings.google_model or "gemini-3-pro-preview"
+    model_name = model_name.strip()
+    if model_name.startswith("models/"):
+        model_name = model_name[7:]
+    return model_name
+
 def adapt_tools_for_gemini(core_tools):
     """Adapts frappe_assistant_core tools to Google GenAI format."""
     gemini_tools = []
@@ -37,155 +64,362 @@ def adapt_tools_for_gemini(core_tools):
 
     return gemini_tools
 
-def fetch_fac_tools(user):
+def _load_core_tools(user):
+    return get_tool_registry().get_available_tools(user)
+
+def fetch_fac_toolset(user):
     """
     Fetches available tools from Frappe Assistant Core for the given user.
-    Uses a module-level cache to avoid repeated registry lookups.
+    Returns (gemini_tools, read_only_tool_names, toolset_key), served from a bounded cache keyed by
+    site, user, roles and registry version; users with identical tools share declarations.
     """
     if not HAS_FAC:
-        return []
+        return [], frozenset(), None
+
+    try:
+        return get_tool_declaration_cache().get_tools(user, _load_core_tools, adapt_tools_for_gemini)
+    except Exception as e:
+        frappe.log_error(f"Error fetching FAC tools: {str(e)}")
+        return [], frozenset(), None
+
+def fetch_fac_tools(user):
+    """Fetches the adapted Gemini tool declarations available to the given user."""
+    return fetch_fac_toolset(user)[0]
 
-    # Check cache
-    if user in _TOOL_CACHE:
-        return _TOOL_CACHE[user]
+def _tool_result_data(func_name, run):
+    """Runs a tool call and maps its outcome to the function_response payload."""
+    try:
+        return {'result': run()}
+    except (frappe.exceptions.ValidationError, frappe.exceptions.DoesNotExist) as fe:
+        # Structured error for expected business logic failures
+        error_msg = f"{type(fe).__name__}: {fe}"
+        return {
+            "status": "error",
+            "message": error_msg
+        }
+    except FutureTimeoutError:
+        return {
+            "status": "error",
+            "message": f"Tool {func_name} timed out."
+        }
+    except Exception as e:
+        frappe.log_error(f"Tool Execution Error ({func_name}): {e}")
+        return {'error': str(e)}
 
+def _timed_tool_call(timings, idx, registry, func_name, func_args):
+    started = time.monotonic()
     try:
-        registry = get_tool_registry()
-        core_tools = registry.get_available_tools(user)
-        gemini_tools = adapt_tools_for_gemini(core_tools)
+        return registry.execute_tool(func_name, func_args)
+    finally:
+        timings[idx] = (time.monotonic() - started) * 1000
+
+def execute_tool_calls(registry, calls, settings, memo=None):
+    """
+    Executes the (name, args) function calls of one model turn.
+
+    Calls up to the first one that may write (not read-only per `memo`) are independent
+    and run concurrently in a bounded thread pool, each in its own Frappe site context
+    and DB connection. That call and every one after it run one at a time, so they see
+    earlier writes. Every call gets the same timeout. Read-only calls already answered
+    in this chat session are served from `memo`. Results and latencies (ms) are
+    returned in the original call order.
+    """
+    memo = memo or ToolResultMemo(None, None)
+    first_write = next((idx for idx, (func_name, _) in enumerate(calls)
+        if func_name not in memo.read_only_names), len(calls))
+
+    memoized = {}
+    for idx, (func_name, func_args) in enumerate(calls):
+        # Reads after a write of this turn must see it, they aren't served from the memo
+        cached = memo.get(func_name, func_args) if idx < first_write else None
+        if cached is not None:
+            memoized[idx] = cached
+            frappe.logger("ai_integration").info(f"AI Tool Execution Memoized: {func_name} with {func_args}")
+        else:
+            # Log Intent
+            frappe.logger("ai_integration").info(f"AI Tool Execution Intent: {func_name} with {func_args}")
+
+    pending = [(idx, call) for idx, call in enumerate(calls) if idx not in memoized]
+    if pending:
+        executed, executed_timings = _run_tool_calls(registry, [call for _, call in pending], settings,
+            parallel=sum(1 for idx, _ in pending if idx < first_write))
+    else:
+        executed, executed_timings = [], []
+
+    results = [None] * len(calls)
+    timings = [0.0] * len(calls)
+    for idx, result_data in memoized.items():
+        results[idx] = result_data
+
+    for (idx, (func_name, func_args)), result_data, duration_ms in zip(pending, executed, executed_timings, strict=True):
+        results[idx] = result_data
+        timings[idx] = duration_ms
+        if memo.is_cacheable(func_name):
+            memo.set(func_name, func_args, result_data)
+        else:
+            # A call that may have written data makes earlier read results stale
+            memo.invalidate()
+
+    return results, timings
+
+def _run_tool_calls(registry, calls, settings, parallel=None):
+    """
+    Runs the first `parallel` calls (all by default) concurrently, then the rest one
+    after another, each starting once the previous one finished.
+    """
+    parallel = len(calls) if parallel is None else parallel
+    timings = [0.0] * len(calls)
+    timeout = settings.tool_timeout or DEFAULT_TOOL_TIMEOUT
+
+    # Sequential calls go through the pool as well, so they get the same time limit
+    max_workers = min(max(parallel, 1), settings.max_parallel_tools or DEFAULT_MAX_PARALLEL_TOOLS)
+    executor = get_executor(max_workers, thread_name_prefix="ai_tool")
+
+    def submit(idx):
+        func_name, func_args = calls[idx]
+        return submit_with_timeout(executor, _timed_tool_call, timings, idx, registry, func_name, func_args)
 
-        # Cache the result
-        _TOOL_CACHE[user] = gemini_tools
-        return gemini_tools
+    try:
+        futures = [submit(idx) for idx in range(parallel)]
+        # Each call gets `timeout` seconds from when a worker starts it
+        results = []
+        for idx, (func_name, _) in enumerate(calls):
+            future = futures[idx] if idx < parallel else submit(idx)
+            results.append(_tool_result_data(func_name, lambda: result_within(future, timeout)))
+            if future.cancelled() or not future.done():
+                timings[idx] = timeout * 1000
+    finally:
+        # Don't wait for timed out calls, their threads finish in the background
+        executor.shutdown(wait=False)
+
+    for (func_name, _), result_data, duration_ms in zip(calls, results, timings, strict=True):
+        status = 'ok' if 'result' in result_data else 'error'
+        frappe.logger("ai_integration").info(f"AI Tool Execution: {func_name} took {duration_ms:.1f}ms ({status})")
+        record_span("tool", duration_ms, label=func_name, status=status)
+
+    return results, timings
+
+def _start_tool_chat(client, model_name, gemini_tools, full_prompt, cache_name):
+    """Creates the tool-enabled chat and sends the first prompt, using the cached prefix if given."""
+    if cache_name:
+        config = types.GenerateContentConfig(cached_content=cache_name)
+    else:
+        config = types.GenerateContentConfig(system_instruction=SYSTEM_INSTRUCTION, tools=gemini_tools)
+
+    # Create Chat Session
+    chat = client.chats.create(model=model_name, config=config)
+
+    # Initial Send
+    return chat, chat.send_message(full_prompt)
+
+def _cache_answer(settings, query_vector, cache_scope, result, context_versions, context_references, start):
+    """Stores a generated answer in the semantic answer cache if it is enabled."""
+    if not cache_scope:
+        return
+    try:
+        answer_cache.get_answer_cache().store(
+            query_vector,
+            cache_scope,
+            result,
+            context_versions,
+            latency_ms=(time.monotonic() - start) * 1000,
+            max_size=settings.answer_cache_size or 256,
+            references=context_references
+        )
     except Exception as e:
-        frappe.log_error(f"Error fetching FAC tools: {str(e)}")
+        frappe.log_error(f"Answer cache store failed: {e}")
+
+def retrieve_context(vector_store, query_text, query_vector, top_k=5, candidates=10, doctypes=None,
+        search_results=None):
+    """
+    Retrieval half of RAG for one query: dense + BM25 search fused by reciprocal rank,
+    permission filter, merge of neighbouring chunks and MMR. `doctypes` restricts the
+    reference doctypes. Returns up to top_k spans with reference_doctype, reference_name,
+    content, relevance (fused, best = 1), score (best cosine of its chunks) and docs
+    (the AI Embedding rows). The caller syncs the vector store; it may pass the
+    query's `search_results` when it searched several queries in one batch.
+    """
+    if search_results is None:
+        search_results = vector_store.hybrid_search(query_text, query_vector, k=candidates, sync=False)
+
+    # Lexical hits on identifiers or rare terms are kept even below the cosine cutoff,
+    # a match on common words alone is not
+    valid_results = [r for r in search_results or [] if r['score'] > 0.4 or r.get('exact_match')]
+    if not valid_results:
         return []
 
-def answer_user_question(message, chat_history=None):
+    filters = {"name": ["in", [r['name'] for r in valid_results]]}
+    if doctypes:
+        filters["reference_doctype"] = ["in", list(doctypes)]
+
+    with span("fetch", rows=len(valid_results)):
+        docs = frappe.get_all("AI Embedding",
+            filters=filters,
+            fields=["name", "reference_doctype", "reference_name", "chunk_index", "content", "modified"]
+        )
+    doc_map = {d.name: d for d in docs}
+    scored_docs = [
+        {"score": r['score'], "rrf_score": r.get('rrf_score', r['score']), "doc": doc_map[r['name']]}
+        for r in valid_results if r['name'] in doc_map
+    ]
+
+    # Resolved in bulk: one permission-conditioned query per reference doctype
+    with span("permission", candidates=len(scored_docs)):
+        permitted = filter_permitted_references(
+            [(item['doc'].reference_doctype, item['doc'].reference_name) for item in scored_docs]
+        )
+    scored_docs = [
+        item for item in scored_docs
+        if (item['doc'].reference_doctype, item['doc'].reference_name) in permitted
+    ]
+    if not scored_docs:
+        return []
+
+    # Adjacent chunks of one document become a single span without the chunk overlap,
+    # then MMR over the index vectors keeps near-duplicate spans out of the prompt
+    vectors = vector_store.get_vectors([item['doc'].name for item in scored_docs])
+    best_rrf = max(item['rrf_score'] for item in scored_docs) or 1.0
+    cosine = {item['doc'].name: item['score'] for item in scored_docs}
+    spans = merge_adjacent_chunks([
+        {
+            "doc": item['doc'],
+            "relevance": item['rrf_score'] / best_rrf,
+            "vector": vectors.get(item['doc'].name)
+        }
+        for item in scored_docs
+    ])
+
+    selected = mmr_select(spans, top_k)
+    for ctx in selected:
+        ctx["score"] = max(cosine[doc.name] for doc in ctx["docs"])
+    return selected
+
+def answer_user_question(message, chat_history=None, history_summary=None, session_id=None, query_embedding=None):
+    """
+    Answers a question with RAG and tools. `query_embedding` may be a future from
+    `start_embedding` the caller started earlier, to overlap it with its own work.
+    """
+    start = time.monotonic()
+    trace = start_trace()
     try:
         settings = get_settings()
         if not settings.google_api_key:
             return {"error": "Google API Key not configured."}
 
         # 1. Embed Query
-        query_vector = generate_embedding_vector(message)
-        if not query_vector:
-            return {"error": "Failed to generate embedding for query."}
+        # The embedding request stays in flight while the stages that don't need it run
+        if query_embedding is None:
+            query_embedding = start_embedding(message)
+
+        # 1b. Semantic answer cache
+        # Looked up as soon as the embedding resolves, so a hit skips the index sync, client and
+        # tool set below; with the cache off those overlap the embedding instead
+        query_vector = None
+        cache_scope = None
+        if settings.enable_answer_cache:
+            cache_scope = answer_cache.get_cache_scope(frappe.session.user, chat_history, message)
+            query_vector = resolve_embedding(query_embedding)
+            if not query_vector:
+                return {"error": "Failed to generate embedding for query."}
+
+            cached = answer_cache.get_answer_cache().lookup(
+                query_vector, cache_scope, settings.answer_cache_threshold or 0.95
+            )
+            if cached:
+                elapsed_ms = (time.monotonic() - start) * 1000
+                answer_cache.record_hit(cached["latency_ms"] - elapsed_ms)
+                return dict(cached["response"], cached=True, trace=trace)
+            answer_cache.record_miss()
 
-        # 2. Search Vector DB
         from ai_integration.utils.vector_store import get_vector_store
         vector_store = get_vector_store()
+        vector_store.sync()
 
-        search_results = vector_store.search(query_vector, k=20)
-
-        scored_docs = []
-        if search_results:
-            valid_results = [r for r in search_results if r['score'] > 0.4]
-
-            if valid_results:
-                names = [r['name'] for r in valid_results]
-                docs = frappe.get_all("AI Embedding",
-                    filters={"name": ["in", names]},
-                    fields=["name", "reference_doctype", "reference_name", "content"]
-                )
-                doc_map = {d.name: d for d in docs}
-
-                for res in valid_results:
-                    if res['name'] in doc_map:
-                        scored_docs.append({
-                            "score": res['score'],
-                            "doc": doc_map[res['name']]
-                        })
-
-        # 3. Filter by Permission & Top K
-        top_k = 5
-        context_chunks = []
+        api_key = settings.get_password("google_api_key")
+        client = genai.Client(api_key=api_key)
+        model_name = get_model_name(settings)
 
-        for item in scored_docs:
-            if len(context_chunks) >= top_k:
-                break
+        gemini_tools, read_only_tools, toolset_key = fetch_fac_toolset(frappe.session.user)
 
-            ref_doctype = item['doc'].reference_doctype
-            ref_name = item['doc'].reference_name
+        if query_vector is None:
+            query_vector = resolve_embedding(query_embedding)
+            if not query_vector:
+                return {"error": "Failed to generate embedding for query."}
 
-            if frappe.has_permission(ref_doctype, doc=ref_name, ptype="read"):
-                context_chunks.append(f"Context from {ref_doctype} ({ref_name}):\n{item['doc'].content}")
+        # 2-3. Hybrid search, permission filter, neighbour merge and MMR, the index was synced above
+        context_chunks = []
+        context_versions = {}
+        context_references = set()
+        for ctx in retrieve_context(vector_store, message, query_vector, top_k=5):
+            context_chunks.append(
+                f"Context from {ctx['reference_doctype']} ({ctx['reference_name']}):\n{ctx['content']}"
+            )
+            context_references.add((ctx['reference_doctype'], ctx['reference_name']))
+            for doc in ctx['docs']:
+                context_versions[doc.name] = str(doc.modified)
 
         # 4. Construct Prompt
-        context_text = "\n\n---\n\n".join(context_chunks)
-
-        system_instruction = (
-            "You are a helpful assistant integrated into ERPNext. "
-            "Use the provided context to answer the user's question. "
-            "If the answer is not in the context, say you don't know based on the available data, "
-            "but try to be helpful if it's a general question. "
-            "Always be polite and professional."
+        # Context and history share a token budget; older turns come from the session summary.
+        # The system instruction goes in the model config so it can be part of the cached prefix.
+        full_prompt, context_chunks = build_prompt(
+            None,
+            message,
+            context_chunks,
+            chat_history=chat_history,
+            history_summary=history_summary,
+            settings=settings
         )
 
-        history_text = ""
-        if chat_history:
-             history_text = "\n\nChat History:\n"
-             for msg in chat_history:
-                 history_text += f"{msg.get('role', 'User')}: {msg.get('content')}\n"
-
-        full_prompt = f"{system_instruction}\n\nContext:\n{context_text}{history_text}\n\nUser Question: {message}"
-
-        # 5. Initialize Client
-        api_key = settings.get_password("google_api_key")
-        client = genai.Client(api_key=api_key)
-
-        model_name = settings.google_model or "gemini-3-pro-preview"
-        model_name = model_name.strip()
-        if model_name.startswith("models/"):
-            model_name = model_name[7:]
+        # 5. Client and tool declarations were prepared while the query was embedding
 
         # --- TOOL INTEGRATION LOGIC ---
         if HAS_FAC:
             try:
-                gemini_tools = fetch_fac_tools(frappe.session.user)
-
                 if gemini_tools:
-                    # Create Chat Session
-                    chat = client.chats.create(
-                        model=model_name,
-                        config=types.GenerateContentConfig(tools=gemini_tools)
-                    )
-
-                    # Initial Send
-                    response = chat.send_message(full_prompt)
+                    # System instruction + tool schema are identical across turns, reuse them
+                    # from the provider's context cache when enabled
+                    cache_name = None
+                    if settings.enable_context_cache:
+                        cache_name = get_cached_prefix(client, model_name, SYSTEM_INSTRUCTION,
+                            gemini_tools, toolset_key, ttl=settings.context_cache_ttl)
+
+                    llm_started = time.monotonic()
+                    with span("llm", label="initial") as info:
+                        try:
+                            chat, response = _start_tool_chat(client, model_name, gemini_tools, full_prompt, cache_name)
+                        except Exception as e:
+                            if not cache_name or not is_missing_prefix_error(e):
+                                raise
+                            # Cache expired or was deleted provider-side, retry with the full prefix
+                            drop_cached_prefix(model_name, SYSTEM_INSTRUCTION, toolset_key)
+                            cache_name = None
+                            chat, response = _start_tool_chat(client, model_name, gemini_tools, full_prompt, None)
+                        info["tokens"] = llm_token_counts(response)
+                    llm_ms = (time.monotonic() - llm_started) * 1000
+                    prompt_tokens, cached_tokens = get_usage(response)
 
                     # Manual ReAct Loop
                     max_turns = 10
                     turn_count = 0
 
+                    # Need registry for execution, it doesn't change between turns
+                    registry = get_tool_registry()
+                    memo = ToolResultMemo(session_id, read_only_tools)
+                    tool_calls = []
+
                     while response.function_calls and turn_count < max_turns:
                         turn_count += 1
-                        response_parts = []
 
-                        # Need registry for execution
-                        registry = get_tool_registry()
-
-                        for call in response.function_calls:
-                            func_name = call.name
-                            func_args = call.args
-
-                            # Log Intent
-                            frappe.logger("ai_integration").info(f"AI Tool Execution Intent: {func_name} with {func_args}")
-
-                            try:
-                                # Execute
-                                result = registry.execute_tool(func_name, func_args)
-                                result_data = {'result': result}
-                            except (frappe.exceptions.ValidationError, frappe.exceptions.DoesNotExist) as fe:
-                                # Structured error for expected business logic failures
-                                error_msg = f"{type(fe).__name__}: {str(fe)}"
-                                result_data = {
-                                    "status": "error",
-                                    "message": error_msg
-                                }
-                            except Exception as e:
-                                frappe.log_error(f"Tool Execution Error ({func_name}): {str(e)}")
-                                result_data = {'error': str(e)}
+                        calls = [(call.name, call.args) for call in response.function_calls]
+                        results, timings = execute_tool_calls(registry, calls, settings, memo=memo)
+
+                        response_parts = []
+                        for (func_name, _), result_data, duration_ms in zip(calls, results, timings, strict=True):
+                            tool_calls.append({
+                                "name": func_name,
+                                "duration_ms": round(duration_ms, 1),
+                                "status": "ok" if "result" in result_data else "error"
+                            })
 
                             # Create response part
                             # Use dict directly to bypass Pydantic serialization issues in some environments
@@ -198,15 +432,32 @@ def answer_user_question(message, chat_history=None):
 
                         # Send all results back
                         if response_parts:
-                            response = chat.send_message(response_parts)
+                            llm_started = time.monotonic()
+                            with span("llm", label="tool_turn") as info:
+                                response = chat.send_message(response_parts)
+                                info["tokens"] = llm_token_counts(response)
+                            llm_ms += (time.monotonic() - llm_started) * 1000
+                            turn_prompt_tokens, turn_cached_tokens = get_usage(response)
+                            prompt_tokens += turn_prompt_tokens
+                            cached_tokens += turn_cached_tokens
                         else:
                             # Should not happen if function_calls is truthy
                             break
 
-                    return {
+                    record_prefix_usage(bool(cache_name), llm_ms, prompt_tokens, cached_tokens)
+
+                    result = {
                         "response": response.text,
-                        "context_used": [c[:100] + "..." for c in context_chunks]
+                        "context_used": [c[:100] + "..." for c in context_chunks],
+                        "tool_calls": tool_calls,
+                        "usage": {"prompt_tokens": prompt_tokens, "cached_tokens": cached_tokens},
+                        "latency_ms": round((time.monotonic() - start) * 1000, 1),
+                        "trace": trace
                     }
+                    # Tool results are live data the embeddings don't version, don't cache them
+                    if turn_count == 0:
+                        _cache_answer(settings, query_vector, cache_scope, result, context_versions, context_references, start)
+                    return result
 
             except Exception as tool_e:
                 frappe.log_error(f"Tool Orchestration Error: {str(tool_e)}")
@@ -220,15 +471,22 @@ def answer_user_question(message, chat_history=None):
                 return {"error": "An error occurred during tool processing. Please try again."}
 
         # --- FALLBACK / NO TOOLS ---
-        response = client.models.generate_content(
-            model=model_name,
-            contents=full_prompt
-        )
-
-        return {
+        with span("llm", label="generate") as info:
+            response = client.models.generate_content(
+                model=model_name,
+                contents=full_prompt,
+                config=types.GenerateContentConfig(system_instruction=SYSTEM_INSTRUCTION)
+            )
+            info["tokens"] = llm_token_counts(response)
+
+        result = {
             "response": response.text,
-            "context_used": [c[:100] + "..." for c in context_chunks]
+            "context_used": [c[:100] + "..." for c in context_chunks],
+            "latency_ms": round((time.monotonic() - start) * 1000, 1),
+            "trace": trace
         }
+        _cache_answer(settings, query_vector, cache_scope, result, context_versions, context_references, start)
+        return result
 
     except Exception as e:
         frappe.log_error(f"Chat Error: {str(e)}")
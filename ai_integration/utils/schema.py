@@ -0,0 +1,55 @@
+import frappe
+from frappe.model import no_value_fields, table_fields
+
+_SCHEMA_CACHE_KEY = "ai_integration:doctype_schema"
+
+# Select options beyond this many are cut, long option lists are mostly noise to a model
+MAX_SELECT_OPTIONS = 20
+
+def _compact_field(df):
+    """One line per field, e.g. `customer: Link(Customer) required "Client"`."""
+    text = f"{df.fieldname}: {df.fieldtype}"
+
+    if df.fieldtype == "Select" and df.options:
+        options = [o for o in df.options.split("\n") if o]
+        shown = " | ".join(options[:MAX_SELECT_OPTIONS])
+        if len(options) > MAX_SELECT_OPTIONS:
+            shown += f" | ... {len(options) - MAX_SELECT_OPTIONS} more"
+        text += f"({shown})"
+    elif df.options and (df.fieldtype in table_fields or df.fieldtype in ("Link", "Dynamic Link")):
+        text += f"({df.options})"
+
+    flags = [flag for flag, on in (("required", df.reqd), ("read only", df.read_only)) if on]
+    if flags:
+        text += " " + ", ".join(flags)
+    if df.label and df.label != frappe.unscrub(df.fieldname):
+        text += f' "{df.label}"'
+    return text
+
+def _build_schema(doctype):
+    meta = frappe.get_meta(doctype)
+    schema = {
+        "doctype": doctype,
+        "fields": [
+            _compact_field(df) for df in meta.fields
+            if df.fieldtype not in no_value_fields or df.fieldtype in table_fields
+        ]
+    }
+    if meta.title_field:
+        schema["title_field"] = meta.title_field
+    if meta.is_submittable:
+        schema["is_submittable"] = 1
+    if meta.istable:
+        schema["istable"] = 1
+    schema["child_tables"] = {df.fieldname: df.options for df in meta.get_table_fields()}
+    return schema
+
+def get_compact_schema(doctype):
+    """
+    Field list of a DocType as compact one-line descriptions, without layout fields.
+    Cached per site until a DocType, Custom Field or Property Setter changes.
+    """
+    return frappe.cache().hget(_SCHEMA_CACHE_KEY, doctype, generator=lambda: _build_schema(doctype))
+
+def invalidate_schema_cache():
+    frappe.cache().delete_value(_SCHEMA_CACHE_KEY)
@@ -0,0 +1,161 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import frappe
+
+TOOL_CACHE_TTL = 600
+TOOL_CACHE_MAX_USERS = 512
+TOOL_CACHE_MAX_TOOLSETS = 64
+
+# Read-only tool results are reused within a chat session for this long
+TOOL_RESULT_TTL = 300
+
+_READ_ONLY_PREFIXES = ("get_", "list_", "search_", "fetch_", "find_", "read_", "describe_", "count_")
+
+_REGISTRY_VERSION_KEY = "ai_integration:tool_registry_version"
+
+def get_registry_version():
+    """Bumped by invalidate_tool_cache, shared by all workers of the site."""
+    return frappe.cache().get_value(_REGISTRY_VERSION_KEY) or 0
+
+def invalidate_tool_cache():
+    """Invalidates cached tool declarations in every worker, e.g. after role or registry changes."""
+    frappe.cache().set_value(_REGISTRY_VERSION_KEY, get_registry_version() + 1)
+
+def _roles_hash(user):
+    return hashlib.sha1("\x00".join(sorted(frappe.get_roles(user))).encode()).hexdigest()
+
+def _toolset_hash(core_tools):
+    """Identifies a tool set by its names and schemas, so identical sets share declarations."""
+    digest = hashlib.sha1()
+    for tool in core_tools:
+        name, description, input_schema = _tool_fields(tool)
+        digest.update(json.dumps([name, description, input_schema], sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+def _tool_fields(tool):
+    if hasattr(tool, 'get'):
+        return tool.get('name'), tool.get('description'), tool.get('inputSchema')
+    return tool.name, tool.description, tool.inputSchema
+
+def is_read_only_tool(tool):
+    """MCP readOnlyHint annotation when the tool declares one, otherwise guessed from its name."""
+    annotations = tool.get('annotations') if hasattr(tool, 'get') else getattr(tool, 'annotations', None)
+    if annotations is not None:
+        hint = annotations.get('readOnlyHint') if hasattr(annotations, 'get') else getattr(annotations, 'readOnlyHint', None)
+        if hint is not None:
+            return bool(hint)
+
+    name = _tool_fields(tool)[0] or ""
+    return name.startswith(_READ_ONLY_PREFIXES)
+
+class ToolDeclarationCache:
+    """
+    Per-process cache of adapted Gemini tool declarations.
+
+    Users are keyed by (site, user, roles, registry version) and point at a shared
+    tool set entry, so users with identical tools reuse one adapted declaration
+    list. Both levels are LRU-bounded and entries expire after TOOL_CACHE_TTL.
+    """
+
+    def __init__(self):
+        self.users = OrderedDict()
+        self.toolsets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _get(self, store, key):
+        entry = store.get(key)
+        if not entry:
+            return None
+        if time.monotonic() - entry["stored_at"] > TOOL_CACHE_TTL:
+            del store[key]
+            return None
+        store.move_to_end(key)
+        return entry["value"]
+
+    def _put(self, store, key, value, max_size):
+        store[key] = {"value": value, "stored_at": time.monotonic()}
+        store.move_to_end(key)
+        while len(store) > max_size:
+            store.popitem(last=False)
+
+    def get_tools(self, user, load_core_tools, adapt):
+        """
+        Returns (gemini_tools, read_only_names, toolset_key) for the user.
+        load_core_tools(user) and adapt(core_tools) are only called on a miss.
+        """
+        user_key = (frappe.local.site, user, _roles_hash(user), get_registry_version())
+
+        with self.lock:
+            toolset_key = self._get(self.users, user_key)
+            if toolset_key:
+                toolset = self._get(self.toolsets, toolset_key)
+                if toolset:
+                    return toolset
+
+        core_tools = load_core_tools(user)
+        toolset_key = _toolset_hash(core_tools)
+
+        with self.lock:
+            toolset = self._get(self.toolsets, toolset_key)
+
+        if not toolset:
+            read_only = frozenset(_tool_fields(t)[0] for t in core_tools if is_read_only_tool(t))
+            toolset = (adapt(core_tools), read_only, toolset_key)
+
+        with self.lock:
+            self._put(self.toolsets, toolset_key, toolset, TOOL_CACHE_MAX_TOOLSETS)
+            self._put(self.users, user_key, toolset_key, TOOL_CACHE_MAX_USERS)
+
+        return toolset
+
+    def clear(self):
+        with self.lock:
+            self.users.clear()
+            self.toolsets.clear()
+
+_declaration_cache = ToolDeclarationCache()
+
+def get_tool_declaration_cache():
+    return _declaration_cache
+
+class ToolResultMemo:
+    """
+    Memoizes results of read-only tools called with identical arguments within a chat session.
+    Any non read-only call in the session drops the memo, since it may have changed the data.
+    """
+
+    def __init__(self, session_id, read_only_names):
+        self.session_id = session_id
+        self.read_only_names = read_only_names or frozenset()
+
+    def _generation_key(self):
+        return f"ai_integration:tool_memo_gen:{self.session_id}"
+
+    def _key(self, func_name, func_args):
+        generation = frappe.cache().get_value(self._generation_key()) or 0
+        args = json.dumps(func_args or {}, sort_keys=True, default=str)
+        digest = hashlib.sha1(f"{func_name}\x00{args}".encode()).hexdigest()
+        return f"ai_integration:tool_memo:{self.session_id}:{generation}:{digest}"
+
+    def is_cacheable(self, func_name):
+        return bool(self.session_id) and func_name in self.read_only_names
+
+    def get(self, func_name, func_args):
+        if not self.is_cacheable(func_name):
+            return None
+        return frappe.cache().get_value(self._key(func_name, func_args))
+
+    def set(self, func_name, func_args, result_data):
+        if not self.is_cacheable(func_name) or "result" not in result_data:
+            return
+        frappe.cache().set_value(self._key(func_name, func_args), result_data, expires_in_sec=TOOL_RESULT_TTL)
+
+    def invalidate(self):
+        if not self.session_id:
+            return
+        key = self._generation_key()
+        frappe.cache().set_value(key, (frappe.cache().get_value(key) or 0) + 1, expires_in_sec=TOOL_RESULT_TTL)
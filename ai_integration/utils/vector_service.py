@@ -0,0 +1,463 @@
+"""
+Optional vector search service: one long-running process per site owns the index and
+serves search, batch search and incremental updates over a Unix domain socket, so web
+and job workers don't each hold a copy. Enable it in site_config.json:
+
+    "ai_vector_service_socket": "/home/frappe/frappe-bench/config/ai_vector_<site>.sock"
+
+and run it next to the workers (e.g. as a supervisor program):
+
+    bench --site <site> execute ai_integration.utils.vector_service.serve
+
+get_vector_store() then returns a pooled VectorServiceClient; while the socket can't be
+reached, calls fall back to the in-process FaissVectorStore.
+
+Protocol: every request and response is a frame of a 1-byte code (the op, or the status
+in responses) and a 4-byte big-endian payload length, followed by the payload. Strings
+are length-prefixed UTF-8, vectors a 2-byte dimension followed by little-endian float32.
+"""
+import json
+import math
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+import frappe
+import numpy as np
+
+from ai_integration.utils.concurrency import run_in_site_context
+from ai_integration.utils.vector_store import FaissVectorStore, get_candidate_documents
+
+OP_SYNC = 1
+OP_SEARCH = 2
+OP_BATCH_SEARCH = 3
+OP_GET_VECTORS = 4
+OP_REFRESH = 5
+OP_HEALTH = 6
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+# Idle connections kept per worker process
+POOL_SIZE = 4
+
+# Seconds to wait for a response, a slow service falls back like a missing one
+REQUEST_TIMEOUT = 10
+
+# Seconds to use the in-process store after the service could not be reached
+RETRY_AFTER = 30
+
+_HEADER = struct.Struct("!BI")
+_U16 = struct.Struct("!H")
+_U32 = struct.Struct("!I")
+_SEARCH = struct.Struct("!BHH")
+_RESULTS = struct.Struct("!BH")
+_SCORES = struct.Struct("!fff?")
+
+class VectorServiceUnavailable(Exception):
+    pass
+
+class VectorServiceError(Exception):
+    pass
+
+# Encoding
+
+def _pack_str(value, size=_U32):
+    data = (value or "").encode()
+    return size.pack(len(data)) + data
+
+def _pack_vector(vector):
+    array = np.asarray(vector, dtype="<f4")
+    return _U16.pack(array.size) + array.tobytes()
+
+def _pack_names(names):
+    return _U32.pack(len(names)) + b"".join(_pack_str(name, _U16) for name in names)
+
+class _Reader:
+    def __init__(self, data):
+        self.data = memoryview(data)
+        self.pos = 0
+
+    def unpack(self, fmt):
+        values = fmt.unpack_from(self.data, self.pos)
+        self.pos += fmt.size
+        return values
+
+    def string(self, size=_U32):
+        (length,) = self.unpack(size)
+        value = bytes(self.data[self.pos:self.pos + length]).decode()
+        self.pos += length
+        return value
+
+    def vector(self):
+        (dimension,) = self.unpack(_U16)
+        end = self.pos + 4 * dimension
+        vector = np.frombuffer(self.data[self.pos:end], dtype="<f4").astype("float32")
+        self.pos = end
+        return vector
+
+    def names(self):
+        (count,) = self.unpack(_U32)
+        return [self.string(_U16) for _ in range(count)]
+
+def encode_search(query_text, query_vector, k, candidate_docs, hybrid=True):
+    return _SEARCH.pack(int(hybrid), k, candidate_docs) + _pack_str(query_text) + _pack_vector(query_vector)
+
+def decode_search(reader):
+    hybrid, k, candidate_docs = reader.unpack(_SEARCH)
+    query_text = reader.string()
+    return query_text, reader.vector(), k, candidate_docs, bool(hybrid)
+
+def encode_results(results, hybrid=True):
+    parts = [_RESULTS.pack(int(hybrid), len(results))]
+    for result in results:
+        lexical = result.get("lexical_score")
+        parts.append(_pack_str(result["name"], _U16))
+        parts.append(_SCORES.pack(result["score"], math.nan if lexical is None else lexical,
+            result.get("rrf_score", math.nan), bool(result.get("exact_match"))))
+    return b"".join(parts)
+
+def decode_results(reader):
+    hybrid, count = reader.unpack(_RESULTS)
+    results = []
+    for _ in range(count):
+        name = reader.string(_U16)
+        score, lexical, rrf, exact = reader.unpack(_SCORES)
+        result = {"name": name, "score": score}
+        if hybrid:
+            result["lexical_score"] = None if math.isnan(lexical) else lexical
+            result["exact_match"] = exact
+            result["rrf_score"] = rrf
+        results.append(result)
+    return results
+
+def _recv_exact(sock, size):
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            raise ConnectionError("Connection closed")
+        buf += chunk
+    return bytes(buf)
+
+def _send_frame(sock, code, payload=b""):
+    sock.sendall(_HEADER.pack(code, len(payload)) + payload)
+
+def _recv_frame(sock):
+    code, length = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    return code, _recv_exact(sock, length)
+
+# Server
+
+class _Handler(socketserver.BaseRequestHandler):
+    """One client connection: a Frappe context of its own, requests answered in order."""
+
+    def setup(self):
+        self.server.connections.add(self.request)
+
+    def finish(self):
+        self.server.connections.discard(self.request)
+
+    def handle(self):
+        server = self.server
+        frappe.init(site=server.site, sites_path=server.sites_path)
+        try:
+            frappe.connect()
+            frappe.set_user("Administrator")
+            while True:
+                try:
+                    op, payload = _recv_frame(self.request)
+                except ConnectionError:
+                    return
+
+                try:
+                    status, response = STATUS_OK, server.dispatch(op, payload)
+                except Exception as e:
+                    status, response = STATUS_ERROR, (str(e) or type(e).__name__).encode()
+                finally:
+                    # End the read snapshot, the next request must see rows committed since
+                    frappe.db.rollback()
+                _send_frame(self.request, status, response)
+        finally:
+            frappe.destroy()
+
+class VectorSearchServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, site, sites_path):
+        self.site = site
+        self.sites_path = sites_path
+        self.store = FaissVectorStore(site)
+        self.connections = set()
+        self._syncing = threading.Lock()
+        super().__init__(socket_path, _Handler)
+
+    def server_close(self):
+        super().server_close()
+        # Clients see open connections drop, as when the process exits
+        for sock in list(self.connections):
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def dispatch(self, op, payload):
+        reader = _Reader(payload)
+        store = self.store
+
+        if op == OP_SYNC:
+            self.sync_in_background()
+            return b""
+
+        if op == OP_SEARCH:
+            return encode_results(*self._search(*decode_search(reader)))
+
+        if op == OP_BATCH_SEARCH:
+            (count,) = reader.unpack(_U16)
+            searches = [decode_search(reader) for _ in range(count)]
+            return _U16.pack(count) + b"".join(encode_results(*self._search(*s)) for s in searches)
+
+        if op == OP_GET_VECTORS:
+            vectors = store.get_vectors(reader.names())
+            return _U32.pack(len(vectors)) + b"".join(
+                _pack_str(name, _U16) + _pack_vector(vector) for name, vector in vectors.items()
+            )
+
+        if op == OP_REFRESH:
+            (count,) = reader.unpack(_U32)
+            references = [(reader.string(_U16), reader.string(_U16)) for _ in range(count)]
+            store.refresh_references(references)
+            return b""
+
+        if op == OP_HEALTH:
+            return json.dumps(dict(store.health(), service=self.server_address)).encode()
+
+        raise ValueError(f"Unknown op {op}")
+
+    def _search(self, query_text, query_vector, k, candidate_docs, hybrid):
+        if hybrid:
+            return self.store.hybrid_search(query_text, query_vector, k=k, sync=False,
+                candidate_docs=candidate_docs), True
+        return self.store._vector_search(query_vector, k, candidate_docs), False
+
+    def sync_in_background(self):
+        """
+        Checks the database for changes without holding up the request; a reload
+        runs in its own thread while searches keep using the current index.
+        """
+        if not self._syncing.acquire(blocking=False):
+            return
+
+        def run():
+            try:
+                run_in_site_context(
+                    {"site": self.site, "sites_path": self.sites_path, "user": "Administrator"},
+                    self.store.sync
+                )
+            except Exception:
+                # The next sync request tries again
+                pass
+            finally:
+                self._syncing.release()
+
+        threading.Thread(target=run, name="ai_vector_service_sync", daemon=True).start()
+
+def _is_listening(socket_path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+def serve(socket_path=None):
+    """Runs the vector search service of the current site until the process is stopped."""
+    socket_path = socket_path or get_socket_path()
+    if not socket_path:
+        frappe.throw("Set ai_vector_service_socket in site_config.json to run the vector search service")
+
+    if os.path.exists(socket_path):
+        if _is_listening(socket_path):
+            frappe.throw(f"A vector search service is already listening on {socket_path}")
+        # Left behind by a service that didn't shut down cleanly
+        os.unlink(socket_path)
+
+    server = VectorSearchServer(socket_path, frappe.local.site, frappe.local.sites_path)
+    try:
+        os.chmod(socket_path, 0o660)
+        # Load the index before taking requests
+        server.store.sync()
+        frappe.db.rollback()
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+# Client
+
+class VectorServiceClient:
+    """
+    Pooled client of the vector search service with the interface of FaissVectorStore.
+    While the service can't be reached, calls go to the in-process store instead.
+    """
+
+    def __init__(self, socket_path, site):
+        self.socket_path = socket_path
+        self.site = site
+        self._pool = queue.LifoQueue(maxsize=POOL_SIZE)
+        self._down_until = 0
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(REQUEST_TIMEOUT)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def _drain(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def _call(self, op, payload=b""):
+        """Sends one request; a pooled connection that went stale is retried once on a new one."""
+        for attempt in range(2):
+            try:
+                sock, pooled = self._pool.get_nowait(), True
+            except queue.Empty:
+                sock, pooled = None, False
+
+            try:
+                if sock is None:
+                    sock = self._connect()
+                _send_frame(sock, op, payload)
+                status, response = _recv_frame(sock)
+            except OSError as e:
+                if sock is not None:
+                    sock.close()
+                if pooled and attempt == 0:
+                    # The service restarted, none of the pooled connections work
+                    self._drain()
+                    continue
+                self._down_until = time.monotonic() + RETRY_AFTER
+                frappe.log_error(f"Vector search service unavailable, using the in-process index: {e}",
+                    "AI Vector Service")
+                raise VectorServiceUnavailable(str(e)) from e
+
+            try:
+                self._pool.put_nowait(sock)
+            except queue.Full:
+                sock.close()
+
+            if status != STATUS_OK:
+                raise VectorServiceError(response.decode())
+            return response
+
+    def _local(self):
+        store = FaissVectorStore(self.site)
+        store.sync()
+        return store
+
+    def _request(self, op, payload, decode, fallback):
+        """Runs `op` on the service, or `fallback()` while it is unavailable."""
+        if time.monotonic() >= self._down_until:
+            try:
+                return decode(_Reader(self._call(op, payload)))
+            except VectorServiceUnavailable:
+                pass
+        return fallback()
+
+    def sync(self):
+        self._request(OP_SYNC, b"", lambda reader: None, self._local)
+
+    def search(self, query_vector, k=5, candidate_docs=None):
+        if candidate_docs is None:
+            candidate_docs = get_candidate_documents()
+        return self._request(OP_SEARCH, encode_search("", query_vector, k, candidate_docs, hybrid=False),
+            decode_results, lambda: self._local()._vector_search(query_vector, k, candidate_docs))
+
+    def hybrid_search(self, query_text, query_vector, k=10, sync=True, candidate_docs=None):
+        # The service keeps its index synced, `sync` only matters for the in-process store
+        if candidate_docs is None:
+            candidate_docs = get_candidate_documents()
+        return self._request(OP_SEARCH, encode_search(query_text, query_vector, k, candidate_docs),
+            decode_results, lambda: self._local().hybrid_search(query_text, query_vector, k=k, sync=False,
+                candidate_docs=candidate_docs))
+
+    def hybrid_search_batch(self, queries, k=10, candidate_docs=None):
+        if candidate_docs is None:
+            candidate_docs = get_candidate_documents()
+        payload = _U16.pack(len(queries)) + b"".join(
+            encode_search(text, vector, k, candidate_docs) for text, vector in queries
+        )
+
+        def decode(reader):
+            (count,) = reader.unpack(_U16)
+            return [decode_results(reader) for _ in range(count)]
+
+        return self._request(OP_BATCH_SEARCH, payload, decode,
+            lambda: self._local().hybrid_search_batch(queries, k=k, candidate_docs=candidate_docs))
+
+    def get_vectors(self, names):
+        def decode(reader):
+            (count,) = reader.unpack(_U32)
+            return dict((reader.string(_U16), reader.vector()) for _ in range(count))
+
+        return self._request(OP_GET_VECTORS, _pack_names(list(names)), decode,
+            lambda: self._local().get_vectors(names))
+
+    def refresh_references(self, references):
+        payload = _U32.pack(len(references)) + b"".join(
+            _pack_str(doctype, _U16) + _pack_str(name, _U16) for doctype, name in references
+        )
+        # The in-process store picks the change up on its next sync
+        self._request(OP_REFRESH, payload, lambda reader: None, lambda: None)
+
+    def health(self):
+        return self._request(OP_HEALTH, b"", lambda reader: json.loads(bytes(reader.data)),
+            lambda: dict(FaissVectorStore(self.site).health(), service="unavailable"))
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_socket_path():
+    return frappe.conf.get("ai_vector_service_socket")
+
+def get_service_client():
+    """The site's service client when ai_vector_service_socket is configured, else None."""
+    socket_path = get_socket_path()
+    if not socket_path:
+        return None
+
+    site = frappe.local.site
+    with _clients_lock:
+        client = _clients.get(site)
+        if client is None or client.socket_path != socket_path:
+            client = _clients[site] = VectorServiceClient(socket_path, site)
+        return client
+
+def notify_changed(references):
+    """
+    Tells the service to refresh the chunks of the given (doctype, name) documents.
+    Call it once the changes are committed, the service reads them on its own connection.
+    """
+    client = get_service_client()
+    if client is None or not references:
+        return
+    try:
+        client.refresh_references(list(references))
+    except Exception as e:
+        # The service's next sync still picks the rows up
+        frappe.log_error(f"Failed to notify the vector search service: {e}", "AI Vector Service")
@@ -1,22 +1,89 @@
 import frappe
+import os
 import json
+import time
+import pickle
+import hashlib
+import threading
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import ClassVar
 try:
     import faiss
 except ImportError:
     faiss = None
-from frappe.utils import get_datetime
+from frappe.utils import cint, get_datetime, now_datetime
+from ai_integration.utils.concurrency import run_in_site_context
+from ai_integration.utils.embedding import get_live_generation, get_target_generations
+from ai_integration.utils.lexical import BM25Index, reciprocal_rank_fusion
+from ai_integration.utils.metrics import rss_bytes, set_gauge, span
+
+# Vector and lexical lookups are both in-memory, two threads are enough to overlap them
+_search_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="ai_hybrid_search")
+
+# Index snapshots live in sites/<site>/private/<SNAPSHOT_DIR>
+SNAPSHOT_DIR = "ai_index"
+
+# Two-stage dense search: chunks of this many closest documents are ranked
+DEFAULT_CANDIDATE_DOCUMENTS = 50
+
+# The vector search service sends the candidate count as an unsigned 16-bit value
+MAX_CANDIDATE_DOCUMENTS = 65535
+
+# Two-stage results take at most this many chunks of one document before others
+MAX_CHUNKS_PER_DOCUMENT = 3
+
+_ROW_FIELDS = ["name", "vector", "content", "modified", "reference_doctype", "reference_name"]
 
 class FaissVectorStore:
-    _instance = None
+    """
+    Per-process, per-site in-memory FAISS + BM25 index over the live generation of
+    AI Embedding rows; rows of a generation being rebuilt don't trigger reloads.
+    Reloads are serialized per site and persisted as a snapshot in the site's private
+    files, so other processes (and forked job workers) load a built version instead
+    of rebuilding it from the database.
+    """
 
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super(FaissVectorStore, cls).__new__(cls)
-            cls._instance.index = None
-            cls._instance.doc_map = [] # Maps index ID to AI Embedding name
-            cls._instance.last_synced = None
-        return cls._instance
+    _instances: ClassVar[dict] = {}
+    _lock = threading.Lock()
+
+    def __new__(cls, site=None):
+        site = site or frappe.local.site
+        with cls._lock:
+            if site not in cls._instances:
+                instance = super().__new__(cls)
+                instance.site = site
+                instance.index = None
+                instance.doc_map = [] # Maps index ID to AI Embedding name
+                instance.name_to_id = {}
+                instance.chunks_by_reference = {} # (reference_doctype, reference_name) -> AI Embedding names
+                instance.centroid_index = None # One vector per reference document
+                instance.centroid_refs = [] # Maps centroid ID to (reference_doctype, reference_name)
+                instance.lexical_index = BM25Index()
+                instance.last_synced = None
+                instance.refreshed = {} # AI Embedding name -> modified, of rows swapped in after last_synced
+                instance.generation = None
+                instance.reload_lock = threading.Lock()
+                instance.warming = False
+                instance.warm_up_error = None # {"error", "at"} of the last failed warm-up
+                instance.build_ms = None
+                instance.built_at = None
+                instance.build_source = None
+                cls._instances[site] = instance
+            return cls._instances[site]
+
+    def _is_current(self, generation, last_modified):
+        return (self.last_synced and self.generation == generation
+            and get_datetime(last_modified) <= get_datetime(self.last_synced))
+
+    def _only_refreshed_since(self, generation, last_modified):
+        """True when every row modified after last_synced was swapped in by refresh_references."""
+        if not self.refreshed or self.generation != generation:
+            return False
+        # One more row than were refreshed is enough to find one that wasn't
+        rows = frappe.get_all("AI Embedding", fields=["name", "modified"], limit=len(self.refreshed) + 1,
+            filters={"generation": generation, "modified": [">", self.last_synced]})
+        return all(self.refreshed.get(row.name) == get_datetime(row.modified) for row in rows)
 
     def sync(self):
         """
@@ -30,35 +97,181 @@ class FaissVectorStore:
         # We use sql because get_value might cache? No, get_value is fine usually, but let's be safe
         # Actually frappe.db.get_value is cached in request but we want fresh.
         # But this code runs in a request context usually.
-        last_modified = frappe.db.get_value("AI Embedding", {}, "max(modified)")
+        with span("index_sync"):
+            generation = get_live_generation()
+            last_modified = frappe.db.get_value("AI Embedding", {"generation": generation}, "max(modified)")
 
         if not last_modified:
              # No embeddings
-             self.index = None
-             self.doc_map = []
+             self._clear()
              return
 
         # If we have synced before and DB hasn't changed, return
-        if self.last_synced and get_datetime(last_modified) <= get_datetime(self.last_synced):
+        if self._is_current(generation, last_modified):
             return
 
-        # Reload everything
-        self._reload_all()
-        self.last_synced = last_modified
+        with self.reload_lock:
+            # Another thread (e.g. the warm-up) may have reloaded while this one waited
+            if self._is_current(generation, last_modified):
+                return
+
+            if self._only_refreshed_since(generation, last_modified):
+                self.last_synced = last_modified
+                self.refreshed = {}
+                return
+
+            # Reload everything, from the snapshot of this version if another process built it
+            started = time.monotonic()
+            with span("index_reload") as info:
+                version = f"{generation}:{last_modified}"
+                source = "snapshot" if self._load_snapshot(version) else "database"
+                if source == "database":
+                    self._reload_all(generation)
+                    self._save_snapshot(version)
+                info["vectors"] = self.index.ntotal if self.index else 0
+                info["source"] = source
+
+            self.build_ms = round((time.monotonic() - started) * 1000, 1)
+            self.built_at = now_datetime()
+            self.build_source = source
+            self.generation = generation
+            self.last_synced = last_modified
+            self.refreshed = {}
+
+        set_gauge("index_vectors", self.index.ntotal if self.index else 0)
+        set_gauge("index_dimension", self.index.d if self.index else 0)
+        set_gauge("index_build_ms", self.build_ms)
+
+    def _snapshot_dir(self):
+        return frappe.get_site_path("private", SNAPSHOT_DIR)
+
+    def _snapshot_path(self, version):
+        digest = hashlib.sha1(str(version).encode()).hexdigest()[:16]
+        return os.path.join(self._snapshot_dir(), f"index-{digest}.pkl")
+
+    def _load_snapshot(self, version):
+        path = self._snapshot_path(version)
+        if not os.path.exists(path):
+            return False
+        try:
+            with open(path, "rb") as f:
+                snapshot = pickle.load(f)
+            if snapshot["version"] != str(version):
+                return False
+            self.index = faiss.deserialize_index(snapshot["index"])
+            self.doc_map = snapshot["doc_map"]
+            self.name_to_id = {name: i for i, name in enumerate(self.doc_map)}
+            self.chunks_by_reference = snapshot["chunks_by_reference"]
+            self.centroid_index = faiss.deserialize_index(snapshot["centroid_index"])
+            self.centroid_refs = snapshot["centroid_refs"]
+            self.lexical_index = snapshot["lexical_index"]
+            return True
+        except Exception as e:
+            frappe.log_error(f"Failed to load vector index snapshot: {e}", "AI Vector Store")
+            return False
+
+    def _save_snapshot(self, version):
+        """Writes the index of `version` once, atomically, and drops snapshots of older versions."""
+        if not self.index:
+            return
+        path = self._snapshot_path(version)
+        if os.path.exists(path):
+            return
+        try:
+            os.makedirs(self._snapshot_dir(), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump({
+                    "version": str(version),
+                    "index": faiss.serialize_index(self.index),
+                    "doc_map": self.doc_map,
+                    "chunks_by_reference": self.chunks_by_reference,
+                    "centroid_index": faiss.serialize_index(self.centroid_index),
+                    "centroid_refs": self.centroid_refs,
+                    "lexical_index": self.lexical_index
+                }, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+
+            for name in os.listdir(self._snapshot_dir()):
+                other = os.path.join(self._snapshot_dir(), name)
+                if name.startswith("index-") and other != path:
+                    try:
+                        os.remove(other)
+                    except OSError:
+                        pass
+        except Exception as e:
+            frappe.log_error(f"Failed to save vector index snapshot: {e}", "AI Vector Store")
+
+    def health(self):
+        """Readiness and footprint of this process's index for the current site."""
+        generations = get_target_generations()
+        db_version = frappe.db.get_value("AI Embedding", {"generation": generations[0]}, "max(modified)")
+        index = self.index
 
-    def _reload_all(self):
-        # Fetch all embeddings
-        # We only need name and vector.
+        if self.warming:
+            status = "warming"
+        elif self.warm_up_error and not self.last_synced:
+            status = "failed"
+        elif not db_version:
+            status = "ready"
+        elif not self.last_synced:
+            status = "cold"
+        elif not self._is_current(generations[0], db_version):
+            status = "stale"
+        else:
+            status = "ready"
+
+        return {
+            "site": self.site,
+            "pid": os.getpid(),
+            "status": status,
+            "vectors": index.ntotal if index else 0,
+            "dimension": index.d if index else None,
+            "index_type": type(index).__name__ if index else None,
+            "documents": len(self.centroid_refs),
+            # Flat indexes hold the raw float32 vectors, chunks and document centroids
+            "index_bytes": (index.ntotal + len(self.centroid_refs)) * index.d * 4 if index else 0,
+            "lexical_terms": len(self.lexical_index.postings),
+            "process_rss_bytes": rss_bytes(),
+            "generation": self.generation,
+            "live_generation": generations[0],
+            "building_generation": generations[1] if len(generations) > 1 else None,
+            "last_synced": str(self.last_synced) if self.last_synced else None,
+            "db_version": str(db_version) if db_version else None,
+            "build_ms": self.build_ms,
+            "built_at": str(self.built_at) if self.built_at else None,
+            "build_source": self.build_source,
+            "warm_up_error": self.warm_up_error
+        }
+
+    def _clear(self):
+        self.index = None
+        self.doc_map = []
+        self.name_to_id = {}
+        self.chunks_by_reference = {}
+        self.centroid_index = None
+        self.centroid_refs = []
+        self.lexical_index = BM25Index()
+
+    def _reload_all(self, generation=None):
+        # Fetch all embeddings of the live generation
+        # Content is only needed to build the lexical index alongside the vectors.
         # Explicit limit=None for fetching all.
-        embeddings = frappe.get_all("AI Embedding", fields=["name", "vector"], limit=None)
+        if generation is None:
+            generation = get_live_generation()
+        embeddings = frappe.get_all("AI Embedding", filters={"generation": generation},
+            fields=_ROW_FIELDS, limit=None)
 
         if not embeddings:
-            self.index = None
-            self.doc_map = []
+            self._clear()
             return
 
         vectors = []
         names = []
+        contents = []
+        chunks_by_reference = {}
+        owners = [] # Centroid ID of each chunk
+        centroid_ids = {}
 
         for emb in embeddings:
             if not emb.vector:
@@ -67,12 +280,15 @@ class FaissVectorStore:
                 vec = json.loads(emb.vector)
                 vectors.append(vec)
                 names.append(emb.name)
+                contents.append(emb.content)
+                reference = (emb.reference_doctype, emb.reference_name)
+                chunks_by_reference.setdefault(reference, []).append(emb.name)
+                owners.append(centroid_ids.setdefault(reference, len(centroid_ids)))
             except Exception:
                 continue
 
         if not vectors:
-            self.index = None
-            self.doc_map = []
+            self._clear()
             return
 
         # Convert to float32 numpy array
@@ -88,10 +304,110 @@ class FaissVectorStore:
         self.index.add(matrix)
 
         self.doc_map = names
+        self.name_to_id = {name: i for i, name in enumerate(names)}
+        self.chunks_by_reference = chunks_by_reference
+
+        self.centroid_index = faiss.IndexFlatIP(d)
+        self.centroid_index.add(_centroids(matrix, owners, len(centroid_ids)))
+        self.centroid_refs = list(centroid_ids)
+
+        lexical_index = BM25Index()
+        lexical_index.build(zip(names, contents, strict=True))
+        self.lexical_index = lexical_index
+
+    def refresh_references(self, references):
+        """
+        Re-reads the chunks of the given (reference_doctype, reference_name) documents and
+        swaps them into the index without a full reload; documents without chunks are
+        dropped. Searches running meanwhile keep using the previous index.
+        """
+        if not self.last_synced:
+            # Nothing loaded yet, the next sync reads everything
+            return
+
+        references = {tuple(ref) for ref in references}
+        by_doctype = {}
+        for doctype, name in references:
+            by_doctype.setdefault(doctype, []).append(name)
+
+        rows = []
+        for doctype, names in by_doctype.items():
+            rows += frappe.get_all("AI Embedding", fields=_ROW_FIELDS, limit=None, filters={
+                "generation": self.generation,
+                "reference_doctype": doctype,
+                "reference_name": ["in", names]
+            })
+        rows = [row for row in rows if row.vector]
+
+        with self.reload_lock:
+            replaced = {name for ref in references for name in self.chunks_by_reference.get(ref, ())}
+            replaced.update(row.name for row in rows)
+            keep = [i for i, name in enumerate(self.doc_map) if name not in replaced]
+
+            # Copy on write: flat indexes compact on removal, the kept vectors keep their order
+            index = faiss.clone_index(self.index) if self.index else None
+            if index and len(keep) < index.ntotal:
+                removed = np.setdiff1d(np.arange(index.ntotal), keep)
+                index.remove_ids(removed.astype("int64"))
+            doc_map = [self.doc_map[i] for i in keep]
+
+            # Centroids of the refreshed documents are replaced the same way
+            centroid_index = faiss.clone_index(self.centroid_index) if self.centroid_index else None
+            stale = [i for i, ref in enumerate(self.centroid_refs) if ref in references]
+            if centroid_index and stale:
+                centroid_index.remove_ids(np.array(stale, dtype="int64"))
+            centroid_refs = [ref for ref in self.centroid_refs if ref not in references]
+
+            chunks_by_reference = dict(self.chunks_by_reference)
+            for ref in references:
+                chunks_by_reference.pop(ref, None)
+
+            if rows:
+                matrix = np.array([json.loads(row.vector) for row in rows]).astype('float32')
+                faiss.normalize_L2(matrix)
+                if index is None:
+                    index = faiss.IndexFlatIP(matrix.shape[1])
+                    centroid_index = faiss.IndexFlatIP(matrix.shape[1])
+                index.add(matrix)
+                doc_map += [row.name for row in rows]
+
+                owners = []
+                centroid_ids = {}
+                for row in rows:
+                    reference = (row.reference_doctype, row.reference_name)
+                    chunks_by_reference.setdefault(reference, []).append(row.name)
+                    owners.append(centroid_ids.setdefault(reference, len(centroid_ids)))
+                centroid_index.add(_centroids(matrix, owners, len(centroid_ids)))
+                centroid_refs += list(centroid_ids)
+
+            lexical_index = self.lexical_index.updated(replaced, [(row.name, row.content) for row in rows])
+
+            self.index = index
+            self.doc_map = doc_map
+            self.name_to_id = {name: i for i, name in enumerate(doc_map)}
+            self.chunks_by_reference = chunks_by_reference
+            self.centroid_index = centroid_index
+            self.centroid_refs = centroid_refs
+            self.lexical_index = lexical_index
+
+            # last_synced stays, rows modified after it that nobody notified must still
+            # trigger a reload; sync skips it when the newer rows are all refreshed ones
+            for row in rows:
+                if get_datetime(row.modified) > get_datetime(self.last_synced):
+                    self.refreshed[row.name] = get_datetime(row.modified)
 
-    def search(self, query_vector, k=5):
+    def search(self, query_vector, k=5, candidate_docs=None):
         self.sync() # Ensure we are up to date
+        with span("search", label="dense"):
+            return self._vector_search(query_vector, k, candidate_docs)
 
+    def _vector_search(self, query_vector, k, candidate_docs=0):
+        """
+        Top k chunks by cosine similarity. With `candidate_docs`, only chunks of that many
+        documents whose centroids are closest to the query are ranked (two-stage search),
+        and no document takes more than MAX_CHUNKS_PER_DOCUMENT places while chunks of
+        other candidates are left.
+        """
         if not self.index or self.index.ntotal == 0:
             return []
 
@@ -99,6 +415,10 @@ class FaissVectorStore:
         q_vec = np.array([query_vector]).astype('float32')
         faiss.normalize_L2(q_vec)
 
+        centroid_index = self.centroid_index
+        if candidate_docs and centroid_index is not None and centroid_index.ntotal > candidate_docs:
+            return self._two_stage_search(q_vec, k, candidate_docs)
+
         # Search
         D, I = self.index.search(q_vec, k)
 
@@ -117,5 +437,214 @@ class FaissVectorStore:
 
         return results
 
+    def _two_stage_search(self, q_vec, k, candidate_docs):
+        centroid_refs = self.centroid_refs
+        _, candidates = self.centroid_index.search(q_vec, candidate_docs)
+
+        name_to_id = self.name_to_id
+        ids, owners = [], []
+        for c in candidates[0]:
+            if c == -1:
+                continue
+            for name in self.chunks_by_reference.get(centroid_refs[c], ()):
+                if name in name_to_id:
+                    ids.append(name_to_id[name])
+                    owners.append(c)
+        if not ids:
+            return []
+
+        ids = np.array(ids, dtype="int64")
+        scores = self.index.reconstruct_batch(ids) @ q_vec[0]
+        ranked = np.argsort(-scores, kind="stable")
+
+        # Chunks over a document's cap only fill places no other document can
+        top, overflow, taken = [], [], {}
+        for i in ranked:
+            if len(top) == k:
+                break
+            if taken.get(owners[i], 0) < MAX_CHUNKS_PER_DOCUMENT:
+                taken[owners[i]] = taken.get(owners[i], 0) + 1
+                top.append(i)
+            else:
+                overflow.append(i)
+        top = sorted(top + overflow[:k - len(top)], key=lambda i: -scores[i])
+        return [{"name": self.doc_map[ids[i]], "score": float(scores[i])} for i in top]
+
+    def hybrid_search(self, query_text, query_vector, k=10, sync=True, candidate_docs=None):
+        """
+        Runs dense and BM25 lexical search in parallel and fuses them by reciprocal rank.
+
+        Each result carries the fused `rrf_score`, the cosine `score` (computed from the
+        stored vector for lexical-only hits), `lexical_score` when the chunk matched
+        lexically and `exact_match` when that match was on an identifier or rare term,
+        so exact identifiers survive a low cosine similarity.
+        Pass sync=False when the caller already synced the index for this request.
+        `candidate_docs` limits dense search to the chunks of that many documents (see
+        _vector_search), the setting Candidate Documents by default, 0 searches all
+        chunks. Lexical search always covers every chunk.
+        """
+        if sync:
+            self.sync()
+        if candidate_docs is None:
+            candidate_docs = get_candidate_documents()
+
+        if not self.index or self.index.ntotal == 0:
+            return []
+
+        with span("search", index_size=self.index.ntotal, candidate_docs=candidate_docs):
+            vector_future = _search_executor.submit(self._vector_search, query_vector, k, candidate_docs)
+            lexical_future = _search_executor.submit(self.lexical_index.search, query_text, k)
+            vector_results = vector_future.result()
+            lexical_results = lexical_future.result()
+
+        cosine = {r["name"]: r["score"] for r in vector_results}
+        lexical = {r["name"]: r["score"] for r in lexical_results}
+        exact = {r["name"] for r in lexical_results if r["exact"]}
+
+        missing = [name for name in lexical if name not in cosine]
+        if missing:
+            cosine.update(self._cosine_scores(query_vector, missing))
+
+        results = []
+        for name, rrf_score in reciprocal_rank_fusion([vector_results, lexical_results])[:k]:
+            results.append({
+                "name": name,
+                "score": cosine.get(name, 0.0),
+                "lexical_score": lexical.get(name),
+                "exact_match": name in exact,
+                "rrf_score": rrf_score
+            })
+        return results
+
+    def hybrid_search_batch(self, queries, k=10, candidate_docs=None):
+        """hybrid_search for several (query_text, query_vector) pairs, the caller syncs the index."""
+        if candidate_docs is None:
+            candidate_docs = get_candidate_documents()
+        return [
+            self.hybrid_search(text, vector, k=k, sync=False, candidate_docs=candidate_docs)
+            for text, vector in queries
+        ]
+
+    def get_vectors(self, names):
+        """Normalized stored vectors of the given AI Embedding names, as {name: vector}."""
+        if not self.index:
+            return {}
+        return {
+            name: self.index.reconstruct(self.name_to_id[name])
+            for name in names if name in self.name_to_id
+        }
+
+    def _cosine_scores(self, query_vector, names):
+        """Cosine similarity between the query and stored vectors of the given AI Embedding names."""
+        ids = [self.name_to_id[n] for n in names if n in self.name_to_id]
+        if not ids:
+            return {}
+
+        q_vec = np.array([query_vector]).astype('float32')
+        faiss.normalize_L2(q_vec)
+        matrix = np.vstack([self.index.reconstruct(int(i)) for i in ids])
+        scores = matrix @ q_vec[0]
+        return {self.doc_map[i]: float(s) for i, s in zip(ids, scores, strict=True)}
+
+def _centroids(matrix, owners, count):
+    """Normalized mean of the (normalized) rows of `matrix` per owner, `owners` maps row to centroid ID."""
+    sums = np.zeros((count, matrix.shape[1]), dtype="float32")
+    np.add.at(sums, np.asarray(owners, dtype="int64"), matrix)
+    faiss.normalize_L2(sums)
+    return sums
+
+def get_candidate_documents():
+    """
+    Documents whose chunks dense search ranks (two-stage search), 0 ranks every chunk.
+    Sites that never saved the setting have no stored value and get the default.
+    """
+    # get_single_value casts a missing Int to 0, which would turn two-stage search off
+    value = frappe.db.get_value("Singles",
+        {"doctype": "AI Integration Settings", "field": "retrieval_candidate_documents"}, "value")
+    value = cint(value) if value not in (None, "") else DEFAULT_CANDIDATE_DOCUMENTS
+    return min(max(value, 0), MAX_CANDIDATE_DOCUMENTS)
+
 def get_vector_store():
-    return FaissVectorStore()
+    """
+    The site's vector store: a client of the vector search service when
+    ai_vector_service_socket is set in site config, else the in-process index.
+    """
+    from ai_integration.utils.vector_service import get_service_client
+    return get_service_client() or FaissVectorStore(frappe.local.site)
+
+# A failed warm-up is retried by the first request after this many seconds
+WARM_UP_RETRY_SECONDS = 60
+
+_warmed_sites = set()
+_warm_retry_after = {}
+_warm_lock = threading.Lock()
+
+def warm_up():
+    """
+    Builds or loads the current site's index, e.g. via bench execute after a deploy.
+    A failure is kept on the store for vector_store_health and raised.
+    """
+    store = get_vector_store()
+    store.warming = True
+    try:
+        store.sync()
+        store.warm_up_error = None
+    except Exception as e:
+        store.warm_up_error = {"error": str(e) or type(e).__name__, "at": str(now_datetime())}
+        raise
+    finally:
+        store.warming = False
+
+def _warm_up_site():
+    if "ai_integration" not in frappe.get_installed_apps() or frappe.conf.get("ai_vector_service_socket"):
+        return
+    warm_up()
+    with _warm_lock:
+        _warmed_sites.add(frappe.local.site)
+
+def warm_up_sites(sites_path="."):
+    """
+    Builds or loads the index of every site of the bench that has this app installed,
+    in the calling process. Gunicorn runs it in each new web worker before the worker
+    accepts requests (see ai_integration.gunicorn_config). After the first build of a
+    version this is a snapshot load. Sites that fail are retried by ensure_warm.
+    """
+    if not faiss:
+        return
+    for site in frappe.utils.get_sites(sites_path):
+        context = {"site": site, "sites_path": sites_path, "user": "Administrator"}
+        try:
+            run_in_site_context(context, _warm_up_site)
+        except Exception as e:
+            frappe.logger("ai_integration").warning(f"Vector index warm-up failed for {site}: {e}")
+
+def ensure_warm():
+    """
+    before_request hook, the fallback when the worker wasn't warmed at fork (development
+    server, gunicorn without ai_integration.gunicorn_config, or a failed warm-up): the
+    first request a process serves for a site starts loading that site's index in a
+    background thread. A chat request arriving meanwhile waits for it instead of
+    building a second copy. A failed warm-up is retried after WARM_UP_RETRY_SECONDS.
+    """
+    site = getattr(frappe.local, "site", None)
+    if not faiss or not site or site in _warmed_sites or frappe.conf.get("ai_vector_service_socket"):
+        return
+
+    with _warm_lock:
+        if site in _warmed_sites or time.monotonic() < _warm_retry_after.get(site, 0):
+            return
+        _warmed_sites.add(site)
+
+    context = {"site": site, "sites_path": frappe.local.sites_path, "user": "Administrator"}
+    threading.Thread(target=_warm_up_in_background, args=(context,),
+        name=f"ai_index_warm_up:{site}", daemon=True).start()
+
+def _warm_up_in_background(context):
+    try:
+        run_in_site_context(context, warm_up)
+    except Exception as e:
+        # warm_up kept the error on the store, a later request tries again
+        frappe.logger("ai_integration").warning(f"Vector index warm-up failed for {context['site']}: {e}")
+        with _warm_lock:
+            _warmed_sites.discard(context["site"])
+            _warm_retry_after[context["site"]] = time.monotonic() + WARM_UP_RETRY_SECONDS